@@ -26,10 +26,87 @@ bu = 0.1 # 1 b.u. = 1 cm
 #	6 - To prematurely interrupt the animation process, press CTRL-C in the terminal. 
 #		(WARNING! if you do not run Blender in a terminal and launch this script, there is no 
 #				way to interrupt the process!)
+#
+# Or render in the background with options instead of editing this file (see 
+# ParseArguments for all of them):
+#	blender -b shot.blend -P StereoAnimator.py -- --frames 1-250 --cameras 'Cam*' --eye-sep 6.5
+#	blender -b shot.blend -P StereoAnimator.py -- --jobs jobs.txt	(many jobs, one Blender)
+#
+# Importing this module only defines StereoAnimator and the functions below;
+# nothing is rendered unless it is run as a script or RunJob is called.
 #############################################################################################
+import Blender
 from Blender import Camera, Object, Scene, Mesh, Window
 import copy
+import fnmatch
+import hashlib
 import math
+import optparse
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import traceback
+
+# The helper modules (stereoLayout, ...) live next to this script. Blender does
+# not put the script directory on sys.path, so find it ourselves: from __file__,
+# from the "-P" argument, from $STEREO_ANIMATOR_PATH or, when run from the Text
+# Editor, from the directory of the .blend file.
+def _ScriptDirectories():
+	dirs = []
+	if globals().has_key('__file__'):
+		dirs.append(os.path.dirname(os.path.abspath(__file__)))
+	argv = getattr(sys, 'argv', [])
+	if '-P' in argv and argv.index('-P') + 1 < len(argv):
+		dirs.append(os.path.dirname(os.path.abspath(argv[argv.index('-P') + 1])))
+	if os.environ.has_key('STEREO_ANIMATOR_PATH'):
+		dirs.append(os.environ['STEREO_ANIMATOR_PATH'])
+	blendFile = Blender.Get('filename')
+	if blendFile:
+		dirs.append(os.path.dirname(os.path.abspath(blendFile)))
+	return dirs
+
+for _dir in _ScriptDirectories():
+	if os.path.isfile(os.path.join(_dir, 'stereoLayout.py')) and _dir not in sys.path:
+		sys.path.insert(0, _dir)
+		break
+
+import stereoArchive
+import stereoComfort
+import stereoCopyPlan
+import stereoCost
+import stereoLayout
+import stereoManifest
+import stereoRigMath
+import stereoSaver
+import stereoSchedule
+import stereoTrace
+from stereoTrace import Log, LOG_WARNING, LOG_INFO, LOG_FRAME, LOG_DEBUG
+
+# One stereo rig: the original camera and the objects generated for it. 
+# Slotted, since the render loop touches every rig on every frame. N-view
+# rigs keep all their cameras in views; left and right are the outer views.
+class RigRecord(object):
+	__slots__ = ('name', 'orig', 'left', 'right', 'leftData', 'rightData', 'seg', 'views', 'cached')
+	
+	def __init__(self, orig):
+		self.name = orig.getName()
+		self.orig = orig
+		self.left = None
+		self.right = None
+		self.leftData = None
+		self.rightData = None
+		self.seg = None
+		self.views = []
+		self.cached = False		# placed from PrecomputeRigs (else by UpdateRig)
+	
+	# RETURN: the stereo cameras (all views), left first
+	def Eyes(self):
+		return self.views
+	
+	def __repr__(self):
+		return '<RigRecord %s>' % self.name
 
 class StereoAnimator:
 	##########################################
@@ -39,25 +116,135 @@ class StereoAnimator:
 	# 
 	# Blender.RenderingContext context // the scene rendering context
 	# 
-	# List[List] rig_cams	// A list of stereo camera rigs [type List[Object("Camera") Object("Camera")]
-	#							(Tuple is combo: [rig camera, original camera])
+	# List rigs				// A RigRecord for every rigged camera
+	#
+	# Dict sceneIndex		// name -> object linked to the scene (see IndexScene)
+	#
+	# Dict rigIndex			// rig object name (RIG_PROPERTY) -> generated camera or
+	#							segment, including unlinked ones
 	#
-	# List rig_cams_data	// A list of camera data associated with rig_cams
+	# Dict cameraDataIndex	// name -> camera data
 	#
 	# Blender.Camera orig_cam 	// The original active camera of scene
 	# 
 	# Integer orig_frame	// The original active frame of scene
+	#
+	# String output_path	// Root of the output tree (defaults to the scene render path)
+	#
+	# List frames			// Frames to render (None: startFrame() to endFrame())
+	#
+	# List cameraFilter		// Name patterns of the cameras to rig (None: all cameras)
+	#
+	# FrameManifest manifest // Images completed so far (see stereoManifest.py)
+	#
+	# Boolean resume		// Skip images the manifest already has with unchanged rig
+	#
+	# Boolean precompute	// Use eye positions/shiftX computed for all frames up
+	#							front (PrecomputeRigs) instead of the _SEP meshes
+	#
+	# Boolean verifyRigs	// Check the precomputed values against the _SEP meshes
+	#
+	# Dict rigCache			// original camera name -> {frame: (left, right, shiftX)}
+	#
+	# CopyPlanCache copyPlans // Probed attribute copy plans (see stereoCopyPlan.py)
+	#
+	# RenderTrace trace		// Phase timings and the optional JSON lines trace file
+	#
+	# Dict cropMargins		// original camera name -> convergence crop margin in pixels
+	#							(largest over the rendered frames, see WriteCropInfo)
+	#
+	# Boolean cropRender	// Render only the crop window (border render)
+	#
+	# Boolean borderChanged // Border rendering was switched on by us (see __del__)
+	#
+	# String order			// Render order, one of stereoSchedule.ORDERS
+	#
+	# Integer currentFrame	// Frame the scene was last evaluated for (RenderTasks)
+	#
+	# Tuple updatedRig		// (frame, rig index) the stereo cameras were last updated for
+	#
+	# String renderPath		// Render path last set on the rendering context
+	#
+	# Integer views			// Cameras per rig (2: stereo; more for autostereoscopic
+	#							displays, spread over eyeSep, see SetViews)
+	#
+	# Boolean skipStatic	// Reuse the previous image of an eye when neither the
+	#							rig nor the scene changed (see StaticFingerprint)
+	#
+	# List fingerprintObjects // Scene objects covered by SceneFingerprint
+	#
+	# Dict sceneFingerprints // frame -> SceneFingerprint of that frame
+	#
+	# Dict lastOutputs		// stereo camera name -> (fingerprint, image path, frame)
+	#							of its last rendered image
+	#
+	# Dict staticCounts		// 'link'/'copy'/'alias' -> images reused that way
+	#
+	# SaverPool saver		// Background save helpers (None: save synchronously)
+	#
+	# String spool			// Local directory Blender saves into for the saver
+	#							and the archives
+	#
+	# Dict archives			// original camera name -> open StereoArchive (None:
+	#							loose image files, see StartArchive)
+	#
+	# Integer previewStep	// Preview every Nth frame first (0: no preview, see SetPreview)
+	#
+	# Integer previewSize	// Render size of the previews in percent (renderwinSize)
+	#
+	# Boolean previewOnly	// Stop after the preview passes
+	#
+	# String previewPython	// Python interpreter that composites the previews
+	#
+	# List previewRestore	// (attribute, value) of the render settings a preview changed
+	#
+	# Popen compositor		// Running stereoComposite.py of the last preview chunk
+	#
+	# Tuple comfortLimits	// (crossed, uncrossed) disparity limits in % of the image
+	#							width (None: no comfort check, see SetComfort)
+	#
+	# String comfortMode	// 'report', 'abort' or 'only' (see SetComfort)
+	#
+	# String comfortPython	// Python interpreter for stereoComfort.py without NumPy
+	#
+	# Dict comfortSamples	// Eye positions and object bounding boxes PrecomputeRigs
+	#							sampled for the comfort check
+	#
+	# List comfortObjects	// Scene objects whose bounding boxes are sampled
+	#
+	# CostModel costModel	// Render times of the shot (None: no cost model, see
+	#							SetCostModel)
+	#
+	# Integer costSamples	// Frames per camera timed at preview settings first
+	#
+	# Boolean costOnly		// Stop after timing the samples
+	#
+	# CostTracker costTracker // Predicted render time left of the final passes
+	#
+	# Float renderSeconds	// Render time of the last task (None: not rendered)
+	#
+	# String saveExt		// Extension the saver encodes to (None: keep the format)
+	# Integer origImageType	// The scene's image type while the saver has Blender
+	#							dump RAWTGA (None: the scene's type is in use)
+	#
+	# Dict saveTasks		// saver task index -> (frame, eye, camera, path, rig hash)
+	#
+	# List saveErrors		// (path, error) of every image the saver failed on
 	##########################################
 	
 	def __init__(self, scene_, defaultEyeSeparation):
 		# Assume each camera is independent. Then, we parent a Stereo_LEFT and 
 		# Stereo_RIGHT camera to each camera
 		# At the end of the animation we will delete all of the cameras in the
-		# rig_cams list. 
+		# rigs list. 
 		#
 		# This is a queue of cameras we will render from 
 		self.rigs = []
-		self.rig_cams_data = []
+		self.sceneObjects = []
+		self.sceneIndex = {}
+		self.rigIndex = {}
+		self.cameraDataIndex = {}
+		self.meshIndex = None
 
 		self.scene = scene_
 		
@@ -66,6 +253,112 @@ class StereoAnimator:
 		self.PrintSceneCameras()
 		
 		self.eyeSep = defaultEyeSeparation
+		
+		self.output_path = self.output_path_orig
+		self.frames = None
+		self.cameraFilter = None
+		self.manifest = None
+		self.resume = False
+		self.resumeFrom = []
+		self.precompute = True
+		self.verifyRigs = False
+		self.rigCache = {}
+		self.copyPlans = stereoCopyPlan.CopyPlanCache()
+		self.trace = stereoTrace.RenderTrace()
+		self.cropMargins = {}
+		self.cropRender = False
+		self.borderChanged = False
+		self.order = 'frame'
+		self.views = 2
+		self.currentFrame = None
+		self.updatedRig = None
+		self.renderPath = None
+		self.skipStatic = False
+		self.fingerprintObjects = None
+		self.sceneFingerprints = {}
+		self.lastOutputs = {}
+		self.staticCounts = {}
+		self.saver = None
+		self.spool = None
+		self.saveExt = None
+		self.saveTasks = {}
+		self.saveErrors = []
+		self.origImageType = None
+		self.archives = None
+		self.previewStep = 0
+		self.previewSize = 25
+		self.previewOnly = False
+		self.previewPython = 'python'
+		self.previewRestore = []
+		self.compositor = None
+		self.comfortLimits = None
+		self.comfortMode = 'report'
+		self.comfortPython = 'python'
+		self.comfortSamples = None
+		self.comfortObjects = None
+		self.costModel = None
+		self.costSamples = 0
+		self.costOnly = False
+		self.costTracker = None
+		self.renderSeconds = None
+	
+	# Render only a subset of the animation (e.g. one shard of a parallel job)
+	def SetFrames(self, frames):
+		self.frames = list(frames)
+	
+	# Only rig cameras whose names match one of the (fnmatch) patterns
+	def SetCameraFilter(self, patterns):
+		self.cameraFilter = list(patterns)
+	
+	# Write the image sequences below a different root directory
+	def SetOutputPath(self, path):
+		self.output_path = path
+	
+	# Write per frame/eye/camera timings as JSON lines to path (see stereoTrace.py)
+	def SetTraceFile(self, path):
+		self.trace.Close()
+		self.trace = stereoTrace.RenderTrace(path)
+	
+	# Skip images that an earlier (interrupted) run already completed. Extra
+	# output roots in resumeFrom are consulted read-only (sharded renders).
+	def SetResume(self, resume, resumeFrom=None):
+		self.resume = resume
+		self.resumeFrom = list(resumeFrom or [])
+	
+	# Rig every camera with count views instead of a left and right eye. The 
+	# views are evenly spaced between the outer two, which are eyeSep apart.
+	def SetViews(self, count):
+		if count < 2:
+			raise ValueError("A rig needs at least 2 views, not %d" % count)
+		self.views = count
+	
+	# Render the images in another order (see stereoSchedule.py)
+	def SetOrder(self, order):
+		if order not in stereoSchedule.ORDERS:
+			raise ValueError("Unknown render order '%s'" % order)
+		self.order = order
+	
+	# Go to a frame. Blender.Set also re-evaluates the animation, so the 
+	# cameras report their values for the new frame.
+	def SetFrame(self, frame):
+		start = self.trace.Start()
+		self.context.currentFrame(frame)
+		Blender.Set('curframe', frame)
+		self.currentFrame = frame
+		self.trace.Stop(start, 'evaluate', frame=frame)
+	
+	# RETURN: the list of frames to render
+	def GetRenderFrames(self):
+		if self.frames is None:
+			return range(self.context.startFrame(), self.context.endFrame()+1)
+		return self.frames
+	
+	# RETURN: the list of cameras that get a stereo rig (call IndexScene first)
+	def GetRigCameraList(self):
+		cams = [ob for ob in self.sceneObjects if ob.getType() == 'Camera' and not self.IsRigObject(ob)]
+		if self.cameraFilter is None:
+			return cams
+		return [c for c in cams if [p for p in self.cameraFilter if fnmatch.fnmatchcase(c.getName(), p)]]
 	
 	# Return a list of cameras in the scene
 	# RETURN: the list of cameras
@@ -87,26 +380,26 @@ class StereoAnimator:
 	# RETURN: nothing
 	def PrintCameraData(self):
 		cam_data = [c.getName() for i, c in enumerate(Camera.Get())]
-		print "CAMERA DATA IN SCENE: ", ", ".join(cam_data), "\n"
+		Log(LOG_INFO, "CAMERA DATA IN SCENE: ", ", ".join(cam_data), "\n")
 	
 	# print all camera objects in scene
 	# RETURN: nothing
 	def PrintSceneCameras(self):
 		for i, c in enumerate(self.GetCameraList(self.scene)):
-			print "CAMERA OBJECTS IN SCENE: " + c.getName(), "\n"
+			Log(LOG_INFO, "CAMERA OBJECTS IN SCENE: " + c.getName(), "\n")
 
 	# print all cameras in the Blender environment
 	def PrintAllBlenderCameras(self):
 		cams = [ob.getName() for ob in Object.Get() if ob.getType() == 'Camera']
-		print "ALL CAMS IN BLENDER: ", ", ".join(cams)
+		Log(LOG_INFO, "ALL CAMS IN BLENDER: ", ", ".join(cams))
 
 	# Print the stereo camera rig names
 	def PrintStereoRigs(self):
-		print "\nSTEREO RIG CAMERAS:"
-		print self.rigs
-		for indx, [[l,r],s,o] in enumerate(self.rigs):
-			print indx, "\t",o.getName(), " ->  *", l.getName(), r.getName()
-		print ""
+		Log(LOG_INFO, "\nSTEREO RIG CAMERAS:")
+		Log(LOG_DEBUG, self.rigs)
+		for indx, rig in enumerate(self.rigs):
+			Log(LOG_INFO, indx, "\t",rig.name, " ->  *", ' '.join([v.getName() for v in rig.views]))
+		Log(LOG_INFO, "")
 	
 
 	# Copy a single attribute (attr) from the src to the dest object
@@ -118,7 +411,7 @@ class StereoAnimator:
 		#	print "ATTRIBUTE: ", attr, " NOT FOUND"
 			pass
 		
-	def UpdateRig(self, leftCam, rightCam, eyeSeperator, origCam):
+	def UpdateRig(self, leftCam, rightCam, eyeSeperator, origCam, views=None):
 		self.UpdateCameraObject(leftCam, origCam)
 		self.UpdateCameraObject(rightCam,origCam)
 		
@@ -131,32 +424,244 @@ class StereoAnimator:
 
 		# For shiftx calculation: 
 		render_width = self.context.imageSizeX()
-		print "WIDTH: ", render_width
+		Log(LOG_DEBUG, "WIDTH: ", render_width)
 		cam_separation = self.eyeSep
-		print "EyeSep: ", cam_separation
+		Log(LOG_DEBUG, "EyeSep: ", cam_separation)
 		focal_dist = origCam.getData().dofDist
 		if (focal_dist == 0): 
-			print "\n!!!!! WARNING !!!!! focal dist is 0. Cameras will be parallel with no convergence! Select each camera, go to Edit Tab (F9) and set Dof Dist to fix this! (No support for Dof Ob yet)\n"
+			self.WarnFocalDist()
 			leftCam.getData().shiftX = 0
 			rightCam.getData().shiftX = 0
+			camera_shift_x = 0
 		else: 
-			print "DOF: ", focal_dist
-			# From http://www.noeol.de/s3d/BStereoOffAxisCamera_0_4.py
-			camera_fov = math.radians(origCam.getData().angle / 2.)
-			#camera_fov = origCam.getData().angle / 2.
-			print "FOV: ", camera_fov
-
-			# Next two lines from http://www.noeol.de/s3d/BStereoOffAxisCamera_0_5_2.py
-			# calculate delta (in pixel)
-			delta = (render_width*cam_separation)/(2.*focal_dist*math.tan(camera_fov))
-			camera_shift_x = delta/render_width
+			Log(LOG_DEBUG, "DOF: ", focal_dist)
+			Log(LOG_DEBUG, "FOV: ", math.radians(origCam.getData().angle / 2.))
+			camera_shift_x = stereoRigMath.ShiftX(render_width, cam_separation, focal_dist, origCam.getData().angle)
 			
 			# ShiftX adjustment for parallel stereo
 			leftCam.getData().shiftX = (camera_shift_x/2.)
 			rightCam.getData().shiftX = -(camera_shift_x/2.)
 			
-			print "SHIFTX ", camera_shift_x/2., camera_shift_x	
+			Log(LOG_DEBUG, "SHIFTX ", camera_shift_x/2., camera_shift_x)
+		if views:
+			self.UpdateInnerViews(views, origCam, locs[0], locs[1], camera_shift_x)
+	
+	# Place the views between the outer two of an N-view rig
+	def UpdateInnerViews(self, views, origCam, left, right, shift):
+		placed = stereoRigMath.InterpolateViews(len(views), left, right, shift)
+		for view, (position, viewShift) in zip(views[1:-1], placed[1:-1]):
+			self.UpdateCameraObject(view, origCam)
+			self.ApplyLoc(view, position)
+			view.getData().shiftX = viewShift
+	
+	def WarnFocalDist(self):
+		Log(LOG_WARNING, "\n!!!!! WARNING !!!!! focal dist is 0. Cameras will be parallel with no convergence! Select each camera, go to Edit Tab (F9) and set Dof Dist to fix this! (No support for Dof Ob yet)\n")
+	
+	# Sample every original camera over the given frames and compute the eye 
+	# positions and shiftX of all rigs in one batch (see stereoRigMath.py). 
+	# UpdateRigCached then applies these per frame without the _SEP meshes.
+	# This evaluates every frame once more before rendering; the samples also
+	# give the crop margins and the comfort check.
+	#
+	# The samples are the camera's LocX..RotZ, the transform CopyRotLoc gives
+	# the _SEP mesh, so the cache matches the mesh based math. For a camera
+	# with a parent, constraints or a track that is not its world transform,
+	# so those rigs are not taken from the cache (IsDriven) but placed by 
+	# UpdateRig every frame, as before. Neither path follows the parent or
+	# constraints: the eyes get the camera's own LocX..RotZ.
+	def PrecomputeRigs(self, frames):
+		start = self.trace.Start()
+		samples = {}
+		for rig in self.rigs:
+			samples[rig.name] = ([], [], [], [], [])
+		if self.comfortLimits is not None:
+			self.StartComfortSamples(frames)
+		for frame in frames:
+			self.SetFrame(frame)
+			if self.comfortSamples is not None:
+				self.SampleComfort()
+			for rig in self.rigs:
+				o = rig.orig
+				[locs, rots, dists, angles, clips] = samples[rig.name]
+				data = o.getData()
+				locs.append((o.LocX, o.LocY, o.LocZ))
+				rots.append((o.RotX, o.RotY, o.RotZ))
+				dists.append(data.dofDist)
+				angles.append(data.angle)
+				clips.append(data.clipEnd)
 		
+		width = self.context.imageSizeX()
+		self.rigCache = {}
+		for name, [locs, rots, dists, angles, clips] in samples.items():
+			lefts, rights = stereoRigMath.EyePositions(locs, rots, self.eyeSep)
+			shifts = stereoRigMath.ShiftXBatch(width, self.eyeSep, dists, angles)
+			if 0 in dists:
+				Log(LOG_WARNING, "Camera", name, "has no focal distance on some frames")
+				self.WarnFocalDist()
+			cache = {}
+			for i, frame in enumerate(frames):
+				cache[frame] = (lefts[i], rights[i], shifts[i])
+				self.NoteCropMargin(name, width, shifts[i], dists[i], clips[i])
+			self.rigCache[name] = cache
+			if self.comfortSamples is not None:
+				self.comfortSamples['rigs'][name].update({'left': stereoComfort.Floats(lefts), 
+					'right': stereoComfort.Floats(rights), 'rotation': stereoComfort.Floats(rots), 
+					'shift': stereoComfort.Floats(shifts), 'angle': stereoComfort.Floats(angles)})
+		self.trace.Stop(start, 'precompute')
+		Log(LOG_INFO, "Precomputed %d rigs for %d frames" % (len(self.rigCache), len(frames)))
+	
+	# RETURN: True if something besides its own LocX..RotZ moves a camera 
+	# (parent, constraints, track), so PrecomputeRigs cannot sample it
+	def IsDriven(self, camera):
+		try:
+			if camera.getParent() is not None:
+				return True
+		except AttributeError:
+			pass
+		return bool(getattr(camera, 'constraints', None)) or getattr(camera, 'track', None) is not None
+	
+	# Check the stereo comfort of every frame before rendering (stereoComfort.py):
+	# the disparity of the objects' bounding boxes must stay within maxCrossed
+	# (in front of the screen) and maxUncrossed (behind it), in % of the image
+	# width. mode 'report' only reports, 'abort' does not render if a limit is
+	# exceeded, 'only' never renders. Without NumPy the analysis runs in python.
+	# Needs the precomputed rigs.
+	def SetComfort(self, maxCrossed, maxUncrossed, mode='report', python='python'):
+		if mode not in ('report', 'abort', 'only'):
+			raise ValueError("Unknown comfort mode '%s'" % mode)
+		self.comfortLimits = (maxCrossed, maxUncrossed)
+		self.comfortMode = mode
+		self.comfortPython = python
+	
+	def StartComfortSamples(self, frames):
+		self.comfortObjects = [ob for ob in self.sceneObjects if ob.getType() in COMFORT_TYPES 
+			and not self.IsRigObject(ob)]
+		self.comfortSamples = {'width': self.context.imageSizeX(), 'height': self.context.imageSizeY(),
+			'objects': [ob.getName() for ob in self.comfortObjects], 'corners': [], 'rigs': {}}
+		for rig in self.rigs:
+			self.comfortSamples['rigs'][rig.name] = {'frames': list(frames), 'clipStart': []}
+	
+	# Sample the world space bounding boxes of the objects and the clip start
+	# of the cameras on the current frame
+	def SampleComfort(self):
+		corners = []
+		for ob in self.comfortObjects:
+			corners.append(stereoComfort.Floats(ob.getBoundBox()))
+		self.comfortSamples['corners'].append(corners)
+		for rig in self.rigs:
+			self.comfortSamples['rigs'][rig.name]['clipStart'].append(rig.orig.getData().clipStart)
+	
+	# Analyse the comfort samples of PrecomputeRigs, write the reports to
+	# <output>/<Camera>/stereo_comfort.json and log them
+	# RETURN: number of frames (over all cameras) that exceed the limits
+	def AnalyseComfort(self):
+		start = self.trace.Start()
+		[maxCrossed, maxUncrossed] = self.comfortLimits
+		path = os.path.join(self.output_path, stereoComfort.SAMPLES_NAME)
+		stereoComfort.WriteSamples(path, self.comfortSamples)
+		reports = []
+		if stereoComfort.numpy is not None:
+			for report in stereoComfort.AnalyseSamples(self.comfortSamples, maxCrossed, maxUncrossed):
+				stereoComfort.WriteReport(self.output_path, report)
+				reports.append(report)
+		else:
+			script = os.path.join(os.path.dirname(os.path.abspath(stereoLayout.__file__)), 'stereoComfort.py')
+			command = [self.comfortPython, script, '--max-crossed', str(maxCrossed), 
+				'--max-uncrossed', str(maxUncrossed), '--output', self.output_path, path]
+			log = open(os.path.join(self.output_path, 'comfort.log'), 'w')
+			try:
+				status = subprocess.call(command, stdout=log, stderr=subprocess.STDOUT)
+			except OSError, e:
+				status = e
+			log.close()
+			if status != 0:
+				Log(LOG_WARNING, "!!!!! WARNING !!!!! Comfort check with %s failed (%s), see comfort.log" % 
+					(self.comfortPython, status))
+			else:
+				reports = [stereoComfort.ReadReport(self.output_path, rig.name) for rig in self.rigs]
+		self.comfortSamples = None
+		self.comfortObjects = None
+		bad = 0
+		for report in reports:
+			for line in stereoComfort.FrameTable(report):
+				Log(LOG_FRAME, '\t' + line)
+			for line in stereoComfort.Summary(report):
+				Log(LOG_INFO, line)
+			bad += len(stereoComfort.BadFrames(report))
+		self.trace.Stop(start, 'comfort')
+		return bad
+	
+	# Same result as UpdateRig, from the values PrecomputeRigs stored for frame
+	def UpdateRigCached(self, leftCam, rightCam, origCam, frame, views=None):
+		self.UpdateCameraObject(leftCam, origCam)
+		self.UpdateCameraObject(rightCam,origCam)
+		
+		[left, right, shift] = self.rigCache[origCam.getName()][frame]
+		self.ApplyLoc(leftCam, left)
+		self.ApplyLoc(rightCam, right)
+		leftCam.getData().shiftX = (shift/2.)
+		rightCam.getData().shiftX = -(shift/2.)
+		if views:
+			self.UpdateInnerViews(views, origCam, left, right, shift)
+	
+	# Compare the cached rig of a frame with the mesh based math of UpdateRig
+	# RETURN: the largest absolute difference
+	def CheckRigCache(self, eyeSeperator, origCam, frame):
+		self.CopyRotLoc(eyeSeperator, origCam)
+		locs = self.GetEndpointLocations(eyeSeperator)
+		[left, right, shift] = self.rigCache[origCam.getName()][frame]
+		data = origCam.getData()
+		expected = stereoRigMath.ShiftX(self.context.imageSizeX(), self.eyeSep, data.dofDist, data.angle)
+		error = abs(shift - expected)
+		for i in range(3):
+			error = max(error, abs(locs[0][i] - left[i]), abs(locs[1][i] - right[i]))
+		if error > 1e-4:
+			Log(LOG_WARNING, "!!!!! WARNING !!!!! precomputed rig of", origCam.getName(), "is off by", error, "on frame", frame)
+		return error
+		
+	# Grow the convergence crop margin of a camera to cover one more frame
+	def NoteCropMargin(self, name, width, shift, focalDist, clipEnd):
+		margin = stereoRigMath.CropMargin(width, shift, focalDist, clipEnd)
+		if margin > self.cropMargins.get(name, 0):
+			self.cropMargins[name] = margin
+		elif not self.cropMargins.has_key(name):
+			self.cropMargins[name] = 0
+	
+	# Same as NoteCropMargin, from the current values of the original camera
+	# (for renders without PrecomputeRigs)
+	def NoteCurrentCropMargin(self, origCam):
+		data = origCam.getData()
+		width = self.context.imageSizeX()
+		shift = stereoRigMath.ShiftX(width, self.eyeSep, data.dofDist, data.angle)
+		self.NoteCropMargin(origCam.getName(), width, shift, data.dofDist, data.clipEnd)
+	
+	# Record the crop window of every rig next to its image sequences. The
+	# same window is cut from both eyes (stereoCrop.py), which removes the 
+	# strips only one eye sees without moving the zero parallax plane.
+	def WriteCropInfo(self):
+		width, height = self.context.imageSizeX(), self.context.imageSizeY()
+		for name, margin in sorted(self.cropMargins.items()):
+			box = stereoRigMath.CropBox(width, height, margin)
+			stereoLayout.WriteCropInfo(self.output_path, name, {'camera': name, 
+				'eyeSep': self.eyeSep, 'width': width, 'height': height, 
+				'margin': margin, 'box': list(box), 'borderRender': self.cropRender})
+			Log(LOG_INFO, "Crop of %s: %d pixels per side" % (name, margin))
+	
+	# Restrict rendering to the crop window of a rig (Blender's border render). 
+	# Blender still writes full size images, black outside the border, so the 
+	# crop pass is needed either way; this only saves the render time.
+	def SetRenderBorder(self, origCam):
+		margin = self.cropMargins.get(origCam.getName(), 0)
+		width = float(self.context.imageSizeX())
+		try:
+			self.context.setBorder(margin / width, 0., 1. - margin / width, 1.)
+			if not self.borderChanged:
+				self.context.enableBorderRender(1)
+				self.borderChanged = True
+		except Exception, e:
+			Log(LOG_WARNING, "!!!!! WARNING !!!!! Cannot set the render border:", e)
+			self.cropRender = False
+	
 	# Update attributes of destination camera based on source camera
 	def UpdateCameraObject(self, dest, src): 
 		# List of candidates (for reference only)...
@@ -218,9 +723,10 @@ class StereoAnimator:
 		copyable_attr = ['Layer', 'Layers', 'LocX', 'LocY', 'LocZ', 'RotX', 'RotY','RotZ', 'SizeX', 'SizeY', 'SizeZ','dLocX', 'dLocY', 'dLocZ', 'dRotX', 'dRotY', 'dRotZ', 'dSizeX', 'dSizeY', 'dSizeZ', 'dloc','drot', 'dsize', 'game_properties', 'layers', 'loc', 'mat', 'matrix', 'matrixLocal', 'matrixOldWorld', 'matrixParentInverse', 'matrixWorld', 'modifiers','parent','properties', 'rot', 'size', 'tag', 'texSpace','timeOffset', 'track', 'trackAxis', 'transp', 'type', 'upAxis','wireMode', 'xRay']
 		
 		#print "Trying to copy: ", ",".join(copyable_attr)
-		for attr in copyable_attr:
-			self.CopyAttribute(attr, dest, src)
-		print "Copied camera attributes manually"
+		# The first copy probes which attributes work for these camera types, 
+		# later copies only run the resulting plan
+		self.copyPlans.Copy('object', copyable_attr, dest, src)
+		Log(LOG_DEBUG, "Copied camera attributes manually")
 	
 	def UpdateCameraData(self, dest, src):
 		# List of candidates (for reference only)...
@@ -241,91 +747,61 @@ class StereoAnimator:
 		#  'users']
 		#print "NO CAMERA DATA ATTRIBUTES TO COPY"
 		copyable_attr = ['alpha', 'angle','clipEnd', 'clipStart','dofDist','drawLimits', 'drawMist', 'drawName','drawPassepartout', 'drawSize', 'drawTileSafe','lens','mode','scale','shiftX', 'shiftY']
-		for attr in copyable_attr:
-			self.CopyAttribute(attr, dest, src)
-		print "Copied cameraData attributes manually"	
+		self.copyPlans.Copy('data', copyable_attr, dest, src)
+		Log(LOG_DEBUG, "Copied cameraData attributes manually")
 
 	# Create new camera as copy of original
 	# with the name [originalCameraName]+[name_suffix]
-	# RETURN: tuple [cloned camera, cloned camera data]
+	# A camera left over from an earlier run (found through the index built by
+	# IndexScene) is reused and relinked into the scene if necessary.
+	# RETURN: tuple [cloned camera, cloned camera data, what was done]
 	def CloneCamera(self, camera, name_suffix):
+		start = self.trace.Start()
 		
 		dataName = camera.getName() + "_DATA" + name_suffix
 		objectName = camera.getName() + name_suffix
-	
-		# NOTE: this try: except: may not be needed. If the cameraObject
-		#	below is a copy of the original camera, then its cameraData
-		#	is not what we recover or construct here. 
-		try:
-			# try to recover existing camera and camera data objects
-			# if these throw an exception its because the names do not 
-			# exist and we need to create the first instance
-			print "Looking for data: ", dataName
-			cameraData = Camera.Get(dataName)
-			#print "------- OLD: ", cameraData
-			#cameraData.copy(camera.getData())				
-			#print "------- NEW: ", cameraData
-			#self.UpdateCameraData(cameraData, camera.getData())
-			print "Got data"
-		except: 
-			# NO DATA exists (CONSTRUCT IT)
-			# cameraData = camera.copy() #copy.copy(camera.getData()) #Camera.New("persp")
-			cameraData = camera.getData().copy()
-			# try to match the camera data and camera object names
-			cameraData.name = dataName
-			print "+++++ CONSTRUCTED CAMERA DATA"
-	
-		# NOTE: If we copy the camera Object below rather than construct a new 
-		# 		camera, then the copy links to the original camera data. 
-		# 		Presumably this is fine. Since stereo rigs should have the same
-		#		focal distance, lense size, etc as the original camera. 
-		#		We should consider removing the dependency on recovering the 
-		#		camera data above. I left it in there now because it adds very
-		# 		little computation but is a huge life saver if somethign is 
-		#		wrong. 
-		# NOTE: In fact, I can use the shiftX to make the stereo 
-		# 	"Asymmetric Frustrum Parallel Axis Projection Stereo"
-		# 	(see: http://www.orthostereo.com/geometryopengl.html)
-		try:
-			print "Looking for object: ", objectName
-			cameraObject = Object.Get(objectName)
-			print "Got object"
-			#cameraObject.setName(objectName)
-			self.scene.objects.link(cameraObject)
-			print "+++++ RELINKED", objectName
-		except: 
-			# Copy.copy will create a new object, but it will have 
-			# all the settings of the original camera. Also, it is NOT
-			# linked to the scene by default
-			#print "BEFOR COPY"
-			#self.PrintAllBlenderCameras()
-			#EB cameraObject = copy.copy(camera) 
-			#EB cameraObject.setName(objectName)
-			#print "AFTER COPY"
-			#self.PrintAllBlenderCameras()
-			#print "BEFORE LINK"
-			#self.PrintSceneCameras()
-			#EB self.scene.objects.link(cameraObject)
-			#print "AFTER LINK"
-			#self.PrintSceneCameras()
-			#EB print "++++++ COPIED CAMERA OBJECT"
-			##### ALTERNATIVE (COMMENT ALL ABOVE (Up to but excluding "except:") TO USE) #####
+		
+		cameraObject = self.rigIndex.get(objectName)
+		if cameraObject is not None:
+			if self.sceneIndex.has_key(cameraObject.getName()):
+				action = 'reused'
+			else:
+				self.scene.objects.link(cameraObject)
+				self.sceneIndex[cameraObject.getName()] = cameraObject
+				action = 'relinked'
+		else:
+			# NOTE: the camera data is only needed for a new camera object. 
+			# 		Existing data of that name is taken over, otherwise a copy 
+			#		of the original camera data is made.
+			cameraData = self.cameraDataIndex.get(dataName)
+			if cameraData is None:
+				cameraData = camera.getData().copy()
+				# try to match the camera data and camera object names
+				cameraData.name = dataName
+				self.cameraDataIndex[cameraData.name] = cameraData
+			
+			# NOTE: In fact, I can use the shiftX to make the stereo 
+			# 	"Asymmetric Frustrum Parallel Axis Projection Stereo"
+			# 	(see: http://www.orthostereo.com/geometryopengl.html)
 			# this automatically links the camera object into the scene
 			cameraObject = self.scene.objects.new(cameraData)
+			# (Blender appends .001 if a user object already has that name)
 			cameraObject.setName(objectName)
-			print "+++++ CONSTRUCTED Camera", cameraObject
+			cameraObject.properties[RIG_PROPERTY] = objectName
+			self.rigIndex[objectName] = cameraObject
+			self.sceneIndex[cameraObject.getName()] = cameraObject
+			action = 'created'
+		Log(LOG_DEBUG, "Camera", objectName, action)
 		
-		# Good, I dont need to recapture the cameraData object in the try-catch 
-		# above. If I clone the camera object the cameraData belongs to the 
-		# original camera. I only need this to get the dept of field (dofDist) 
+		# I only need the camera data to get the dept of field (dofDist) 
 		# property so I can the crop sizes on the cameras using a parameter 
 		# camera separation!
 		cameraData = cameraObject.getData()
 		
-		print "CameraData \'", cameraData.name, "\' DoF: ", cameraData.dofDist, "\t", cameraObject.getData().dofDist
+		Log(LOG_DEBUG, "CameraData \'", cameraData.name, "\' DoF: ", cameraData.dofDist)
 		
-		# TODO: copy all setting of orginal camera into clone
-		return [cameraObject, cameraData]
+		self.trace.Stop(start, 'clone', camera=camera.getName(), eye=name_suffix)
+		return [cameraObject, cameraData, action]
 	
 	# Copy the rotation and location from a src object to a dest object
 	def CopyRotLoc(self, dest, src):	
@@ -370,136 +846,879 @@ class StereoAnimator:
 		return locations
 	
 	# Create a line segment that can be positioned to match the original camera
-	# but with endpoints that will be the locations of our stereo rig cameras
+	# but with endpoints that will be the locations of our stereo rig cameras.
+	# The mesh of an earlier run is only rebuilt if its length changed.
+	# RETURN: tuple [segment object, what was done]
 	def CreateSegment(self, camera, nameSuffix, length): 
-		editmode = Window.EditMode()    # are we in edit mode?  If so ...
-		if editmode: Window.EditMode(0) # leave edit mode before getting the mesh
-		
 		name = camera.getName() + nameSuffix
 		
 		# define vertices and faces for a pyramid
 		coords=[ [-length/2,0,0], [length/2,0,0] ]  
 		edges=[ [0, 1] ] 
 		
-		try: 
-			print "LOOKING FOR MESHDATA"
-			me = Mesh.Get(name + 'mesh')
-			print dir(me)
-		except:
-			print "COULD NOT FIND MESH" 
-			me = Mesh.New(name + 'mesh')
-		
-		#print "____ EDGES: ", len(me.edges), "____ VERTS: ", len(me.verts)
-		
-		me.verts = None
-		me.edges.delete()
-		
-		#print "____ EDGES: ", len(me.edges), "____ VERTS: ", len(me.verts)
-						
-		me.verts.extend(coords)          # add vertices to mesh
-		me.edges.extend(edges)           # add faces to the mesh (also adds edges)
+		if self.meshIndex is None:
+			self.meshIndex = dict([(me.name, me) for me in Mesh.Get()])
+		me = self.meshIndex.get(name + 'mesh')
+		action = 'reused'
+		if me is None or not self.IsSegment(me, coords):
+			editmode = Window.EditMode()    # are we in edit mode?  If so ...
+			if editmode: Window.EditMode(0) # leave edit mode before getting the mesh
+			if me is None:
+				me = Mesh.New(name + 'mesh')
+				self.meshIndex[me.name] = me
+			else:
+				me.verts = None
+				me.edges.delete()
+			me.verts.extend(coords)          # add vertices to mesh
+			me.edges.extend(edges)           # add faces to the mesh (also adds edges)
+			if editmode: Window.EditMode(1)  # optional, just being nice
+			action = 'rebuilt'
 		
-		#print "____ EDGES: ", len(me.edges), "____ VERTS: ", len(me.verts)
-		try: 
-			print "TRYING TO RECOVER OBJECT: "
-			ob = Object.Get(name)
-			print "++++++ OBJECT RECOVERED: "
-		except: 
-			print "++++++ CREATING NEW OBJECT"
+		ob = self.rigIndex.get(name)
+		if ob is None:
 			ob = self.scene.objects.new(me, name)
-		
-		if editmode: Window.EditMode(1)  # optional, just being nice
-			
-		return ob
+			ob.properties[RIG_PROPERTY] = name
+			self.rigIndex[name] = ob
+			self.sceneIndex[ob.getName()] = ob
+			action = 'created'
+		elif not self.sceneIndex.has_key(ob.getName()):
+			self.scene.objects.link(ob)
+			self.sceneIndex[ob.getName()] = ob
+			action = 'relinked'
+		Log(LOG_DEBUG, "Segment", name, action)
+		return [ob, action]
+	
+	# RETURN: True if the mesh already is the segment with the given endpoints
+	def IsSegment(self, me, coords):
+		if len(me.verts) != len(coords) or len(me.edges) != 1:
+			return False
+		for v, c in zip(me.verts, coords):
+			for i in range(3):
+				if abs(v.co[i] - c[i]) > 1e-6:
+					return False
+		return True
+	
+	# Build name indexes of the scene objects, the rig objects of earlier runs,
+	# camera data and meshes, so rig setup needs no failing Get(name) lookups.
+	# Called by GenerateStereoRigs, one pass over each list.
+	def IndexScene(self):
+		self.sceneObjects = list(self.scene.objects)
+		self.sceneIndex = dict([(ob.getName(), ob) for ob in self.sceneObjects])
+		self.rigIndex = dict([(ob.properties[RIG_PROPERTY], ob) for ob in Object.Get() if self.IsRigObject(ob)])
+		self.cameraDataIndex = dict([(c.getName(), c) for c in Camera.Get()])
+		self.meshIndex = None
 	
+	# RETURN: True if ob is a camera or segment generated for a rig (marked
+	# with RIG_PROPERTY, so user objects with rig names are left alone)
+	def IsRigObject(self, ob):
+		return RIG_PROPERTY in ob.properties
 	
 	# Create the stereo rigs:
 	# 	- A left and right camera for each camera passed into function
 	# 	- Name of each camera will be [originalName]+["_SLEFT"|"_SRIGHT"] 	
+	#	- N-view rigs (SetViews) get cameras [originalName]+"_SV01" ... "_SVnn"
+	# Rigs left over from earlier runs are reconciled rather than rebuilt: 
+	# existing cameras and segments are reused (and relinked if they were 
+	# unlinked) and rig objects of cameras that are no longer rigged are unlinked.
 	def GenerateStereoRigs(self, eyeSeparation):
-		for i, c in enumerate(self.GetCameraList(self.scene)):	
-			[cameraLeft, leftData] = self.CloneCamera(c,'_SLEFT')
-			[cameraRight, rightData] = self.CloneCamera(c,'_SRIGHT')
+		start = self.trace.Start()
+		self.IndexScene()
+		self.rigs = []
+		counts = {}
+		wanted = {}
+		for c in self.GetRigCameraList():
+			rig = RigRecord(c)
+			actions = []
+			for suffix in stereoLayout.ViewSuffixes(self.views):
+				[view, viewData, action] = self.CloneCamera(c, suffix)
+				rig.views.append(view)
+				actions.append(action)
+			rig.left, rig.right = rig.views[0], rig.views[-1]
+			rig.leftData, rig.rightData = rig.left.getData(), rig.right.getData()
+			rig.cached = self.precompute and not self.IsDriven(c)
+			if self.precompute and not rig.cached:
+				Log(LOG_INFO, "Camera", c.getName(), "has a parent, constraints or a track; its rig is placed by UpdateRig")
 			
-			seg = self.CreateSegment(c, '_SEP', eyeSeparation)
+			# The _SEP segment is only needed by the mesh based UpdateRig
+			if not rig.cached or self.verifyRigs:
+				[rig.seg, segAction] = self.CreateSegment(c, '_SEP', eyeSeparation)
+				actions.append(segAction)
 			
-			self.rigs += [[[cameraLeft, cameraRight], seg, c]]
-			self.rig_cams_data += [leftData, rightData]
-			print "Rig generated for ", c.getName(),"\n"
-		print "All rigs generated\n"
+			for ob in rig.views + [rig.seg]:
+				if ob is not None:
+					wanted[ob.getName()] = True
+			for action in actions:
+				counts[action] = counts.get(action, 0) + 1
+			self.rigs.append(rig)
+			Log(LOG_INFO, "Rig generated for ", c.getName(), "(%s)" % ', '.join(actions))
+		
+		# unlink rig objects of earlier runs that no rig uses now
+		for name, ob in self.sceneIndex.items():
+			if self.IsRigObject(ob) and not wanted.has_key(name):
+				self.scene.objects.unlink(ob)
+				del self.sceneIndex[name]
+				counts['unlinked'] = counts.get('unlinked', 0) + 1
+		
+		seconds = self.trace.Stop(start, 'setup')
+		summary = ', '.join(['%d %s' % (n, a) for a, n in sorted(counts.items())])
+		Log(LOG_INFO, "All rigs generated in %.2fs (%s)\n" % (seconds, summary))
 		
+	# Fingerprint of everything that determines how a stereo camera renders:
+	# eye separation, output size, the render settings (RENDER_KEY_SETTINGS),
+	# the camera data and the eye's world matrix. Call after UpdateRig. A 
+	# changed rig or render setting makes the manifest entries stale.
+	# RETURN: hex digest
+	def RigHash(self, stereoCamera):
+		data = stereoCamera.getData()
+		values = [self.eyeSep, data.lens, data.angle, data.scale, data.dofDist, 
+			data.clipStart, data.clipEnd, data.shiftX, data.shiftY]
+		for row in stereoCamera.getMatrix('worldspace'):
+			values += list(row)
+		key = '%s %dx%d %s ' % (data.type, self.context.imageSizeX(), self.context.imageSizeY(), 
+			self.RenderSettingsKey())
+		return hashlib.md5(key + ' '.join(['%.6g' % v for v in values])).hexdigest()
+	
+	# RETURN: the RENDER_KEY_SETTINGS of the rendering context as a string 
+	# (settings this Blender does not have are left out). The image type is
+	# the scene's own while the saver encodes, so a render with and without
+	# the saver makes the same images.
+	def RenderSettingsKey(self):
+		values = []
+		for name in RENDER_KEY_SETTINGS:
+			value = getattr(self.context, name, None)
+			if name == 'imageType' and self.origImageType is not None:
+				value = self.origImageType
+			if value is not None:
+				if isinstance(value, (list, tuple)):
+					value = ','.join(['%.6g' % v for v in value])
+				values.append('%s=%s' % (name, value))
+		return ' '.join(values)
+	
+	# RETURN: the name the rig gave a stereo camera (<camera><suffix>), also
+	# if Blender renamed it; used for the output sequence
+	def RigName(self, stereoCamera):
+		return stereoCamera.properties[RIG_PROPERTY]
+	
+	# RETURN: the eye suffix ('_SLEFT', '_SRIGHT') of a stereo camera
+	def EyeName(self, stereoCamera, origCamera):
+		return self.RigName(stereoCamera)[len(origCamera.getName()):]
+	
+	# RETURN: True if the manifest says this image is done with the current rig
+	def IsFrameComplete(self, frameNum, stereoCamera, origCamera):
+		if not self.resume:
+			return False
+		return self.manifest.IsComplete(frameNum, self.EyeName(stereoCamera, origCamera), 
+			origCamera.getName(), self.RigHash(stereoCamera))
+	
 	# Given a single stereo camera and its original camera, update the 
 	# render a the current frame to disk
 	def RenderFrame(self, frameNum, stereoCamera, origCamera):
 		# Each camera outputs to its own directory to keep files better organized
-		self.context.setRenderPath('%s/%s/%s/%s_' % (self.output_path_orig, origCamera.name, stereoCamera.name, stereoCamera.name))
-		
-		# Set new active camera
-		self.scene.objects.camera = stereoCamera
+		eye = self.EyeName(stereoCamera, origCamera)
+		start = self.trace.Start()
+		self.SwitchCamera(stereoCamera, origCamera)
 	
 		# Render and save a single frame to disk
+		start = self.Timed(start, 'switch', frameNum, eye, origCamera)
+		prefix = stereoLayout.FramePrefix(self.output_path, origCamera.name, self.RigName(stereoCamera))
+		stereoLayout.BreakLink(stereoLayout.FindFrameFile(prefix, frameNum))
 		self.context.render()
-		framestr = '%.4d' % frameNum
+		seconds = self.trace.Stop(start, 'render', frame=frameNum, eye=eye, camera=origCamera.getName())
+		self.NoteRenderCost(frameNum, origCamera.getName(), stereoCamera.getName(), seconds)
+		start = self.trace.Start()
+		framestr = stereoLayout.FrameString(frameNum)
+		if self.saver is not None:
+			return self.SaveInBackground(start, frameNum, stereoCamera, origCamera, prefix)
+		if self.archives is not None:
+			spooled = self.SpoolImage(frameNum, stereoCamera)
+			self.trace.Stop(start, 'save', frame=frameNum, eye=eye, camera=origCamera.getName())
+			if spooled is None:
+				return None
+			return self.StoreImage(frameNum, eye, origCamera.getName(), spooled, self.RigHash(stereoCamera))
 		self.context.saveRenderedImage(framestr)
-		print '\n+++++++ Saved: ', self.context.getFrameFilename(), " +++++++ "
+		self.trace.Stop(start, 'save', frame=frameNum, eye=eye, camera=origCamera.getName())
+		Log(LOG_FRAME, '\n+++++++ Saved: ', self.context.getFrameFilename(), " +++++++ ")
+		
+		# Only now that the image is on disk may it enter the manifest
+		path = stereoLayout.FindFrameFile(prefix, frameNum)
+		if path is None:
+			Log(LOG_WARNING, "!!!!! WARNING !!!!! Cannot find the saved image for frame", frameNum, stereoCamera.name)
+		else:
+			self.manifest.Record(frameNum, eye, origCamera.getName(), path, self.RigHash(stereoCamera))
+		return path
+	
+	# Start saving in background helper processes (see stereoSaver.py). python
+	# is a plain Python interpreter (Blender's own cannot run the helpers).
+	def StartSaver(self, workers, python='python', spool=None, depth=None):
+		self.saver = stereoSaver.SaverPool(workers, depth, python)
+		self.spool = spool or self.spool or tempfile.mkdtemp(prefix='stereo-spool-')
+		stereoLayout.MakeDirs(self.spool)
+		self.saveExt = None
+		# let the helpers encode if they can write the scene's format, so 
+		# Blender only has to dump an uncompressed Targa
+		ext = self.ImageExtension(self.context.imageType)
+		if ext in stereoSaver.PIL_FORMATS and ext != '.tga' and self.saver.canEncode:
+			self.origImageType = self.context.imageType
+			self.context.imageType = Scene.Render.RAWTGA
+			self.saveExt = ext
+		Log(LOG_INFO, "Saving with %d helpers through %s (%s)" % (len(self.saver.processes), self.spool, 
+			self.saveExt and 'encoding to ' + self.saveExt or 'moving only'))
+	
+	# RETURN: the file extension of a Blender image type, or None if the 
+	# save helpers cannot write it
+	def ImageExtension(self, imageType):
+		for name, ext in [('PNG', '.png'), ('JPEG', '.jpg'), ('BMP', '.bmp'), ('TIFF', '.tif'), ('RAWTGA', '.tga')]:
+			if getattr(Scene.Render, name, None) == imageType:
+				return ext
+		return None
+	
+	# Save the rendered image into the spool
+	# RETURN: the spooled file, or None if Blender did not write it
+	def SpoolImage(self, frameNum, stereoCamera):
+		spoolPrefix = os.path.join(self.spool, stereoCamera.name + '_')
+		if self.renderPath != self.spool + os.sep:
+			self.renderPath = self.spool + os.sep
+			self.context.setRenderPath(self.renderPath)
+		self.context.saveRenderedImage(stereoCamera.name + '_' + stereoLayout.FrameString(frameNum))
+		spooled = stereoLayout.FindFrameFile(spoolPrefix, frameNum)
+		if spooled is None:
+			Log(LOG_WARNING, "!!!!! WARNING !!!!! Cannot find the spooled image for frame", frameNum, stereoCamera.name)
+		return spooled
+	
+	# Save the rendered image into the spool and hand it to the saver. The
+	# manifest record is added by CollectSaves once the file is in place.
+	# RETURN: the path the image will have
+	def SaveInBackground(self, start, frameNum, stereoCamera, origCamera, prefix):
+		spooled = self.SpoolImage(frameNum, stereoCamera)
+		eye = self.EyeName(stereoCamera, origCamera)
+		start = self.Timed(start, 'save', frameNum, eye, origCamera)
+		if spooled is None:
+			return None
+		path = prefix + stereoLayout.FrameString(frameNum) + (self.saveExt or os.path.splitext(spooled)[1])
+		if self.archives is not None:
+			# the helpers only encode; StoreImage packs the result
+			path = os.path.join(self.spool, 'pack', os.path.basename(path))
+		index = self.saver.Submit(spooled, path, self.context.quality)
+		self.saveTasks[index] = (frameNum, eye, origCamera.getName(), path, self.RigHash(stereoCamera))
+		self.trace.Stop(start, 'queue', frame=frameNum, eye=eye, camera=origCamera.getName())
+		self.CollectSaves()
+		return path
+	
+	# Record the images the saver finished, in render order
+	def CollectSaves(self, tasks=None):
+		if tasks is None:
+			tasks = self.saver.Completed()
+		for task in tasks:
+			[frameNum, eye, camera, path, rigHash] = self.saveTasks.pop(task['index'])
+			if task.has_key('error'):
+				Log(LOG_WARNING, "!!!!! WARNING !!!!! Cannot save", path, ":", task['error'])
+				self.saveErrors.append((path, task['error']))
+			else:
+				Log(LOG_FRAME, '\n+++++++ Saved: ', path, " +++++++ ")
+				self.StoreImage(frameNum, eye, camera, path, rigHash)
+	
+	# Wait for the saver to write every image handed to it so far
+	def FlushSaves(self):
+		if self.saver is None or self.saver.Idle() and not self.saveTasks:
+			return
+		start = self.trace.Start()
+		self.CollectSaves(self.saver.Flush())
+		self.trace.Stop(start, 'flush')
+	
+	# Flush and stop the saver, and give the scene its image type back
+	def StopSaver(self):
+		if self.saver is None:
+			return
+		self.FlushSaves()
+		self.saver.Close()
+		self.saver = None
+		if self.origImageType is not None:
+			self.context.imageType = self.origImageType
+			self.origImageType = None
+		try:
+			os.rmdir(self.spool)
+		except OSError:
+			pass
+		if self.saveErrors:
+			Log(LOG_WARNING, "!!!!! WARNING !!!!! %d images could not be saved" % len(self.saveErrors))
+	
+	# Pack the images into one archive per camera instead of writing loose
+	# files (see stereoArchive.py). Blender saves into the spool first.
+	def StartArchive(self, spool=None):
+		self.archives = {}
+		self.spool = spool or self.spool or tempfile.mkdtemp(prefix='stereo-spool-')
+		stereoLayout.MakeDirs(self.spool)
+		Log(LOG_INFO, "Packing images into %s archives through %s" % (stereoArchive.ARCHIVE_EXT, self.spool))
+	
+	# RETURN: the archive of an original camera, opened (or created) with an
+	# index that covers all frames of the job. An existing archive of another
+	# number of views is an error: its index has no room for these images.
+	def Archive(self, camera):
+		if not self.archives.has_key(camera):
+			frames = self.GetRenderFrames()
+			views = stereoLayout.ViewSuffixes(self.views)
+			archive = stereoArchive.StereoArchive(stereoArchive.ArchivePath(self.output_path, camera),
+				views, frames, writable=True)
+			if archive.views != views:
+				archive.Close()
+				raise RuntimeError("%s holds the views %s, not %s (render with --views %d or into "
+					"another output directory)" % (archive.path, ','.join(archive.views), ','.join(views),
+					len(archive.views)))
+			if not archive.Covers(min(frames)) or not archive.Covers(max(frames)):
+				archive.Grow([min(frames), max(frames)])
+			self.archives[camera] = archive
+		return self.archives[camera]
+	
+	# Put a saved image where it belongs and record it in the manifest: 
+	# loose files stay where they are, archived images are appended to the 
+	# camera's archive and their spool file is removed
+	# RETURN: the image file or archive
+	def StoreImage(self, frameNum, eye, camera, path, rigHash):
+		if self.archives is None:
+			self.manifest.Record(frameNum, eye, camera, path, rigHash)
+			return path
+		start = self.trace.Start()
+		archive = self.Archive(camera)
+		f = open(path, 'rb')
+		data = f.read()
+		f.close()
+		archive.Append(frameNum, eye, data, os.path.splitext(path)[1])
+		os.remove(path)
+		self.manifest.RecordArchived(frameNum, eye, camera, archive, rigHash)
+		self.trace.Stop(start, 'pack', frame=frameNum, eye=eye, camera=camera)
+		return archive.path
+	
+	# Close the archives and remove the spool (after StopSaver). An archive
+	# in which most image data was replaced by new renders is compacted.
+	def CloseArchives(self):
+		if self.archives is None:
+			return
+		for archive in self.archives.values():
+			garbage = archive.Unreferenced()
+			if garbage and garbage * 2 > os.path.getsize(archive.path) - archive.DataOffset():
+				Log(LOG_INFO, "Compacting %s (%d bytes of replaced images)" % (archive.path, garbage))
+				archive.Compact()
+			archive.Close()
+		self.archives = {}
+		for directory in [os.path.join(self.spool, 'pack'), self.spool]:
+			try:
+				os.rmdir(directory)
+			except OSError:
+				pass
+	
+	# Fingerprint of the animated state of the scene on a frame: world matrix 
+	# and layers of every object outside the rigs, plus armature poses. 
+	# Material, texture, lamp and particle animation is not covered, which
+	# is why skipStatic is off by default. Call with the frame evaluated.
+	# RETURN: hex digest
+	def SceneFingerprint(self, frame):
+		if self.sceneFingerprints.has_key(frame):
+			return self.sceneFingerprints[frame]
+		if self.fingerprintObjects is None:
+			self.fingerprintObjects = [ob for ob in self.sceneObjects if not self.IsRigObject(ob)]
+		digest = hashlib.md5()
+		for ob in self.fingerprintObjects:
+			values = []
+			for row in ob.getMatrix('worldspace'):
+				values += list(row)
+			digest.update('%s %s %s\n' % (ob.getName(), ob.layers, ' '.join(['%.6g' % v for v in values])))
+			if ob.getType() == 'Armature':
+				digest.update(self.PoseFingerprint(ob))
+		self.sceneFingerprints[frame] = digest.hexdigest()
+		return self.sceneFingerprints[frame]
+	
+	# RETURN: the pose matrices of an armature as a string ('' if unavailable)
+	def PoseFingerprint(self, ob):
+		try:
+			bones = ob.getPose().bones
+		except Exception:
+			return ''
+		values = []
+		for name in sorted(bones.keys()):
+			for row in bones[name].poseMatrix:
+				values += list(row)
+		return ' '.join(['%.6g' % v for v in values])
+	
+	# RETURN: fingerprint of everything an eye's image depends on at frame
+	def StaticFingerprint(self, frameNum, stereoCamera):
+		return self.RigHash(stereoCamera) + self.SceneFingerprint(frameNum)
+	
+	# Reuse the last image of an eye if its fingerprint did not change
+	# RETURN: True if the image was reused (no render needed)
+	def ReuseStaticFrame(self, frameNum, stereoCamera, origCamera, fingerprint):
+		last = self.lastOutputs.get(stereoCamera.getName())
+		if last is None or last[0] != fingerprint:
+			return False
+		if self.archives is not None:
+			return self.ReuseArchivedFrame(frameNum, stereoCamera, origCamera, last[2])
+		if not os.path.isfile(last[1]):
+			# the previous image may still be with the saver
+			self.FlushSaves()
+			if not os.path.isfile(last[1]):
+				return False
+		start = self.trace.Start()
+		prefix = stereoLayout.FramePrefix(self.output_path, origCamera.name, self.RigName(stereoCamera))
+		path = prefix + stereoLayout.FrameString(frameNum) + os.path.splitext(last[1])[1]
+		how = stereoLayout.LinkOrCopy(last[1], path)
+		self.staticCounts[how] = self.staticCounts.get(how, 0) + 1
+		eye = self.EyeName(stereoCamera, origCamera)
+		self.manifest.Record(frameNum, eye, origCamera.getName(), path, self.RigHash(stereoCamera))
+		self.trace.Stop(start, 'reuse', frame=frameNum, eye=eye, camera=origCamera.getName())
+		Log(LOG_FRAME, '\tFrame %i of %s unchanged, reused %s (%s)' % (frameNum, stereoCamera.name, last[1], how))
+		return True
+	
+	# Archive version of ReuseStaticFrame: the index entry of frameNum points
+	# at the image data of lastFrame
+	# RETURN: True if the image was reused
+	def ReuseArchivedFrame(self, frameNum, stereoCamera, origCamera, lastFrame):
+		start = self.trace.Start()
+		eye = self.EyeName(stereoCamera, origCamera)
+		archive = self.Archive(origCamera.getName())
+		if archive.Entry(lastFrame, eye) is None:
+			# the previous image may still be with the saver
+			self.FlushSaves()
+		if not archive.Alias(frameNum, eye, lastFrame):
+			return False
+		self.staticCounts['alias'] = self.staticCounts.get('alias', 0) + 1
+		self.manifest.RecordArchived(frameNum, eye, origCamera.getName(), archive, self.RigHash(stereoCamera))
+		self.trace.Stop(start, 'reuse', frame=frameNum, eye=eye, camera=origCamera.getName())
+		Log(LOG_FRAME, '\tFrame %i of %s unchanged, reused frame %i of the archive' % (frameNum, stereoCamera.name, lastFrame))
+		return True
+	
+	# RETURN: one line on the renders saved by skipStatic
+	def StaticReport(self, images):
+		reused = sum(self.staticCounts.values())
+		report = 'Static frames: %d of %d images reused (%d hard links, %d copies' % (reused, images,
+			self.staticCounts.get('link', 0), self.staticCounts.get('copy', 0))
+		if self.archives is not None:
+			report += ', %d archive aliases' % self.staticCounts.get('alias', 0)
+		return report + ')'
+	
+	# Make stereoCamera the active camera and point the render path at its
+	# sequence; both are left alone if they are already set (eye order)
+	def SwitchCamera(self, stereoCamera, origCamera):
+		path = stereoLayout.FramePrefix(self.output_path, origCamera.name, self.RigName(stereoCamera))
+		# with the saver or archives, Blender always saves into the spool (SpoolImage)
+		if self.saver is None and self.archives is None and path != self.renderPath:
+			self.context.setRenderPath(path)
+			self.renderPath = path
+		if self.scene.objects.camera is not stereoCamera:
+			self.scene.objects.camera = stereoCamera
 	
+	# Stop the timer of a phase and start the next one
+	# RETURN: the start time of the next phase
+	def Timed(self, start, phase, frameNum, eye, origCamera):
+		self.trace.Stop(start, phase, frame=frameNum, eye=eye, camera=origCamera.getName())
+		return self.trace.Start()
 	
-	# Render the animation by stepping by frame and rendering all 
-	# cameras per frame.
+	
+	# Seconds per frame evaluation, rig update and camera switch for the 
+	# 'auto' order. Evaluations are measured by PrecomputeRigs (or timed here
+	# on the first two frames), updates and switches on the first rig.
+	# RETURN: (evaluateCost, updateCost, switchCost)
+	def EstimateScheduleCosts(self, frames):
+		evaluations = self.trace.phases.get('evaluate')
+		if not evaluations:
+			for frame in frames[:2]:
+				self.SetFrame(frame)
+			evaluations = self.trace.phases.get('evaluate')
+		evaluateCost = sum(evaluations) / len(evaluations)
+		
+		rig = self.rigs[0]
+		start = self.trace.Start()
+		self.UpdateRigFor(0, self.currentFrame)
+		updateCost = self.trace.Stop(start, 'estimate')
+		self.updatedRig = None
+		
+		start = self.trace.Start()
+		for stereoCam in rig.Eyes():
+			self.SwitchCamera(stereoCam, rig.orig)
+		switchCost = self.trace.Stop(start, 'estimate') / len(rig.Eyes())
+		return evaluateCost, updateCost, switchCost
+	
+	# Pick the render order and build the task list
+	# RETURN: list of (frame, rig index, eye index)
+	def ScheduleTasks(self, frames):
+		order = self.order
+		if order == 'auto':
+			if not self.rigs or not frames:
+				order = 'frame'
+			else:
+				costs = self.EstimateScheduleCosts(frames)
+				order = stereoSchedule.ChooseOrder(len(frames), len(self.rigs), self.views, *costs)
+				Log(LOG_INFO, "Render order: %s (%.1fms per evaluation, %.1fms per rig update, %.1fms per switch)" % 
+					((order,) + tuple([c * 1e3 for c in costs])))
+		tasks = stereoSchedule.BuildTasks(frames, len(self.rigs), self.views, order)
+		[evaluations, updates, switches] = stereoSchedule.Counts(order, len(frames), len(self.rigs), self.views)
+		Log(LOG_INFO, "%d images in %s order: %d frame evaluations, %d rig updates, %d camera switches" % 
+			(len(tasks), order, evaluations, updates, switches))
+		return order, tasks
+	
+	# Get the new position, rotation, scale, etc from the original camera,
+	# unless the rig is already set up for this frame
+	def UpdateRigFor(self, rigIndex, frame):
+		if self.updatedRig == (frame, rigIndex):
+			return
+		rig = self.rigs[rigIndex]
+		views = len(rig.views) > 2 and rig.views or None
+		start = self.trace.Start()
+		if rig.cached:
+			self.UpdateRigCached(rig.left, rig.right, rig.orig, frame, views)
+			if self.verifyRigs:
+				self.CheckRigCache(rig.seg, rig.orig, frame)
+		else:
+			self.UpdateRig(rig.left, rig.right, rig.seg, rig.orig, views)
+			self.NoteCurrentCropMargin(rig.orig)
+		if self.cropRender:
+			self.SetRenderBorder(rig.orig)
+		self.updatedRig = (frame, rigIndex)
+		self.trace.Stop(start, 'update', frame=frame, camera=rig.name)
+	
+	# Render a list of (frame, rig index, eye index) tasks in list order. The
+	# scene is only re-evaluated when the frame changes and a rig only 
+	# updated when the frame or rig changes.
+	def RenderTasks(self, tasks, order):
+		perFrame = float(self.views * len(self.rigs))
+		lastFrame = None
+		for (frame, rigIndex, eyeIndex) in tasks:
+			if order == 'frame' and frame != lastFrame:
+				Log(LOG_FRAME, '\tRendering frame %i of %i.' % (frame, tasks[-1][0]))
+				frameStart = self.trace.Start()
+			lastFrame = frame
+			if frame != self.currentFrame:
+				self.SetFrame(frame)
+				self.updatedRig = None
+			self.UpdateRigFor(rigIndex, frame)
+			rig = self.rigs[rigIndex]
+			stereoCam = rig.Eyes()[eyeIndex]
+			self.renderSeconds = None
+			if self.IsFrameComplete(frame, stereoCam, rig.orig):
+				Log(LOG_FRAME, '\tSkipping frame %i of %s (already rendered)' % (frame, stereoCam.name))
+			elif self.skipStatic:
+				fingerprint = self.StaticFingerprint(frame, stereoCam)
+				if not self.ReuseStaticFrame(frame, stereoCam, rig.orig, fingerprint):
+					path = self.RenderFrame(frame, stereoCam, rig.orig)
+					if path is not None:
+						self.lastOutputs[stereoCam.getName()] = (fingerprint, path, frame)
+			else:
+				self.RenderFrame(frame, stereoCam, rig.orig)
+			if self.costTracker is not None:
+				self.costTracker.Done(self.PredictRender(frame, rig.name), self.renderSeconds)
+			
+			done = self.trace.FramesDone()
+			self.trace.FrameDone(1. / perFrame)
+			if order == 'frame' and rigIndex == len(self.rigs) - 1 and eyeIndex == self.views - 1:
+				self.trace.Stop(frameStart, 'frame', frame=frame)
+			if self.trace.FramesDone() > done:
+				Log(LOG_FRAME, '\t' + self.trace.Progress())
+	
+	# Time renders to predict the render time of every (frame, camera) with
+	# a stereoCost.CostModel kept in path (appended to by every run of the
+	# shot). Before rendering, samples frames of every camera are rendered at
+	# preview settings and timed (not saved); the final renders are timed 
+	# too, logged next to their prediction and added to the model.
+	def SetCostModel(self, path, samples=0, costOnly=False):
+		self.costModel = stereoCost.CostModel(path)
+		self.costSamples = samples
+		self.costOnly = costOnly
+	
+	# RETURN: pixels of a render at the current settings
+	def RenderPixels(self):
+		size = getattr(self.context, 'renderwinSize', 100)
+		return int(self.context.imageSizeX() * self.context.imageSizeY() * (size / 100.) ** 2)
+	
+	# RETURN: predicted seconds of a final render of one eye of a camera
+	def PredictRender(self, frame, camera):
+		return self.costModel.Predict(camera, frame, self.context.imageSizeX() * self.context.imageSizeY())
+	
+	# Add a render to the cost model (previews as such, see RenderPass)
+	def NoteRenderCost(self, frame, camera, eye, seconds):
+		self.renderSeconds = seconds
+		if self.costModel is None:
+			return
+		if self.previewRestore:
+			self.costModel.Observe(camera, frame, seconds, 'preview', self.previewSize, self.RenderPixels())
+			return
+		predicted = self.PredictRender(frame, camera)
+		self.costModel.Observe(camera, frame, seconds, 'render', 100, self.RenderPixels(), predicted)
+		if predicted is not None:
+			Log(LOG_FRAME, '\tRendered frame %i of %s in %.2fs (predicted %.2fs%s)' % (frame, eye, seconds, predicted,
+				not self.costModel.Calibrated() and ', uncalibrated' or ''))
+	
+	# Render costSamples frames of every rig at preview settings (left eye,
+	# nothing saved) and add their times to the cost model
+	def SampleCosts(self, frames):
+		if self.costSamples < 1 or not self.rigs:
+			return
+		sampled = stereoCost.SampleFrames(frames, self.costSamples)
+		Log(LOG_INFO, "Timing %d samples per camera at %d%% (frames %s)" % (len(sampled), COST_SAMPLE_SIZE,
+			stereoLayout.FormatFrameSpec(sampled)))
+		self.ApplyPreviewSettings(COST_SAMPLE_SIZE)
+		try:
+			pixels = self.RenderPixels()
+			for frame in sampled:
+				if frame != self.currentFrame:
+					self.SetFrame(frame)
+					self.updatedRig = None
+				for rigIndex, rig in enumerate(self.rigs):
+					self.UpdateRigFor(rigIndex, frame)
+					self.SwitchCamera(rig.left, rig.orig)
+					start = self.trace.Start()
+					self.context.render()
+					seconds = self.trace.Stop(start, 'sample', frame=frame, camera=rig.name)
+					self.costModel.Observe(rig.name, frame, seconds, 'sample', COST_SAMPLE_SIZE, pixels)
+		finally:
+			self.RestoreRenderSettings()
+		self.costModel.Flush()
+	
+	# Predict the final renders of the job and log the expected render time
+	def PlanCosts(self, frames):
+		predictions = []
+		for frame in frames:
+			for rig in self.rigs:
+				predictions += [self.PredictRender(frame, rig.name)] * self.views
+		self.costTracker = stereoCost.CostTracker(predictions, self.costModel.Calibrated())
+		if self.costModel.HasData() and not self.costModel.Calibrated():
+			Log(LOG_INFO, "Predicted render time: %s for %d images (uncalibrated: only %d%% samples with cheap "
+				"settings so far, final renders take longer)" % (stereoTrace.FormatDuration(self.costTracker.remaining),
+				len(predictions), COST_SAMPLE_SIZE))
+		elif self.costModel.HasData():
+			Log(LOG_INFO, "Predicted render time: %s for %d images" % (
+				stereoTrace.FormatDuration(self.costTracker.remaining), len(predictions)))
+		else:
+			Log(LOG_INFO, "No render times of this shot yet; the ETA follows the frames rendered so far")
+	
+	# RETURN: a line comparing the predicted and actual render time of the job
+	def CostReport(self):
+		tracker = self.costTracker
+		if tracker.predicted <= 0:
+			return "Render time: %s, nothing predicted" % stereoTrace.FormatDuration(sum(self.trace.phases.get('render', [])))
+		return "Render time: predicted %s, actual %s (%+.1f%%)" % (stereoTrace.FormatDuration(tracker.predicted), 
+			stereoTrace.FormatDuration(tracker.actual), (tracker.actual / tracker.predicted - 1.) * 100.)
+	
+	# Render low resolution previews before the full render: every step-th 
+	# frame at size percent (25, 50 or 75) with cheap render settings, then 
+	# the frames in between; anaglyphs of the previews are composited in the
+	# background by python as they come in. The full resolution passes follow
+	# (unless previewOnly) with the same rigs.
+	def SetPreview(self, step, size=25, previewOnly=False, python='python'):
+		self.previewStep = step
+		self.previewSize = size
+		self.previewOnly = previewOnly
+		self.previewPython = python
+	
+	# Switch the cheap preview render settings on (see PREVIEW_SETTINGS) at
+	# size percent (default: previewSize); settings this Blender does not
+	# have are left alone
+	def ApplyPreviewSettings(self, size=None):
+		self.RestoreRenderSettings()
+		for attr, value in [('renderwinSize', size or self.previewSize)] + PREVIEW_SETTINGS:
+			if hasattr(self.context, attr):
+				self.previewRestore.append((attr, getattr(self.context, attr)))
+				setattr(self.context, attr, value)
+	
+	def RestoreRenderSettings(self):
+		for attr, value in self.previewRestore:
+			setattr(self.context, attr, value)
+		self.previewRestore = []
+	
+	# Composite the anaglyphs of the preview frames in the background; waits
+	# for the previous chunk's compositor first
+	def CompositePreview(self, frames):
+		self.WaitComposite()
+		if self.views != 2:
+			return
+		root = self.output_path
+		script = os.path.join(os.path.dirname(os.path.abspath(stereoLayout.__file__)), 'stereoComposite.py')
+		command = [self.previewPython, script, '--mode', 'anaglyph', '--workers', '1',
+			'--frames', stereoLayout.FormatFrameSpec(frames),
+			'--cameras', ','.join([rig.name for rig in self.rigs]), root]
+		log = open(os.path.join(root, 'composite.log'), 'a')
+		try:
+			self.compositor = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+		except OSError, e:
+			Log(LOG_WARNING, "!!!!! WARNING !!!!! Cannot composite the previews with %s: %s" % (self.previewPython, e))
+		log.close()
+	
+	def WaitComposite(self):
+		if self.compositor is None:
+			return
+		if self.compositor.wait() != 0:
+			Log(LOG_WARNING, "!!!!! WARNING !!!!! Compositing the previews failed, see composite.log")
+		self.compositor = None
+	
+	# Render one pass of frames: a preview pass into <output>/preview (its own 
+	# manifest, so previews never count as final images) in chunks that are
+	# composited as soon as they are saved, or a full resolution pass
+	# RETURN: number of images of the pass
+	def RenderPass(self, frames, preview, manifest):
+		finalOutput = self.output_path
+		images = 0
+		if preview:
+			self.output_path = os.path.join(finalOutput, stereoLayout.PREVIEW_DIR)
+			self.manifest = stereoManifest.FrameManifest(self.output_path)
+			self.ApplyPreviewSettings()
+			chunks = stereoLayout.SplitFrames(frames, PREVIEW_CHUNK)
+		else:
+			self.manifest = manifest
+			chunks = [frames]
+		# archives are for the final images; previews stay loose files
+		archives = self.archives
+		if preview:
+			self.archives = None
+		# the tracker counts the final renders it predicted, not the previews
+		tracker = self.costTracker
+		if preview:
+			self.costTracker = None
+		self.trace.predictor = self.costTracker
+		self.lastOutputs = {}
+		try:
+			for chunk in chunks:
+				[order, tasks] = self.ScheduleTasks(chunk)
+				self.RenderTasks(tasks, order)
+				images += len(tasks)
+				if preview:
+					self.FlushSaves()
+					self.CompositePreview(chunk)
+			self.FlushSaves()
+		finally:
+			self.archives = archives
+			self.costTracker = tracker
+			self.output_path = finalOutput
+			self.RestoreRenderSettings()
+			if self.costModel is not None:
+				self.costModel.Flush()
+		return images
+	
+	# Render the animation. By default this steps by frame and renders all 
+	# cameras per frame; see SetOrder for the other orders and SetPreview for
+	# preview passes.
 	# 
 	# TODO: Catch keyboard interrupt of rendering process
 	def RenderAllRigsByFrame(self):
 		self.GenerateStereoRigs(self.eyeSep)
 		self.PrintStereoRigs()
-		for frame in range(self.context.startFrame(), self.context.endFrame()+1): 
-			print '\tRendering frame %i of %i.' % (frame, self.context.endFrame())
-			self.context.currentFrame(frame)
-		
-			# loop over all the cameras in this scene, set active and render.
-			for [[leftCam,rightCam], cameraSep, origCam] in self.rigs:
-				# Get the new position, rotation, scale, etc from the original camera
-				self.UpdateRig(leftCam,rightCam,cameraSep,origCam)
-				self.RenderFrame(frame, leftCam, origCam)
-				self.RenderFrame(frame, rightCam, origCam)
-			print 'Animation Complete' 
+		manifest = stereoManifest.FrameManifest(self.output_path, self.resumeFrom)
+		frames = self.GetRenderFrames()
+		if self.archives is not None:
+			# fail on archives of other views before anything is rendered
+			for rig in self.rigs:
+				if os.path.isfile(stereoArchive.ArchivePath(self.output_path, rig.orig.getName())):
+					self.Archive(rig.orig.getName())
+		if self.precompute:
+			self.PrecomputeRigs(frames)
+		if self.comfortLimits is not None:
+			bad = self.AnalyseComfort()
+			if bad and self.comfortMode == 'abort':
+				raise RuntimeError("%d frames exceed the stereo comfort limits, not rendering" % bad)
+			if self.comfortMode == 'only':
+				frames = []
+		if self.costModel is not None and frames:
+			self.SampleCosts(frames)
+			if self.costOnly:
+				frames = []
+			else:
+				self.PlanCosts(frames)
+		passes = stereoSchedule.RefinementPasses(frames, self.previewStep, self.previewOnly)
+		self.trace.SetFrameCount(sum([len(f) for p, f in passes]))
+		images = 0
+		for index, (preview, passFrames) in enumerate(passes):
+			if len(passes) > 1:
+				Log(LOG_INFO, 'Pass %d of %d: %s, frames %s' % (index + 1, len(passes), 
+					preview and 'preview at %d%%' % self.previewSize or 'full resolution',
+					stereoLayout.FormatFrameSpec(passFrames)))
+			images += self.RenderPass(passFrames, preview, manifest)
+		self.WaitComposite()
+		self.StopSaver()
+		self.CloseArchives()
+		Log(LOG_INFO, 'Animation Complete')
+		if self.skipStatic:
+			Log(LOG_INFO, self.StaticReport(images))
+		self.WriteCropInfo()
+		if self.costTracker is not None:
+			Log(LOG_INFO, self.CostReport())
+		Log(LOG_INFO, self.trace.Summary())
+		self.trace.Close()
 	
 	
 	
 	# Cleanup (NOTE: This is called by the garbage collector and guarantees we have
 	# 			the opportunity to delete all stereo camera rigs)
+	def __del__(self):
+		self.Cleanup()
+	
 	# 	1) Restore original settings
 	#	2) Unlink the stereo rigs
-	def __del__(self):
+	# Called by RunJob as soon as a job is done, so the next job of the same
+	# process starts from the original scene; later calls do nothing
+	def Cleanup(self):
+		if not hasattr(self, 'rigs'):
+			return
+		# Every image must be on disk before the scene is restored
+		self.StopSaver()
+		self.CloseArchives()
+		self.WaitComposite()
+		self.RestoreRenderSettings()
+		if self.costModel is not None:
+			self.costModel.Flush()
+		
 		# Restore original settings
 		if self.orig_cam:
 			self.scene.objects.camera = self.orig_cam
 		self.context.setRenderPath(self.output_path_orig)
+		if self.currentFrame is not None and self.currentFrame != self.orig_frame:
+			self.SetFrame(self.orig_frame)
+		if self.borderChanged:
+			try:
+				self.context.enableBorderRender(0)
+			except Exception:
+				Log(LOG_WARNING, "ERROR! Cannot switch off border rendering!")
 
-		print "Cleaning up stereo rigs"
-		for [[l,r],s, o] in self.rigs:
-			self.scene.objects.unlink(l)
-			self.scene.objects.unlink(r)
-			self.scene.objects.unlink(s)
+		Log(LOG_INFO, "Cleaning up stereo rigs")
+		for rig in self.rigs:
+			for ob in rig.views + [rig.seg]:
+				if ob is not None:
+					self.scene.objects.unlink(ob)
 			
 		try: 
 			del self.rigs
 		except: 
-			print "ERROR! Cannot del rig_cams!"		
-
-		try: 
-			del self.rig_cams_data
-		except: 
-			print "ERROR! Cannot del rig_cam_data!"		
+			Log(LOG_WARNING, "ERROR! Cannot del rigs!")
 
 		# NOTE: the camera data is not unlinked because its not possible to do that. 
 		# 		When Blender quits the memory is deleted. If we call it by name we 
 		#		can reuse the data
-		print "Done with cleanup\n"
+		Log(LOG_INFO, "Done with cleanup\n")
 	
 	
 	
 	
-eyeSep = 6.3 * bu # cm 
+# Defaults of --eye-sep and --units
+eyeSepCm = 6.3 # cm
+eyeSep = eyeSepCm * bu
+
+# Render settings of the preview passes (RenderData attributes)
+PREVIEW_SETTINGS = [('oversampling', False), ('rayTracing', False)]
+
+# RenderData attributes that change the saved image, part of RigHash: an image
+# rendered with other settings is not complete for --resume or --skip-static
+RENDER_KEY_SETTINGS = ['imageType', 'quality', 'oversampling', 'OSALevel', 'rayTracing', 'renderwinSize',
+	'border']
+PREVIEW_CHUNK = 10		# preview frames rendered before they are composited
+
+# Render size of the cost samples in percent (with the preview settings)
+COST_SAMPLE_SIZE = 25
+
+# ID property that marks the cameras and segments generated for a rig, with
+# the name the rig gave them (<camera><suffix>); saved with the .blend, so
+# later runs find them even if Blender had to rename them
+RIG_PROPERTY = 'stereoRig'
+
+# Object types whose bounding boxes the comfort check projects
+COMFORT_TYPES = ['Mesh', 'Curve', 'Surf', 'Text', 'MBall']
+
+# Image types of --format (Blender.Scene.Render constants)
+FORMATS = {'png': 'PNG', 'jpg': 'JPEG', 'tga': 'TARGA', 'rawtga': 'RAWTGA', 'bmp': 'BMP', 'tif': 'TIFF'}
 
 # Properties needed: 
 # Blender Units Scale (1 B.U. == ?? cm; typically 1 BU = 1 CM)
@@ -514,10 +1733,218 @@ eyeSep = 6.3 * bu # cm
 # 	CameraData.shiftX ==> horizontal offset in view (this is parallel stereo, not toed in)
 # 	For details on "Asymmetric frustum parallel axis projection stereo"
 # 	see http://www.orthostereo.com/geometryopengl.html
-animator = StereoAnimator(Scene.GetCurrent(), eyeSep)
-animator.RenderAllRigsByFrame()
 
+# Options are read from the arguments after "--", e.g.
+#	blender -b shot.blend -P StereoAnimator.py -- --frames 1-250 --output /tmp/shot
+# (this is how stereoDispatch.py starts its shard workers). Without arguments the
+# whole animation is rendered into the scene render path, as before.
+def ParseArguments(argv):
+	if '--' in argv:
+		argv = argv[argv.index('--')+1:]
+	else:
+		argv = []
+	return OptionParser().parse_args(argv)
+
+# RETURN: the option parser of the command line and of the lines of --jobs
+def OptionParser():
+	parser = optparse.OptionParser(usage="blender -b file.blend -P StereoAnimator.py -- [options]")
+	parser.add_option('--jobs', dest='jobs', default=None,
+		help="render one job per line of this file; each line holds options like these, "
+			"which override the ones given here ('#' starts a comment)")
+	parser.add_option('--scene', dest='scene', default=None,
+		help="name of the scene to render (default: the current scene)")
+	parser.add_option('--eye-sep', dest='eyeSep', type='float', default=eyeSepCm,
+		help="eye separation in cm (default: %g)" % eyeSepCm)
+	parser.add_option('--units', dest='units', type='float', default=bu,
+		help="Blender units per cm, the 'bu' setting at the top of this file (default: %g)" % bu)
+	parser.add_option('--format', dest='format', default=None, choices=sorted(FORMATS.keys()),
+		help="image format: %s (default: the scene's)" % ', '.join(sorted(FORMATS.keys())))
+	parser.add_option('--quality', dest='quality', type='int', default=None,
+		help="JPEG quality (default: the scene's)")
+	parser.add_option('--frames', dest='frames', default=None,
+		help="frames to render, e.g. '1-100,120' (default: the scene frame range)")
+	parser.add_option('--cameras', dest='cameras', default=None,
+		help="comma separated camera names or patterns to rig (default: all cameras)")
+	parser.add_option('--output', dest='output', default=None,
+		help="output root directory (default: the scene render path)")
+	parser.add_option('--shard-done', dest='shardDone', default=None,
+		help="file written once every frame has been rendered (used by stereoDispatch.py)")
+	parser.add_option('--no-precompute', dest='precompute', action='store_false', default=True,
+		help="position the eyes with the _SEP meshes every frame instead of precomputing them")
+	parser.add_option('--verify-rigs', dest='verifyRigs', action='store_true', default=False,
+		help="check the precomputed eye positions against the _SEP meshes on every frame")
+	parser.add_option('--copy-report', dest='copyReport', action='store_true', default=False,
+		help="print which camera attributes are copied and why the others are skipped")
+	parser.add_option('--log-level', dest='logLevel', default='frame',
+		help="warning, info, frame (default) or debug")
+	parser.add_option('--trace', dest='trace', default=None,
+		help="append per frame/eye/camera timings as JSON lines to this file")
+	parser.add_option('--views', dest='views', type='int', default=2,
+		help="cameras per rig, evenly spread over the eye separation (default: 2, stereo)")
+	parser.add_option('--order', dest='order', default='frame', choices=stereoSchedule.ORDERS,
+		help="render order: %s (default: frame)" % ', '.join(stereoSchedule.ORDERS))
+	parser.add_option('--skip-static', dest='skipStatic', action='store_true', default=False,
+		help="hard link (or copy) the previous image of an eye instead of rendering it again "
+			"when neither its rig nor any object in the scene moved")
+	parser.add_option('--async-save', dest='asyncSave', type='int', default=0, metavar='N',
+		help="save images with N background helper processes while the next image renders")
+	parser.add_option('--save-python', dest='savePython', default='python',
+		help="Python interpreter for the save helpers and the preview anaglyphs (default: python)")
+	parser.add_option('--save-spool', dest='saveSpool', default=None,
+		help="local directory Blender saves into for the helpers (default: a new temporary directory)")
+	parser.add_option('--save-depth', dest='saveDepth', type='int', default=None,
+		help="images queued at most before rendering waits for the helpers (default: 2 per helper)")
+	parser.add_option('--archive', action='store_true', default=False,
+		help="pack the images of each camera into one <Camera>.stereopack archive instead of "
+			"a file per frame and eye (see stereoArchive.py)")
+	parser.add_option('--crop-render', dest='cropRender', action='store_true', default=False,
+		help="only render the convergence crop window of each camera (needs precomputed rigs)")
+	parser.add_option('--preview', dest='preview', type='int', default=0, metavar='N',
+		help="first render every Nth frame at low resolution with anaglyphs into <output>/preview, "
+			"then the frames in between, then the full resolution passes")
+	parser.add_option('--preview-size', dest='previewSize', type='choice', choices=['25', '50', '75'],
+		default='25', help="render size of the previews in percent: 25 (default), 50 or 75")
+	parser.add_option('--preview-only', dest='previewOnly', action='store_true', default=False,
+		help="stop after the preview passes")
+	parser.add_option('--comfort', action='store_true', default=False,
+		help="check the screen disparity of the objects on every frame before rendering and "
+			"report frames beyond the comfort limits (see stereoComfort.py)")
+	parser.add_option('--comfort-abort', dest='comfortAbort', action='store_true', default=False,
+		help="do not render if a frame exceeds the comfort limits (implies --comfort)")
+	parser.add_option('--comfort-only', dest='comfortOnly', action='store_true', default=False,
+		help="only check the comfort limits, render nothing (implies --comfort)")
+	parser.add_option('--max-crossed', dest='maxCrossed', type='float', default=stereoComfort.DEFAULT_MAX_CROSSED,
+		help="largest disparity in front of the screen, %% of the image width (default: %g)" % 
+			stereoComfort.DEFAULT_MAX_CROSSED)
+	parser.add_option('--max-uncrossed', dest='maxUncrossed', type='float', 
+		default=stereoComfort.DEFAULT_MAX_UNCROSSED,
+		help="largest disparity behind the screen, %% of the image width (default: %g)" % 
+			stereoComfort.DEFAULT_MAX_UNCROSSED)
+	parser.add_option('--cost-model', dest='costModel', default=None, metavar='FILE',
+		help="predict render times with the render times of earlier runs in FILE and add this "
+			"run's to it (see stereoCost.py; default with --cost-sample: next to the .blend)")
+	parser.add_option('--cost-sample', dest='costSample', type='int', default=0, metavar='N',
+		help="time N frames of every camera at %d%% before rendering, for the cost model" % COST_SAMPLE_SIZE)
+	parser.add_option('--cost-only', dest='costOnly', action='store_true', default=False,
+		help="stop after timing the samples")
+	parser.add_option('--resume', action='store_true', default=False,
+		help="skip images that are complete in the output manifest and whose rig did not change")
+	parser.add_option('--resume-from', dest='resumeFrom', action='append', default=[],
+		help="another output root whose completed images count as done (implies --resume)")
+	return parser
+
+# RETURN: the options of every line of a --jobs file, on top of the command 
+# line options
+def ReadJobs(path, options):
+	parser = OptionParser()
+	jobs = []
+	f = open(path)
+	for line in f:
+		args = shlex.split(line, comments=True)
+		if not args:
+			continue
+		(job, rest) = parser.parse_args(args, copy.deepcopy(options))
+		if rest or job.jobs != options.jobs:
+			parser.error("unexpected '%s' in %s" % (' '.join(rest) or '--jobs', path))
+		jobs.append(job)
+	f.close()
+	return jobs
+
+# Render one job with the given options (as returned by ParseArguments) and 
+# put the scene back the way it was
+# RETURN: the StereoAnimator of the job (cleaned up)
+def RunJob(options):
+	stereoTrace.SetLogLevel(options.logLevel)
+	current = scene = Scene.GetCurrent()
+	if options.scene:
+		scene = Scene.Get(options.scene)
+		scene.makeCurrent()
+	context = scene.getRenderingContext()
+	settings = (context.imageType, context.quality)
+	if options.format:
+		context.imageType = getattr(Scene.Render, FORMATS[options.format])
+	if options.quality is not None:
+		context.quality = options.quality
+	try:
+		animator = StereoAnimator(scene, options.eyeSep * options.units)
+		try:
+			ConfigureJob(animator, options)
+			animator.RenderAllRigsByFrame()
+		finally:
+			animator.Cleanup()
+	finally:
+		(context.imageType, context.quality) = settings
+		if scene is not current:
+			current.makeCurrent()
+	
+	# Blender exits with status 0 even if the script failed, so tell the 
+	# dispatcher explicitly that this shard is complete
+	if options.shardDone and not animator.saveErrors:
+		f = open(options.shardDone, 'w')
+		f.write('%d\n' % len(animator.GetRenderFrames()))
+		f.close()
+	return animator
+
+# Apply the command line options to a new StereoAnimator
+def ConfigureJob(animator, options):
+	if options.frames:
+		animator.SetFrames(stereoLayout.ParseFrameSpec(options.frames))
+	if options.cameras:
+		animator.SetCameraFilter(options.cameras.split(','))
+	if options.output:
+		animator.SetOutputPath(options.output)
+	animator.precompute = options.precompute
+	animator.SetOrder(options.order)
+	animator.SetViews(options.views)
+	animator.skipStatic = options.skipStatic
+	if options.asyncSave > 0:
+		animator.StartSaver(options.asyncSave, options.savePython, options.saveSpool, options.saveDepth)
+	if options.archive:
+		animator.StartArchive(options.saveSpool)
+	animator.copyPlans.diagnostics = options.copyReport
+	if options.trace:
+		animator.SetTraceFile(options.trace)
+	animator.verifyRigs = options.verifyRigs
+	if options.cropRender and not options.precompute:
+		Log(LOG_WARNING, "--crop-render needs the precomputed rigs; rendering full frames")
+	animator.cropRender = options.cropRender and options.precompute
+	if options.resume or options.resumeFrom:
+		animator.SetResume(True, options.resumeFrom)
+	if options.costModel or options.costSample > 0:
+		blendFile = Blender.Get('filename')
+		path = options.costModel or (blendFile and stereoCost.ModelPath(blendFile) or 
+			os.path.join(animator.output_path, 'untitled' + stereoCost.MODEL_EXT))
+		animator.SetCostModel(path, options.costSample, options.costOnly)
+	if options.comfort or options.comfortAbort or options.comfortOnly:
+		if options.precompute:
+			mode = options.comfortOnly and 'only' or options.comfortAbort and 'abort' or 'report'
+			animator.SetComfort(options.maxCrossed, options.maxUncrossed, mode, options.savePython)
+		else:
+			Log(LOG_WARNING, "--comfort needs the precomputed rigs; not checking")
+	if options.preview > 0 or options.previewOnly:
+		animator.SetPreview(max(1, options.preview), int(options.previewSize), options.previewOnly, 
+			options.savePython)
+
+# Run the job of the command line, or each job of --jobs in turn. A failed
+# job is reported and the next one started.
+# RETURN: the number of failed jobs
+def main(argv):
+	(options, args) = ParseArguments(argv)
+	if not options.jobs:
+		RunJob(options)
+		return 0
+	jobs = ReadJobs(options.jobs, options)
+	failed = 0
+	for index, job in enumerate(jobs):
+		Log(LOG_INFO, "===== Job %d of %d: frames %s, cameras %s, eye separation %g cm =====" % (index + 1, 
+			len(jobs), job.frames or 'all', job.cameras or 'all', job.eyeSep))
+		try:
+			RunJob(job)
+		except Exception:
+			failed += 1
+			Log(LOG_WARNING, "!!!!! ERROR !!!!! Job %d failed:\n%s" % (index + 1, traceback.format_exc()))
+	Log(LOG_INFO, "%d of %d jobs rendered" % (len(jobs) - failed, len(jobs)))
+	return failed
 
-# TODO: 
-#	- Calculate the image cropping given eyeSeparation and dofDist in original cameraData
-# 	- Perform crop on each frame
\ No newline at end of file
+if __name__ == '__main__':
+	main(sys.argv)
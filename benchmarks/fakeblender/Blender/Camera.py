@@ -0,0 +1,8 @@
+# Fake Blender.Camera (see _data.py)
+import _data
+
+def New(type='persp', name='CA'):
+	return _data.CameraData(type, name)
+
+def Get(name=None):
+	return _data.Lookup(_data.cameraData, name, 'camera')
@@ -0,0 +1,8 @@
+# Fake Blender.Mesh (see _data.py)
+import _data
+
+def New(name='Mesh'):
+	return _data.MeshData(name)
+
+def Get(name=None):
+	return _data.Lookup(_data.meshes, name, 'mesh')
@@ -0,0 +1,5 @@
+# Fake Blender.Object (see _data.py)
+import _data
+
+def Get(name=None):
+	return _data.Lookup(_data.objects, name, 'object')
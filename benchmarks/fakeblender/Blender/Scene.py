@@ -0,0 +1,27 @@
+# Fake Blender.Scene (see _data.py)
+import _data
+
+def New(name='Scene'):
+	return _data.SceneData(name)
+
+def Get(name=None):
+	if name is None:
+		return list(_data.scenes)
+	for scene in _data.scenes:
+		if scene.name == name:
+			return scene
+	raise NameError("scene \"%s\" not found" % name)
+
+def GetCurrent():
+	if not _data.scenes:
+		_data.SceneData()
+	return _data.scenes[0]
+
+# Image type constants of Blender.Scene.Render (values of Blender's R_* defines)
+class Render:
+	TARGA = 0
+	JPEG = 4
+	RAWTGA = 14
+	PNG = 17
+	BMP = 20
+	TIFF = 22
@@ -0,0 +1,4 @@
+# Fake Blender.Window (see _data.py)
+
+def EditMode(enable=None):
+	return 0
@@ -0,0 +1,15 @@
+# Fake "Blender" module for running StereoAnimator.py without Blender; see
+# _data.py and benchmarks/stereoBench.py. Put benchmarks/fakeblender first on
+# sys.path to use it.
+#############################################################################################
+import _data
+import Camera, Object, Scene, Mesh, Window
+
+def Get(request):
+	return _data.state[request]
+
+def Set(request, value):
+	_data.state[request] = value
+	if request == 'curframe':
+		for scene in _data.scenes:
+			scene.SetFrame(value)
@@ -0,0 +1,345 @@
+# Pure Python stand-in for the parts of the Blender 2.49b API used by
+# StereoAnimator.py. Only good enough to drive the script for benchmarks:
+# nothing is drawn or rendered, render() just waits for the simulated cost and
+# saveRenderedImage() writes a small placeholder file.
+#############################################################################################
+import math
+import os
+import time
+
+# Simulated seconds per render() call (set by stereoBench.py --render-cost)
+renderCost = 0.0
+# Bytes written by saveRenderedImage()
+imageBytes = 64
+
+# Extension saveRenderedImage() appends per image type (see Scene.Render)
+IMAGE_EXTENSIONS = {0: '.tga', 4: '.jpg', 14: '.tga', 17: '.png', 20: '.bmp', 22: '.tif'}
+
+state = {'curframe': 1, 'filename': ''}
+
+# Registries of all datablocks by type, in creation order
+objects = []
+cameraData = []
+meshes = []
+scenes = []
+
+def Reset():
+	del objects[:]
+	del cameraData[:]
+	del meshes[:]
+	del scenes[:]
+	state['curframe'] = 1
+
+# Blender makes names unique by appending .001, .002, ...
+def UniqueName(name, registry, exclude=None):
+	names = dict([(d.name, True) for d in registry if d is not exclude])
+	if not names.has_key(name):
+		return name
+	i = 1
+	while names.has_key('%s.%.3d' % (name, i)):
+		i += 1
+	return '%s.%.3d' % (name, i)
+
+def Lookup(registry, name, kind):
+	if name is None:
+		return list(registry)
+	for d in registry:
+		if d.name == name:
+			return d
+	raise ValueError('%s "%s" not found' % (kind, name))
+
+class ID(object):
+	registry = None
+
+	def __init__(self, name):
+		self.name = UniqueName(name, self.registry)
+		self.users = 0
+		self.registry.append(self)
+
+	def getName(self):
+		return self.name
+
+	def setName(self, name):
+		self.name = UniqueName(name, self.registry, self)
+
+class CameraData(ID):
+	registry = cameraData
+
+	def __init__(self, type='persp', name='CA'):
+		ID.__init__(self, name)
+		self.type = type
+		self.lens = 35.
+		self.angle = 49.13
+		self.scale = 7.31
+		self.dofDist = 0.
+		self.clipStart = 0.1
+		self.clipEnd = 100.
+		self.shiftX = 0.
+		self.shiftY = 0.
+		self.alpha = 0.2
+		self.drawSize = 0.5
+		self.mode = 0
+
+	def copy(self):
+		c = CameraData(self.type, self.name)
+		for attr in ['lens', 'angle', 'scale', 'dofDist', 'clipStart', 'clipEnd',
+					'shiftX', 'shiftY', 'alpha', 'drawSize', 'mode']:
+			setattr(c, attr, getattr(self, attr))
+		return c
+
+class Vert(object):
+	def __init__(self, co):
+		self.co = list(co)
+
+	# like Blender's MVert, a vertex unpacks to its coordinates
+	def __iter__(self):
+		return iter(self.co)
+
+	def __getitem__(self, i):
+		return self.co[i]
+
+	def __len__(self):
+		return 3
+
+class VertSeq(list):
+	def extend(self, coords):
+		list.extend(self, [Vert(c) for c in coords])
+
+class EdgeSeq(list):
+	def delete(self, *args):
+		del self[:]
+
+class MeshData(ID):
+	registry = meshes
+
+	def __init__(self, name='Mesh'):
+		ID.__init__(self, name)
+		self._verts = VertSeq()
+		self.edges = EdgeSeq()
+
+	def _getVerts(self):
+		return self._verts
+
+	def _setVerts(self, value):
+		self._verts = VertSeq()
+		if value:
+			self._verts.extend(value)
+
+	verts = property(_getVerts, _setVerts)
+
+	def update(self):
+		pass
+
+# Rotation matrix rows of Blender's EulToMat3
+def EulerMatrix(rx, ry, rz):
+	ci, cj, ch = math.cos(rx), math.cos(ry), math.cos(rz)
+	si, sj, sh = math.sin(rx), math.sin(ry), math.sin(rz)
+	cc, cs, sc, ss = ci*ch, ci*sh, si*ch, si*sh
+	return [[cj*ch, cj*sh, -sj],
+			[sj*sc-cs, sj*ss+cc, cj*si],
+			[sj*cc+ss, sj*cs-sc, cj*ci]]
+
+class BlenderObject(ID):
+	registry = objects
+
+	def __init__(self, data, name=None, type=None):
+		ID.__init__(self, name or data.name)
+		self.data = data
+		self.type = type
+		self.LocX = self.LocY = self.LocZ = 0.
+		self.RotX = self.RotY = self.RotZ = 0.
+		self.SizeX = self.SizeY = self.SizeZ = 1.
+		self.layers = [1]
+		self.timeOffset = 0.
+		self.track = None
+		self.constraints = []
+		self._parent = None
+		self._properties = {}
+		self.drawType = 5
+		# callback(object, frame) that animates the object (see Scene.SetFrame)
+		self.animate = None
+
+	def getType(self):
+		return self.type
+
+	def getData(self, name_only=False, mesh=False):
+		return self.data
+
+	# read-only, as in Blender (makeParent sets it)
+	parent = property(lambda self: self._parent)
+
+	# ID properties; the group itself cannot be replaced, as in Blender
+	properties = property(lambda self: self._properties)
+
+	def getParent(self):
+		return self._parent
+
+	def makeParent(self, children, noninverse=0, fast=0):
+		for child in children:
+			child._parent = self
+
+	def _getVec(names):
+		return property(lambda self: tuple([getattr(self, n) for n in names]),
+			lambda self, v: [setattr(self, n, float(x)) for n, x in zip(names, v)])
+	loc = _getVec(['LocX', 'LocY', 'LocZ'])
+	rot = _getVec(['RotX', 'RotY', 'RotZ'])
+	size = _getVec(['SizeX', 'SizeY', 'SizeZ'])
+	del _getVec
+
+	def getMatrix(self, space='worldspace'):
+		rows = EulerMatrix(self.RotX, self.RotY, self.RotZ)
+		for row, s in zip(rows, self.size):
+			row[:] = [v*s for v in row]
+		return [rows[0] + [0.], rows[1] + [0.], rows[2] + [0.], [self.LocX, self.LocY, self.LocZ, 1.]]
+
+	matrixWorld = property(getMatrix)
+	matrix = property(getMatrix)
+
+	def getBoundBox(self):
+		m = self.getMatrix()
+		corners = []
+		for x in (-1, 1):
+			for y in (-1, 1):
+				for z in (-1, 1):
+					corners.append([x*m[0][i] + y*m[1][i] + z*m[2][i] + m[3][i] for i in range(3)])
+		return corners
+
+class SceneObjects(object):
+	def __init__(self, scene):
+		self.scene = scene
+		self.linked = []
+		self.camera = None
+
+	def __iter__(self):
+		return iter(list(self.linked))
+
+	def __len__(self):
+		return len(self.linked)
+
+	def link(self, ob):
+		if ob in self.linked:
+			raise RuntimeError('object already linked to scene')
+		self.linked.append(ob)
+		ob.users += 1
+
+	def unlink(self, ob):
+		if ob not in self.linked:
+			raise ValueError('object not in scene')
+		self.linked.remove(ob)
+		ob.users -= 1
+		if self.camera is ob:
+			self.camera = None
+
+	def new(self, data, name=None):
+		if isinstance(data, CameraData):
+			type = 'Camera'
+		elif isinstance(data, MeshData):
+			type = 'Mesh'
+		else:
+			type = 'Empty'
+		ob = BlenderObject(data, name, type)
+		self.link(ob)
+		return ob
+
+class RenderingContext(object):
+	def __init__(self, scene):
+		self.scene = scene
+		self.sFrame = 1
+		self.eFrame = 250
+		self.cFrame = 1
+		self.renderPath = '/tmp/'
+		self.sizeX = 800
+		self.sizeY = 600
+		self.renders = 0
+		self.saves = 0
+		self.pathChanges = 0
+		self.imageType = 17
+		self.quality = 90
+		self.borderRender = 0
+		self.border = [0., 0., 1., 1.]
+		self.renderwinSize = 100
+		self.oversampling = True
+		self.OSALevel = 8
+		self.rayTracing = True
+
+	def currentFrame(self, frame=None):
+		if frame is None:
+			return self.cFrame
+		self.cFrame = frame
+
+	def startFrame(self, frame=None):
+		if frame is None:
+			return self.sFrame
+		self.sFrame = frame
+
+	def endFrame(self, frame=None):
+		if frame is None:
+			return self.eFrame
+		self.eFrame = frame
+
+	def getRenderPath(self):
+		return self.renderPath
+
+	def setRenderPath(self, path):
+		self.pathChanges += 1
+		self.renderPath = path
+
+	def imageSizeX(self, size=None):
+		if size is None:
+			return self.sizeX
+		self.sizeX = size
+
+	def imageSizeY(self, size=None):
+		if size is None:
+			return self.sizeY
+		self.sizeY = size
+
+	def enableBorderRender(self, toggle):
+		self.borderRender = toggle
+
+	def setBorder(self, left, bottom, right, top):
+		self.border = [left, bottom, right, top]
+
+	def render(self):
+		self.renders += 1
+		if renderCost > 0:
+			time.sleep(renderCost)
+
+	def saveRenderedImage(self, filename, zbuffer=0):
+		self.saves += 1
+		path = self.renderPath + filename + IMAGE_EXTENSIONS.get(self.imageType, '')
+		directory = os.path.dirname(path)
+		if directory and not os.path.isdir(directory):
+			os.makedirs(directory)
+		f = open(path, 'wb')
+		f.write('\0' * imageBytes)
+		f.close()
+
+	def getFrameFilename(self, frame=None):
+		return self.renderPath + '%.4d' % (frame or self.cFrame)
+
+class SceneData(object):
+	def __init__(self, name='Scene'):
+		self.name = name
+		self.objects = SceneObjects(self)
+		self.context = RenderingContext(self)
+		self.evaluations = 0
+		scenes.append(self)
+
+	def getName(self):
+		return self.name
+
+	def getRenderingContext(self):
+		return self.context
+
+	def makeCurrent(self):
+		scenes.remove(self)
+		scenes.insert(0, self)
+
+	# Evaluate the animation of all linked objects for a frame
+	def SetFrame(self, frame):
+		self.context.cFrame = frame
+		self.evaluations += 1
+		for ob in self.objects.linked:
+			if ob.animate is not None:
+				ob.animate(ob, frame)
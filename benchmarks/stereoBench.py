@@ -0,0 +1,205 @@
+# Benchmarks for StereoAnimator's own overhead, without Blender.
+#
+# StereoAnimator.py is imported against the fake Blender API in
+# benchmarks/fakeblender, whose render() only waits for a configurable
+# simulated cost. The suites:
+#
+#	setup	GenerateStereoRigs on a fresh scene and again on a scene with the
+#			rigs of an earlier run left over (reconciliation)
+#	update	per rig and frame cost of UpdateRigCached and of the mesh based UpdateRig
+#	render	RenderAllRigsByFrame in the order given by --order; the Python
+#			overhead per frame is the wall time minus the simulated render
+#			time. Also counts frame evaluations and render path changes.
+#
+# Every case reports wall time and the peak resident memory of the process.
+#
+# To use:
+#	python benchmarks/stereoBench.py --cameras 1,10,100 --frames 10,1000 --render-cost 0.001
+#############################################################################################
+import gc
+import math
+import optparse
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, os.path.join(BENCH_DIR, 'fakeblender'))
+
+import Blender
+from Blender import Camera, Scene, Mesh, _data
+import StereoAnimator
+import stereoTrace
+
+SUITES = ['setup', 'update', 'render']
+
+# RETURN: peak resident memory of this process in MB
+def PeakMemory():
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform == 'darwin':
+		return peak / (1024. * 1024.)
+	return peak / 1024.
+
+# Animation callback: the camera circles the origin
+def Orbit(index):
+	def animate(ob, frame):
+		angle = 0.01 * frame + index
+		ob.LocX = 10. * math.cos(angle)
+		ob.LocY = 10. * math.sin(angle)
+		ob.LocZ = 2.
+		ob.RotX = math.pi / 2
+		ob.RotZ = angle + math.pi / 2
+	return animate
+
+# Build a fresh fake scene with animated cameras and static props
+# RETURN: the scene
+def BuildScene(cameras, frames, objects, output, renderCost):
+	_data.Reset()
+	_data.renderCost = renderCost
+	scene = Scene.GetCurrent()
+	context = scene.getRenderingContext()
+	context.startFrame(1)
+	context.endFrame(frames)
+	context.setRenderPath(output)
+	for i in range(cameras):
+		data = Camera.New('persp', 'CamData%d' % i)
+		data.dofDist = 10.
+		ob = scene.objects.new(data, 'Cam%d' % i)
+		ob.animate = Orbit(i)
+	for i in range(objects):
+		ob = scene.objects.new(Mesh.New('Prop%d' % i), 'Prop%d' % i)
+		ob.LocX = i
+	scene.objects.camera = _data.objects[0]
+	Blender.Set('curframe', 1)
+	return scene
+
+def NewAnimator(scene, output):
+	animator = StereoAnimator.StereoAnimator(scene, StereoAnimator.eyeSep)
+	animator.SetOutputPath(output)
+	return animator
+
+def Dispose(animator):
+	animator.trace.Close()
+	del animator
+	gc.collect()
+
+def BenchSetup(cameras, frames, objects, output, renderCost, order):
+	scene = BuildScene(cameras, frames, objects, output, renderCost)
+	animator = NewAnimator(scene, output)
+	start = time.time()
+	animator.GenerateStereoRigs(animator.eyeSep)
+	fresh = time.time() - start
+	Dispose(animator)
+
+	# the rig objects of the first run are unlinked but still exist
+	animator = NewAnimator(scene, output)
+	start = time.time()
+	animator.GenerateStereoRigs(animator.eyeSep)
+	again = time.time() - start
+	Dispose(animator)
+	return {'setup_s': fresh, 'setup_again_s': again}
+
+def BenchUpdate(cameras, frames, objects, output, renderCost, order):
+	scene = BuildScene(cameras, frames, objects, output, renderCost)
+	animator = NewAnimator(scene, output)
+	animator.verifyRigs = True		# build the _SEP segments for UpdateRig
+	animator.GenerateStereoRigs(animator.eyeSep)
+	frameList = animator.GetRenderFrames()
+
+	start = time.time()
+	animator.PrecomputeRigs(frameList)
+	precompute = time.time() - start
+
+	start = time.time()
+	for frame in frameList:
+		animator.SetFrame(frame)
+		for rig in animator.rigs:
+			animator.UpdateRigCached(rig.left, rig.right, rig.orig, frame)
+	cached = time.time() - start
+
+	start = time.time()
+	for frame in frameList:
+		animator.SetFrame(frame)
+		for rig in animator.rigs:
+			animator.UpdateRig(rig.left, rig.right, rig.seg, rig.orig)
+	mesh = time.time() - start
+	Dispose(animator)
+
+	updates = float(len(frameList) * cameras)
+	return {'precompute_s': precompute,
+		'update_cached_us': cached / updates * 1e6,
+		'update_mesh_us': mesh / updates * 1e6}
+
+def BenchRender(cameras, frames, objects, output, renderCost, order):
+	scene = BuildScene(cameras, frames, objects, output, renderCost)
+	animator = NewAnimator(scene, output)
+	animator.SetOrder(order)
+	scene.evaluations = 0
+	start = time.time()
+	animator.RenderAllRigsByFrame()
+	wall = time.time() - start
+	context = scene.getRenderingContext()
+	renders = context.renders
+	Dispose(animator)
+	overhead = wall - renders * renderCost
+	return {'render_wall_s': wall, 'renders': renders, 'evaluations': scene.evaluations,
+		'path_changes': context.pathChanges, 'overhead_per_frame_ms': overhead / frames * 1e3}
+
+BENCHMARKS = {'setup': BenchSetup, 'update': BenchUpdate, 'render': BenchRender}
+
+# Run every suite for every (cameras, frames) combination
+# RETURN: list of result dictionaries
+def Run(suites, cameraCounts, frameCounts, objects, renderCost, output=None, order='frame'):
+	results = []
+	for suite in suites:
+		for cameras in cameraCounts:
+			for frames in frameCounts:
+				directory = tempfile.mkdtemp(prefix='stereobench-', dir=output)
+				try:
+					result = BENCHMARKS[suite](cameras, frames, objects, directory, renderCost, order)
+				finally:
+					shutil.rmtree(directory)
+				result.update({'suite': suite, 'cameras': cameras, 'frames': frames,
+					'objects': objects, 'peak_mb': PeakMemory()})
+				print FormatResult(result)
+				sys.stdout.flush()
+				results.append(result)
+	return results
+
+def FormatResult(result):
+	keys = [k for k in sorted(result.keys()) if k not in ('suite', 'cameras', 'frames', 'objects')]
+	values = ' '.join(['%s=%s' % (k, isinstance(result[k], float) and '%.4g' % result[k] or result[k]) for k in keys])
+	return '%-7s cameras=%-5d frames=%-7d %s' % (result['suite'], result['cameras'], result['frames'], values)
+
+def main(argv):
+	parser = optparse.OptionParser(usage="python benchmarks/stereoBench.py [options]")
+	parser.add_option('--suite', default=','.join(SUITES), help="comma separated: %s" % ', '.join(SUITES))
+	parser.add_option('--cameras', default='1,10,100', help="camera counts (default: 1,10,100)")
+	parser.add_option('--frames', default='10,100', help="frame counts (default: 10,100)")
+	parser.add_option('--objects', type='int', default=0, help="extra static objects in the scene")
+	parser.add_option('--render-cost', dest='renderCost', type='float', default=0.0,
+		help="simulated seconds per render() call")
+	parser.add_option('--order', default='frame', help="render order of the render suite (see stereoSchedule.py)")
+	parser.add_option('--tmp', default=None, help="directory for the rendered placeholder files")
+	parser.add_option('--json', default=None, help="also write the results to this file")
+	(options, args) = parser.parse_args(argv[1:])
+
+	suites = options.suite.split(',')
+	for suite in suites:
+		if suite not in SUITES:
+			parser.error("unknown suite '%s'" % suite)
+	stereoTrace.SetLogLevel(stereoTrace.LOG_WARNING)
+	results = Run(suites, [int(c) for c in options.cameras.split(',')],
+		[int(f) for f in options.frames.split(',')], options.objects, options.renderCost, options.tmp, options.order)
+	if options.json:
+		f = open(options.json, 'w')
+		f.write(stereoTrace.json.dumps(results, indent=1, sort_keys=True))
+		f.close()
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -12,12 +12,9 @@
 # the stitched anaglyph sequence to match the left and right sequences 
 # already in the directory. 
 # 
+# The compositing itself is done by stereoComposite.py (one Python process
+# with a worker pool instead of one ImageMagick process per frame); run that
+# directly for other frame ranges and the dubois, sbs and ou modes.
+#
 
-mkdir -p ANAGLYPH
-
-for ((i=1; i <= $2 ; i++))  # Double parentheses, and "LIMIT" with no "$".
-do
-  num=`printf "%04d" $i` 
-  composite -stereo 0 $1_SLEFT/$1_SLEFT_$num.* $1_SRIGHT/$1_SRIGHT_$num.* ANAGLYPH/ANAGLYPH_$num.$3
-done    
-
+python "`dirname $0`/stereoComposite.py" --cameras "$1" --frames "1-$2" --format "$3" --mode anaglyph ..
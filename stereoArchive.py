@@ -0,0 +1,308 @@
+# Packed output: one archive per camera instead of a file per frame and eye
+# (StereoAnimator.py -- --archive). A 6 camera, 10000 frame stereo job is 6
+# files instead of 120000.
+#
+# <output>/<Camera>/<Camera>.stereopack:
+#	header		HEADER_SIZE bytes: magic, views, first frame, frame capacity and
+#				the view suffixes (_SLEFT,_SRIGHT or _SV01,...)
+#	index		capacity * views entries of ENTRY_SIZE bytes, frame major, so
+#				the views of a frame are next to each other: offset, length,
+#				CRC32 and file extension of the image (offset 0: not stored)
+#	images		the encoded image files, appended in render order
+#
+# An image is appended before its index entry is written, so an interrupted
+# render never leaves an entry pointing at a partial image. Readers map the
+# file and find any (frame, view) through the index without scanning. When a
+# frame outside the index is added, the archive is rewritten with a larger one
+# (Grow); merging shard archives does the same. Entries of static frames
+# (Alias) share the data of an earlier image, also after a rewrite or merge.
+# Images replaced by a new render of the same frame stay in the file until it
+# is rewritten: Grow and Compact copy only the images the index refers to.
+#
+# To use:
+#	python stereoArchive.py info /tmp
+#	python stereoArchive.py extract --frames 1-100 /tmp	(loose files, as without --archive)
+#	python stereoArchive.py compact /tmp					(drop replaced images)
+#############################################################################################
+import mmap
+import optparse
+import os
+import shutil
+import struct
+import sys
+import zlib
+
+import stereoLayout
+
+ARCHIVE_EXT = '.stereopack'
+MAGIC = 'STPACK01'
+HEADER = struct.Struct('<8sIiI')			# magic, views, first frame, capacity
+HEADER_SIZE = 512
+ENTRY = struct.Struct('<QQI8s')			# offset, length, crc32, extension
+ENTRY_SIZE = 32
+
+# RETURN: the archive of a camera below output
+def ArchivePath(output, camera):
+	return os.path.join(output, camera, camera + ARCHIVE_EXT)
+
+# RETURN: names of the cameras with an archive below output
+def ListArchives(output):
+	cams = []
+	if not os.path.isdir(output):
+		return cams
+	for name in sorted(os.listdir(output)):
+		if os.path.isfile(ArchivePath(output, name)):
+			cams.append(name)
+	return cams
+
+class StereoArchive:
+	##########################################
+	# Class Member Data ([Type] [name]):
+	#
+	# String path			// The archive file
+	# List views			// View suffixes, in index order
+	# Integer firstFrame	// Frame of the first index row
+	# Integer capacity		// Frames the index has room for
+	# File file				// Open file (read/write if writable)
+	# mmap map				// Read-only mapping for Read (remapped when it grew)
+	##########################################
+
+	# Open an archive; with views and frames it is created if it does not exist
+	def __init__(self, path, views=None, frames=None, writable=False):
+		self.path = path
+		self.map = None
+		if not os.path.isfile(path):
+			if views is None or not frames:
+				raise IOError("No archive %s" % path)
+			Create(path, views, min(frames), max(frames) - min(frames) + 1)
+			writable = True
+		self.file = open(path, writable and 'r+b' or 'rb')
+		header = self.file.read(HEADER_SIZE)
+		[magic, count, self.firstFrame, self.capacity] = HEADER.unpack(header[:HEADER.size])
+		if magic != MAGIC:
+			raise IOError("%s is not a stereo archive" % path)
+		self.views = header[HEADER.size:].rstrip('\0').split(',')[:count]
+
+	# RETURN: file offset of the index entry of (frame, view suffix), or None
+	# if the index has no room for it
+	def EntryOffset(self, frame, view):
+		row = frame - self.firstFrame
+		if row < 0 or row >= self.capacity or view not in self.views:
+			return None
+		return HEADER_SIZE + (row * len(self.views) + self.views.index(view)) * ENTRY_SIZE
+
+	# RETURN: True if frame fits into the index
+	def Covers(self, frame):
+		return self.firstFrame <= frame < self.firstFrame + self.capacity
+
+	# RETURN: (offset, length, crc32, extension) of an image, or None
+	def Entry(self, frame, view):
+		position = self.EntryOffset(frame, view)
+		if position is None:
+			return None
+		self.file.seek(position)
+		[offset, length, crc, ext] = ENTRY.unpack(self.file.read(ENTRY.size))
+		if offset == 0:
+			return None
+		return (offset, length, crc, ext.rstrip('\0'))
+
+	# RETURN: list of (frame, view suffix) of all stored images
+	def Keys(self):
+		self.file.seek(HEADER_SIZE)
+		index = self.file.read(self.capacity * len(self.views) * ENTRY_SIZE)
+		keys = []
+		for i in range(len(index) // ENTRY_SIZE):
+			if struct.unpack_from('<Q', index, i * ENTRY_SIZE)[0]:
+				keys.append((self.firstFrame + i // len(self.views), self.views[i % len(self.views)]))
+		return keys
+
+	# RETURN: the bytes of an image (from the memory map), or None
+	def Read(self, frame, view):
+		entry = self.Entry(frame, view)
+		if entry is None:
+			return None
+		[offset, length, crc, ext] = entry
+		if self.map is None or offset + length > len(self.map):
+			if self.map is not None:
+				self.map.close()
+			self.file.flush()
+			self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		data = self.map[offset:offset+length]
+		if zlib.crc32(data) & 0xffffffff != crc:
+			raise IOError("%s: frame %d%s is corrupt" % (self.path, frame, view))
+		return data
+
+	# Append an image; the archive grows if frame is outside the index
+	def Append(self, frame, view, data, ext):
+		if not self.Covers(frame):
+			self.Grow([frame])
+		self.file.seek(0, 2)
+		offset = self.file.tell()
+		self.file.write(data)
+		self.file.flush()
+		os.fsync(self.file.fileno())
+		self.WriteEntry(frame, view, (offset, len(data), zlib.crc32(data) & 0xffffffff, ext))
+
+	# Store frame as the same image as fromFrame (a static frame), without
+	# a second copy of the data
+	# RETURN: False if fromFrame is not stored
+	def Alias(self, frame, view, fromFrame):
+		entry = self.Entry(fromFrame, view)
+		if entry is None:
+			return False
+		if not self.Covers(frame):
+			self.Grow([frame])
+		self.WriteEntry(frame, view, entry)
+		return True
+
+	def WriteEntry(self, frame, view, entry):
+		[offset, length, crc, ext] = entry
+		self.file.seek(self.EntryOffset(frame, view))
+		self.file.write(ENTRY.pack(offset, length, crc, ext))
+		self.file.flush()
+		os.fsync(self.file.fileno())
+
+	# Add the images of the archive source (static frames stay aliases of
+	# the same data)
+	# RETURN: number of images added
+	def CopyFrom(self, source):
+		keys = source.Keys()
+		copied = {}			# offset in source -> entry here
+		for frame, view in keys:
+			entry = source.Entry(frame, view)
+			if copied.has_key(entry[0]):
+				self.WriteEntry(frame, view, copied[entry[0]])
+				continue
+			self.Append(frame, view, source.Read(frame, view), entry[3])
+			copied[entry[0]] = self.Entry(frame, view)
+		return len(keys)
+
+	# RETURN: bytes of image data no index entry refers to (replaced images)
+	def Unreferenced(self):
+		stored = {}
+		for frame, view in self.Keys():
+			entry = self.Entry(frame, view)
+			stored[entry[0]] = entry[1]
+		self.file.seek(0, 2)
+		return self.file.tell() - self.DataOffset() - sum(stored.values())
+
+	# RETURN: file offset of the first image
+	def DataOffset(self):
+		return HEADER_SIZE + self.capacity * len(self.views) * ENTRY_SIZE
+
+	# Rewrite the archive with an index that also covers frames, keeping only
+	# the images the index refers to
+	def Grow(self, frames=[]):
+		first = min([self.firstFrame] + list(frames))
+		last = max([self.firstFrame + self.capacity - 1] + list(frames))
+		tmp = self.path + '.tmp'
+		if os.path.exists(tmp):
+			os.remove(tmp)
+		Create(tmp, self.views, first, last - first + 1)
+		grown = StereoArchive(tmp, writable=True)
+		grown.CopyFrom(self)
+		grown.Close()
+		self.Close()
+		os.rename(tmp, self.path)
+		self.__init__(self.path, writable=True)
+
+	# Rewrite the archive without the images no index entry refers to
+	def Compact(self):
+		self.Grow()
+
+	def Close(self):
+		if self.map is not None:
+			self.map.close()
+			self.map = None
+		if self.file is not None:
+			self.file.close()
+			self.file = None
+
+# Write an empty archive
+def Create(path, views, firstFrame, capacity):
+	names = ','.join(views)
+	if HEADER.size + len(names) > HEADER_SIZE:
+		raise ValueError("Too many views for an archive header: %s" % names)
+	stereoLayout.MakeDirs(os.path.dirname(path) or '.')
+	f = open(path, 'wb')
+	f.write(HEADER.pack(MAGIC, len(views), firstFrame, capacity) + names)
+	f.seek(HEADER_SIZE + capacity * len(views) * ENTRY_SIZE - 1)
+	f.write('\0')
+	f.close()
+
+# Add the images of the archive source to the archive target (moved there if
+# target does not exist yet); see stereoDispatch.MergeShard
+# RETURN: number of images merged
+def MergeArchive(target, source):
+	if not os.path.isfile(target):
+		stereoLayout.MakeDirs(os.path.dirname(target))
+		shutil.move(source, target)
+		archive = StereoArchive(target)
+		count = len(archive.Keys())
+		archive.Close()
+		return count
+	src = StereoArchive(source)
+	dest = StereoArchive(target, writable=True)
+	missing = [f for f, v in src.Keys() if not dest.Covers(f)]
+	if missing:
+		dest.Grow(missing)
+	count = dest.CopyFrom(src)
+	dest.Close()
+	src.Close()
+	os.remove(source)
+	return count
+
+# Write the images of a camera's archive as loose files, in the layout
+# StereoAnimator uses without --archive
+# RETURN: number of files written
+def Extract(output, camera, dest, frames=None):
+	archive = StereoArchive(ArchivePath(output, camera))
+	count = 0
+	for frame, view in archive.Keys():
+		if frames is not None and frame not in frames:
+			continue
+		prefix = stereoLayout.FramePrefix(dest, camera, camera + view)
+		stereoLayout.MakeDirs(os.path.dirname(prefix))
+		path = prefix + stereoLayout.FrameString(frame) + archive.Entry(frame, view)[3]
+		f = open(path + '.tmp', 'wb')
+		f.write(archive.Read(frame, view))
+		f.close()
+		os.rename(path + '.tmp', path)
+		count += 1
+	archive.Close()
+	return count
+
+def main(argv):
+	parser = optparse.OptionParser(usage="python stereoArchive.py info|extract|compact [options] output_root")
+	parser.add_option('--cameras', default=None, help="comma separated camera names (default: all)")
+	parser.add_option('--frames', default=None, help="frames to extract, e.g. '1-100'")
+	parser.add_option('--dest', default=None, help="root of the extracted files (default: output_root)")
+	(options, args) = parser.parse_args(argv[1:])
+	if len(args) != 2 or args[0] not in ('info', 'extract', 'compact'):
+		parser.error("expected info, extract or compact and the output root directory")
+	[command, output] = args
+	cameras = options.cameras and options.cameras.split(',') or ListArchives(output)
+	frames = options.frames and set(stereoLayout.ParseFrameSpec(options.frames)) or None
+	for camera in cameras:
+		if command == 'extract':
+			count = Extract(output, camera, options.dest or output, frames)
+			print 'Extracted %d images of %s' % (count, camera)
+			continue
+		if command == 'compact':
+			archive = StereoArchive(ArchivePath(output, camera), writable=True)
+			size = os.path.getsize(archive.path)
+			archive.Compact()
+			archive.Close()
+			print 'Compacted %s: %d -> %d bytes' % (camera, size, os.path.getsize(archive.path))
+			continue
+		archive = StereoArchive(ArchivePath(output, camera))
+		keys = archive.Keys()
+		stored = dict([(f, True) for f, v in keys]).keys()
+		print '%s: %d images, views %s, frames %s, index %d-%d, %d bytes (%d unreferenced)' % (camera,
+			len(keys), ','.join(archive.views), stereoLayout.FormatFrameSpec(stored) or '-', archive.firstFrame,
+			archive.firstFrame + archive.capacity - 1, os.path.getsize(archive.path), archive.Unreferenced())
+		archive.Close()
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,266 @@
+# Stereo comfort check of a job before anything is rendered (StereoAnimator.py
+# -- --comfort).
+#
+# StereoAnimator.PrecomputeRigs already evaluates every frame to get the eye
+# positions and shiftX of the rigs; with --comfort it also samples the world
+# bounding box corners of the scene objects and writes everything to
+# <output>/stereo_comfort_samples.json. Analyse projects all corners of all
+# frames into both eyes at once and measures the screen disparity
+#
+#	disparity = (x_right - x_left) / imageSizeX * 100		(% of the image width)
+#
+# negative: in front of the screen (crossed), 0: on the screen plane (the
+# focal distance), positive: behind it (uncrossed), up to shiftX * 100 at
+# infinity. An object is flagged on a frame when it is on screen and
+#
+#	crossed		it comes nearer than maxCrossed % of the width
+#	uncrossed	it goes further back than maxUncrossed %
+#	window		it is in front of the screen and cut by the left or right
+#				image edge (stereo window violation)
+#
+# Bounding boxes are larger than the objects, so the check errs on the safe
+# side. The report (<output>/<Camera>/stereo_comfort.json) has the disparity
+# range of every frame, the share of the comfort budget (maxCrossed +
+# maxUncrossed) it uses and the violations.
+#
+# Blender's Python usually has no NumPy; StereoAnimator then runs this file with
+# --save-python:
+#	python stereoComfort.py --max-crossed 1 --max-uncrossed 2 /tmp/shot/stereo_comfort_samples.json
+#############################################################################################
+import math
+import optparse
+import os
+import sys
+
+try:
+	import json
+except ImportError:
+	import simplejson as json
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+import stereoLayout
+
+SAMPLES_NAME = 'stereo_comfort_samples.json'
+REPORT_NAME = 'stereo_comfort.json'
+DEFAULT_MAX_CROSSED = 1.		# % of the image width in front of the screen
+DEFAULT_MAX_UNCROSSED = 2.		# % of the image width behind the screen
+KINDS = ['crossed', 'uncrossed', 'window']
+
+# Rotation matrices of Euler angles, rows are the local axes in world space
+# (EulToMat3 in Blender's arithb.c, see stereoRigMath.EulerXAxis)
+# RETURN: (frames, 3, 3) array
+def RotationMatrices(rotations):
+	rot = numpy.asarray(rotations, dtype=numpy.float64).reshape(-1, 3)
+	ci, cj, ch = numpy.cos(rot[:, 0]), numpy.cos(rot[:, 1]), numpy.cos(rot[:, 2])
+	si, sj, sh = numpy.sin(rot[:, 0]), numpy.sin(rot[:, 1]), numpy.sin(rot[:, 2])
+	cc, cs, sc, ss = ci*ch, ci*sh, si*ch, si*sh
+	m = numpy.empty((len(rot), 3, 3))
+	m[:, 0, 0], m[:, 0, 1], m[:, 0, 2] = cj*ch, cj*sh, -sj
+	m[:, 1, 0], m[:, 1, 1], m[:, 1, 2] = sj*sc - cs, sj*ss + cc, cj*si
+	m[:, 2, 0], m[:, 2, 1], m[:, 2, 2] = sj*cc + ss, sj*cs - sc, cj*ci
+	return m
+
+# Project points into one eye of a parallel off-axis rig
+#	points		(frames, N, 3) world positions
+#	eye			(frames, 3) eye positions
+#	matrices	(frames, 3, 3) camera rotations (RotationMatrices)
+#	shift		(frames,) shiftX of the eye, in image widths
+#	angle		(frames,) horizontal field of view in degrees
+# RETURN: x and y in pixels and the depth in front of the eye, each (frames, N)
+def Project(points, eye, matrices, shift, angle, width, height):
+	d = points - eye[:, numpy.newaxis, :]
+	cx = (d * matrices[:, numpy.newaxis, 0, :]).sum(axis=2)
+	cy = (d * matrices[:, numpy.newaxis, 1, :]).sum(axis=2)
+	depth = -(d * matrices[:, numpy.newaxis, 2, :]).sum(axis=2)
+	focal = (0.5 * width / numpy.tan(numpy.radians(angle) / 2.))[:, numpy.newaxis]
+	safe = numpy.where(depth > 0, depth, 1.)
+	x = 0.5*width + focal*cx/safe - shift[:, numpy.newaxis]*width
+	y = 0.5*height - focal*cy/safe
+	return x, y, depth
+
+# Analyse one rig
+#	rig			{'frames', 'left', 'right', 'rotation', 'shift', 'angle', 'clipStart'}
+#	objects		names of the sampled objects
+#	corners		(frames, objects, 8, 3) bounding box corners, same frames as rig
+# RETURN: the report (see WriteReport)
+def Analyse(camera, rig, objects, corners, width, height, maxCrossed, maxUncrossed):
+	frames = rig['frames']
+	report = {'camera': camera, 'width': width, 'height': height,
+		'maxCrossed': maxCrossed, 'maxUncrossed': maxUncrossed, 'frames': []}
+	if not frames:
+		return report
+	corners = numpy.asarray(corners, dtype=numpy.float64).reshape(len(frames), len(objects), 8, 3)
+	points = corners.reshape(len(frames), -1, 3)
+	matrices = RotationMatrices(rig['rotation'])
+	shift = numpy.asarray(rig['shift'], dtype=numpy.float64)
+	angle = numpy.asarray(rig['angle'], dtype=numpy.float64)
+	[xl, yl, dl] = Project(points, numpy.asarray(rig['left'], dtype=numpy.float64), matrices, shift/2.,
+		angle, width, height)
+	[xr, yr, dr] = Project(points, numpy.asarray(rig['right'], dtype=numpy.float64), matrices, -shift/2.,
+		angle, width, height)
+	clip = numpy.asarray(rig['clipStart'], dtype=numpy.float64)[:, numpy.newaxis]
+	shape = (len(frames), len(objects), 8)
+	valid = ((dl > clip) & (dr > clip)).reshape(shape)
+	disparity = ((xr - xl) * 100. / width).reshape(shape)
+
+	# per frame and object: disparity range and screen extent over both eyes
+	near = numpy.where(valid, disparity, numpy.inf).min(axis=2)
+	far = numpy.where(valid, disparity, -numpy.inf).max(axis=2)
+	x = numpy.concatenate((xl.reshape(shape), xr.reshape(shape)), axis=2)
+	y = numpy.concatenate((yl.reshape(shape), yr.reshape(shape)), axis=2)
+	valid2 = numpy.concatenate((valid, valid), axis=2)
+	xmin = numpy.where(valid2, x, numpy.inf).min(axis=2)
+	xmax = numpy.where(valid2, x, -numpy.inf).max(axis=2)
+	ymin = numpy.where(valid2, y, numpy.inf).min(axis=2)
+	ymax = numpy.where(valid2, y, -numpy.inf).max(axis=2)
+	visible = valid.any(axis=2) & (xmax > 0) & (xmin < width) & (ymax > 0) & (ymin < height)
+	flags = {
+		'crossed': visible & (near < -maxCrossed),
+		'uncrossed': visible & (far > maxUncrossed),
+		'window': visible & (near < 0) & ((xmin < 0) | (xmax > width)),
+	}
+
+	budget = maxCrossed + maxUncrossed
+	for f, frame in enumerate(frames):
+		record = {'frame': frame, 'infinity': round(float(shift[f]) * 100., 3), 'violations': []}
+		shown = numpy.nonzero(visible[f])[0]
+		if len(shown):
+			n = shown[numpy.argmin(near[f][shown])]
+			r = shown[numpy.argmax(far[f][shown])]
+			record['nearest'] = round(float(near[f][n]), 3)
+			record['nearestObject'] = objects[n]
+			record['farthest'] = round(float(far[f][r]), 3)
+			record['farthestObject'] = objects[r]
+			record['used'] = round((record['farthest'] - record['nearest']) * 100. / budget, 1)
+		for kind in KINDS:
+			for o in numpy.nonzero(flags[kind][f])[0]:
+				if kind == 'uncrossed':
+					value = far[f][o]
+				else:
+					value = near[f][o]
+				record['violations'].append([objects[o], kind, round(float(value), 3)])
+		report['frames'].append(record)
+	return report
+
+# Analyse every rig of the samples (see WriteSamples)
+# RETURN: list of reports
+def AnalyseSamples(samples, maxCrossed, maxUncrossed):
+	reports = []
+	for camera in sorted(samples['rigs'].keys()):
+		rig = samples['rigs'][camera]
+		reports.append(Analyse(camera, rig, samples['objects'], samples['corners'], samples['width'],
+			samples['height'], maxCrossed, maxUncrossed))
+	return reports
+
+# RETURN: nested lists of plain floats (JSON) from sequences of numbers,
+# vectors or NumPy arrays
+def Floats(values):
+	if hasattr(values, '__len__'):
+		return [Floats(v) for v in values]
+	return float(values)
+
+# Write the samples of StereoAnimator.PrecomputeRigs
+def WriteSamples(path, samples):
+	stereoLayout.MakeDirs(os.path.dirname(path))
+	f = open(path + '.tmp', 'w')
+	json.dump(samples, f)
+	f.close()
+	os.rename(path + '.tmp', path)
+
+def ReportPath(output, camera):
+	return os.path.join(output, camera, REPORT_NAME)
+
+def WriteReport(output, report):
+	path = ReportPath(output, report['camera'])
+	stereoLayout.MakeDirs(os.path.dirname(path))
+	f = open(path + '.tmp', 'w')
+	json.dump(report, f, sort_keys=True)
+	f.close()
+	os.rename(path + '.tmp', path)
+
+# RETURN: the report of a camera, or None
+def ReadReport(output, camera):
+	path = ReportPath(output, camera)
+	if not os.path.isfile(path):
+		return None
+	f = open(path)
+	try:
+		return json.load(f)
+	finally:
+		f.close()
+
+# RETURN: the frames of a report that have violations
+def BadFrames(report):
+	return [r for r in report['frames'] if r['violations']]
+
+# RETURN: lines summing up a report
+def Summary(report):
+	frames = [r for r in report['frames'] if r.has_key('nearest')]
+	if not frames:
+		return ['%s: no objects on screen' % report['camera']]
+	nearest = min(frames, key=lambda r: r['nearest'])
+	farthest = max(frames, key=lambda r: r['farthest'])
+	lines = ['%s: disparity %.2f%% (%s, frame %d) to %.2f%% (%s, frame %d), limits -%g%% / +%g%%' % (
+		report['camera'], nearest['nearest'], nearest['nearestObject'], nearest['frame'],
+		farthest['farthest'], farthest['farthestObject'], farthest['frame'],
+		report['maxCrossed'], report['maxUncrossed'])]
+	bad = BadFrames(report)
+	if not bad:
+		return lines
+	lines.append('%s: %d of %d frames exceed the comfort limits (frames %s)' % (report['camera'], len(bad),
+		len(report['frames']), stereoLayout.FormatFrameSpec([r['frame'] for r in bad])))
+	for kind in KINDS:
+		objects = {}
+		for record in bad:
+			for [name, k, value] in record['violations']:
+				if k == kind:
+					objects[name] = objects.get(name, 0) + 1
+		if objects:
+			worst = sorted(objects.items(), key=lambda item: -item[1])
+			lines.append('\t%-9s %s' % (kind, ', '.join(['%s (%d frames)' % item for item in worst[:5]])))
+	return lines
+
+# RETURN: one line per frame: disparity range, budget used and violations
+def FrameTable(report):
+	lines = ['%6s %9s %9s %7s %9s  %s' % ('frame', 'nearest', 'farthest', 'budget', 'infinity', 'violations')]
+	for r in report['frames']:
+		if not r.has_key('nearest'):
+			lines.append('%6d %9s %9s %7s %8.2f%%' % (r['frame'], '-', '-', '-', r['infinity']))
+			continue
+		lines.append('%6d %8.2f%% %8.2f%% %6.0f%% %8.2f%%  %s' % (r['frame'], r['nearest'], r['farthest'],
+			r['used'], r['infinity'], ', '.join(['%s %s %.2f%%' % tuple(v) for v in r['violations']])))
+	return lines
+
+def main(argv):
+	parser = optparse.OptionParser(usage="python stereoComfort.py [options] %s" % SAMPLES_NAME)
+	parser.add_option('--max-crossed', dest='maxCrossed', type='float', default=DEFAULT_MAX_CROSSED,
+		help="largest disparity in front of the screen, %% of the image width (default: %g)" % DEFAULT_MAX_CROSSED)
+	parser.add_option('--max-uncrossed', dest='maxUncrossed', type='float', default=DEFAULT_MAX_UNCROSSED,
+		help="largest disparity behind the screen, %% of the image width (default: %g)" % DEFAULT_MAX_UNCROSSED)
+	parser.add_option('--output', default=None, help="output root of the reports (default: next to the samples)")
+	parser.add_option('--frames', action='store_true', default=False, help="print the per frame table")
+	(options, args) = parser.parse_args(argv[1:])
+	if len(args) != 1:
+		parser.error("expected the samples file")
+	if numpy is None:
+		print 'stereoComfort.py needs NumPy'
+		return 2
+	f = open(args[0])
+	samples = json.load(f)
+	f.close()
+	output = options.output or os.path.dirname(os.path.abspath(args[0]))
+	for report in AnalyseSamples(samples, options.maxCrossed, options.maxUncrossed):
+		WriteReport(output, report)
+		if options.frames:
+			for line in FrameTable(report):
+				print line
+		for line in Summary(report):
+			print line
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
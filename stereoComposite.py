@@ -0,0 +1,215 @@
+# Composite the _SLEFT/_SRIGHT sequences written by StereoAnimator.RenderFrame
+# into viewable stereo formats (replaces the ImageMagick loop of createAnaglyph.sh):
+#
+#	anaglyph	red/cyan, red from the left eye, green and blue from the right
+#				(same as "composite -stereo")
+#	dubois		red/cyan with Eric Dubois' least squares matrices (less ghosting
+#				and retinal rivalry)
+#	sbs			side-by-side, left eye on the left
+#	ou			over/under, left eye on top
+#
+# Output goes to <output>/<Camera>/<MODE>/<MODE>_<frame>.<format>, e.g.
+# /tmp/Camera/ANAGLYPH/ANAGLYPH_0001.png.
+#
+# Frames are decoded, composited and encoded by a pool of worker processes, a
+# band of rows at a time (stereoImageIO.ImageRows and RowWriter). When both eyes
+# are uncompressed Targa or BMP files and the output is png, tga or bmp, only
+# the current band of the eyes and of the composites is in memory, so a worker
+# needs the same memory for 4K/8K frames as for small ones. Other input formats
+# are decoded whole and other output formats are encoded whole by PIL.
+#
+# To use:
+#	python stereoComposite.py --mode anaglyph,sbs --workers 8 /tmp
+#############################################################################################
+import multiprocessing
+import optparse
+import os
+import sys
+
+import stereoImageIO
+import stereoLayout
+from stereoImageIO import numpy
+
+MODES = ['anaglyph', 'dubois', 'sbs', 'ou']
+
+# Dubois red/cyan projection matrices (http://www.site.uottawa.ca/~edubois/anaglyph/)
+# applied to linear RGB: out = DUBOIS_LEFT * left + DUBOIS_RIGHT * right
+DUBOIS_LEFT = [[ 0.437,  0.449,  0.164],
+			   [-0.062, -0.062, -0.024],
+			   [-0.048, -0.050, -0.017]]
+DUBOIS_RIGHT = [[-0.011, -0.032, -0.007],
+				[ 0.377,  0.761,  0.009],
+				[-0.026, -0.093,  1.234]]
+
+DEFAULT_CHUNK_ROWS = 256
+
+# RETURN: the (height, width) of the composite for two eyes of the given size
+def CompositeShape(mode, left, right):
+	if left.shape[:2] != right.shape[:2]:
+		raise ValueError("Left and right images differ in size: %r != %r" % (left.shape[:2], right.shape[:2]))
+	return CompositeSize(mode, left.shape[0], left.shape[1])
+
+# RETURN: the (height, width) of the composite for eyes of height x width pixels
+def CompositeSize(mode, height, width):
+	if mode == 'sbs':
+		return (height, 2 * width)
+	if mode == 'ou':
+		return (2 * height, width)
+	return (height, width)
+
+# sRGB <-> linear lookup tables for the Dubois matrices
+_TO_LINEAR = None
+def _ToLinearTable():
+	global _TO_LINEAR
+	if _TO_LINEAR is None:
+		c = numpy.arange(256, dtype=numpy.float32) / 255.
+		_TO_LINEAR = numpy.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4).astype(numpy.float32)
+	return _TO_LINEAR
+
+def _FromLinear(linear):
+	linear = numpy.clip(linear, 0., 1.)
+	srgb = numpy.where(linear <= 0.0031308, linear * 12.92, 1.055 * linear ** (1 / 2.4) - 0.055)
+	return (srgb * 255. + 0.5).astype(numpy.uint8)
+
+# RETURN: the composite of the same band of rows of both eyes (the rows of
+# the left eye's half for 'ou', whose right half follows all of them)
+def CompositeBand(mode, left, right):
+	if mode == 'anaglyph':
+		out = right.copy()
+		out[:, :, 0] = left[:, :, 0]
+		return out
+	if mode == 'dubois':
+		table = _ToLinearTable()
+		mixed = numpy.dot(table[left], numpy.array(DUBOIS_LEFT, numpy.float32).T)
+		mixed += numpy.dot(table[right], numpy.array(DUBOIS_RIGHT, numpy.float32).T)
+		return _FromLinear(mixed)
+	if mode == 'sbs':
+		return numpy.hstack((left, right))
+	if mode == 'ou':
+		return left
+	raise ValueError("Unknown composite mode '%s'" % mode)
+
+# RETURN: the composite of two (height, width, 3) uint8 frames
+def Composite(mode, left, right, chunkRows=DEFAULT_CHUNK_ROWS):
+	out = numpy.empty(CompositeShape(mode, left, right) + (3,), numpy.uint8)
+	height = left.shape[0]
+	for r0 in range(0, height, chunkRows):
+		r1 = min(height, r0 + chunkRows)
+		out[r0:r1] = CompositeBand(mode, left[r0:r1], right[r0:r1])
+		if mode == 'ou':
+			out[height+r0:height+r1] = right[r0:r1]
+	return out
+
+# Composite one frame into every target, reading both eyes and writing the
+# composites chunkRows rows at a time
+# RETURN: number of images written
+def CompositeFrame(leftPath, rightPath, targets, chunkRows=DEFAULT_CHUNK_ROWS):
+	left = stereoImageIO.ImageRows(leftPath)
+	right = stereoImageIO.ImageRows(rightPath)
+	writers = []
+	try:
+		if (left.width, left.height) != (right.width, right.height):
+			raise ValueError("%s and %s differ in size" % (leftPath, rightPath))
+		for mode, outPath in targets:
+			[height, width] = CompositeSize(mode, left.height, left.width)
+			writers.append((mode, stereoImageIO.RowWriter(outPath, width, height)))
+		for r0 in range(0, left.height, chunkRows):
+			r1 = min(left.height, r0 + chunkRows)
+			l = left.Band(r0, r1)
+			r = right.Band(r0, r1)
+			for mode, writer in writers:
+				writer.Write(CompositeBand(mode, l, r))
+		# the lower half of over/under
+		for mode, writer in writers:
+			if mode == 'ou':
+				for r0 in range(0, right.height, chunkRows):
+					writer.Write(right.Band(r0, min(right.height, r0 + chunkRows)))
+		for mode, writer in writers:
+			writer.Close()
+	except:
+		for mode, writer in writers:
+			writer.Abort()
+		raise
+	finally:
+		left.Close()
+		right.Close()
+	return len(writers)
+
+# RETURN: path of the composite of one frame
+def OutputPath(output, camera, mode, frame, format):
+	name = mode.upper()
+	return os.path.join(output, camera, name, '%s_%s.%s' % (name, stereoLayout.FrameString(frame), format))
+
+# Work item for the pool: (leftPath, rightPath, [(mode, outPath)], chunkRows)
+def _CompositeFrame(task):
+	leftPath, rightPath, targets, chunkRows = task
+	return CompositeFrame(leftPath, rightPath, targets, chunkRows)
+
+# Build the work items for one camera, skipping frames that miss an eye
+# RETURN: list of tasks
+def FrameTasks(output, camera, modes, format, frames=None, chunkRows=DEFAULT_CHUNK_ROWS):
+	lefts = stereoLayout.ListFrameFiles(output, camera, camera + stereoLayout.EYE_SUFFIXES[0])
+	rights = stereoLayout.ListFrameFiles(output, camera, camera + stereoLayout.EYE_SUFFIXES[1])
+	tasks = []
+	for frame in sorted(lefts.keys()):
+		if frames is not None and frame not in frames:
+			continue
+		if not rights.has_key(frame):
+			print 'Skipping %s frame %d: no right eye image' % (camera, frame)
+			continue
+		targets = [(mode, OutputPath(output, camera, mode, frame, format)) for mode in modes]
+		tasks.append((lefts[frame], rights[frame], targets, chunkRows))
+	return tasks
+
+# Composite all frames of the given cameras with a pool of worker processes
+# RETURN: number of images written
+def CompositeSequences(output, cameras, modes, format='png', frames=None, workers=None, chunkRows=DEFAULT_CHUNK_ROWS):
+	tasks = []
+	for camera in cameras:
+		tasks += FrameTasks(output, camera, modes, format, frames, chunkRows)
+	if not tasks:
+		return 0
+	if workers == 1:
+		return sum(map(_CompositeFrame, tasks))
+	pool = multiprocessing.Pool(workers)
+	try:
+		written = 0
+		# imap keeps only a few decoded frames in flight per worker
+		for count in pool.imap_unordered(_CompositeFrame, tasks):
+			written += count
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	pool.join()
+	return written
+
+def main(argv):
+	parser = optparse.OptionParser(usage="python stereoComposite.py [options] output_root")
+	parser.add_option('--mode', default='anaglyph',
+		help="comma separated list of %s (default: anaglyph)" % ', '.join(MODES))
+	parser.add_option('--cameras', default=None, help="comma separated camera names (default: all)")
+	parser.add_option('--frames', default=None, help="frames to composite, e.g. '1-100'")
+	parser.add_option('--format', default='png', help="output image format/extension (default: png)")
+	parser.add_option('--workers', type='int', default=None, help="worker processes (default: one per core)")
+	parser.add_option('--chunk-rows', dest='chunkRows', type='int', default=DEFAULT_CHUNK_ROWS,
+		help="rows processed at a time (default: %d)" % DEFAULT_CHUNK_ROWS)
+	(options, args) = parser.parse_args(argv[1:])
+	if len(args) != 1:
+		parser.error("expected the output root directory")
+	modes = options.mode.split(',')
+	for mode in modes:
+		if mode not in MODES:
+			parser.error("unknown mode '%s'" % mode)
+	stereoImageIO.RequireImageSupport()
+
+	output = args[0]
+	cameras = options.cameras and options.cameras.split(',') or stereoLayout.ListCameras(output)
+	frames = options.frames and stereoLayout.ParseFrameSpec(options.frames) or None
+	written = CompositeSequences(output, cameras, modes, options.format, frames and set(frames),
+		options.workers, options.chunkRows)
+	print 'Wrote %d images for %s' % (written, ', '.join(cameras))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,158 @@
+# Attribute copy plans for StereoAnimator.UpdateCameraObject/UpdateCameraData.
+#
+# Copying a fixed list of attribute names with setattr(getattr()) inside a bare
+# try/except is expensive when most of them fail, and they fail the same way on
+# every frame. A CopyPlan probes the list once for a (source type, destination
+# type) pair and keeps only the attributes that can be read, written and are
+# not made redundant by another attribute of the list. Every later copy runs
+# the precompiled plan: one attrgetter call and a setattr loop, no exceptions.
+#
+# Attributes are dropped when
+#	- they are known to be read-only (READ_ONLY),
+#	- reading them from the source fails,
+#	- writing them to the destination fails,
+#	- writing them has no effect (the destination keeps its old value),
+#	- a later attribute of the same list sets the same thing (SUPERSEDED_BY).
+#############################################################################################
+import operator
+
+from stereoTrace import Log, LOG_WARNING, LOG_INFO
+
+# Blender 2.49b Object attributes that can never be assigned
+READ_ONLY = ['matrixWorld', 'matrixOldWorld', 'matrixParentInverse', 'type', 'users']
+
+# Component attributes and the attribute that sets all of them at once
+SUPERSEDED_BY = {
+	'LocX': 'loc', 'LocY': 'loc', 'LocZ': 'loc',
+	'RotX': 'rot', 'RotY': 'rot', 'RotZ': 'rot',
+	'SizeX': 'size', 'SizeY': 'size', 'SizeZ': 'size',
+	'dLocX': 'dloc', 'dLocY': 'dloc', 'dLocZ': 'dloc',
+	'dRotX': 'drot', 'dRotY': 'drot', 'dRotZ': 'drot',
+	'dSizeX': 'dsize', 'dSizeY': 'dsize', 'dSizeZ': 'dsize',
+	'Layer': 'layers', 'Layers': 'layers',
+}
+
+# RETURN: key identifying the kind of a Blender object for plan caching
+def PlanKey(obj):
+	kind = getattr(obj, 'type', None)
+	if not isinstance(kind, str):
+		kind = None
+	return (type(obj).__name__, kind)
+
+def _Equal(a, b):
+	try:
+		return bool(a == b)
+	except Exception:
+		return False
+
+class CopyPlan:
+	##########################################
+	# Class Member Data ([Type] [name]):
+	#
+	# List names		// Attributes that are copied, in list order
+	# List skipped		// (attribute, reason) for every dropped attribute
+	##########################################
+
+	# Probe the attributes on a real source/destination pair (this writes them
+	# to dest, which is what the caller is about to do anyway)
+	def __init__(self, attributes, dest, src):
+		self.names = []
+		self.skipped = []
+		for attr in attributes:
+			reason = self.Probe(attr, dest, src)
+			if reason is None:
+				self.names.append(attr)
+			else:
+				self.skipped.append((attr, reason))
+
+		# drop components whose combined attribute made it into the plan
+		for attr in list(self.names):
+			combined = SUPERSEDED_BY.get(attr)
+			if combined in self.names and self.names.index(combined) > self.names.index(attr):
+				self.names.remove(attr)
+				self.skipped.append((attr, 'superseded by %s' % combined))
+
+		if len(self.names) == 1:
+			name = self.names[0]
+			self.getter = lambda obj: (getattr(obj, name),)
+		elif self.names:
+			self.getter = operator.attrgetter(*self.names)
+		else:
+			self.getter = lambda obj: ()
+
+	# RETURN: None if attr can be copied, otherwise the reason why not
+	def Probe(self, attr, dest, src):
+		if attr in READ_ONLY:
+			return 'read-only'
+		try:
+			value = getattr(src, attr)
+		except Exception, e:
+			return 'not readable (%s)' % e
+		try:
+			before = getattr(dest, attr)
+		except Exception:
+			before = None
+		try:
+			setattr(dest, attr, value)
+		except Exception, e:
+			return 'not writable (%s)' % e
+		try:
+			after = getattr(dest, attr)
+		except Exception:
+			return None
+		if not _Equal(before, value) and _Equal(after, before) and not _Equal(after, value):
+			return 'no effect'
+		return None
+
+	# Copy the planned attributes from src to dest
+	def Apply(self, dest, src):
+		for name, value in zip(self.names, self.getter(src)):
+			setattr(dest, name, value)
+
+	def Report(self):
+		lines = ['copied: %s' % ', '.join(self.names)]
+		for attr, reason in self.skipped:
+			lines.append('skipped %s: %s' % (attr, reason))
+		return '\n'.join(lines)
+
+class CopyPlanCache:
+	##########################################
+	# Class Member Data ([Type] [name]):
+	#
+	# Dict plans			// (list name, source key, destination key) -> CopyPlan
+	# Boolean diagnostics	// Print every new plan with the skipped attributes
+	##########################################
+
+	def __init__(self, diagnostics=False):
+		self.plans = {}
+		self.diagnostics = diagnostics
+
+	# Copy the attributes of a named attribute list from src to dest
+	def Copy(self, listName, attributes, dest, src):
+		key = (listName, PlanKey(src), PlanKey(dest))
+		plan = self.plans.get(key)
+		if plan is None:
+			self.plans[key] = self.Build(key, attributes, dest, src)
+			return
+		try:
+			plan.Apply(dest, src)
+		except Exception, e:
+			# the pair is not what it was when probed (e.g. a parent appeared):
+			# probe again, which also performs the copy
+			Log(LOG_WARNING, 'Copy plan %s failed (%s), probing again' % (listName, e))
+			self.plans[key] = self.Build(key, attributes, dest, src)
+
+	def Build(self, key, attributes, dest, src):
+		plan = CopyPlan(attributes, dest, src)
+		if self.diagnostics:
+			Log(LOG_INFO, 'COPY PLAN %s (%s -> %s)' % (key[0], key[1], key[2]))
+			Log(LOG_INFO, plan.Report())
+		return plan
+
+	# RETURN: a report of all plans
+	def Report(self):
+		lines = []
+		for key in sorted(self.plans.keys()):
+			lines.append('COPY PLAN %s (%s -> %s)' % key)
+			lines.append(self.plans[key].Report())
+		return '\n'.join(lines)
@@ -0,0 +1,374 @@
+# Render cost model of a .blend, shared by StereoAnimator.py and stereoDispatch.py.
+#
+# Every timed render is appended as one JSON line to the model file (by default
+# <shot>.stereocost.jsonl next to the .blend), so the model of a shot gets
+# better with every run:
+#	{"run": ..., "camera": "Camera", "frame": 7, "kind": "render", "size": 100,
+#	 "pixels": 2073600, "seconds": 41.2, "predicted": 38.0, "t": ...}
+#
+#	kind	'sample': a quick render at reduced settings (--cost-sample),
+#			'preview': a preview pass, 'render': a final image
+#
+# CostModel fits seconds per pixel for every camera and segment of
+# SEGMENT_FRAMES frames. Final renders count as they are; sample and preview
+# renders are scaled by how much slower (per pixel) the final renders of the
+# same camera were in segments that have both, or of any camera until there
+# are such segments. Renders of the running job only enter the fit when they
+# are flushed to the model file (after every pass). Segments without renders are interpolated from
+# their neighbours, cameras without renders get the mean of the others.
+# Until some segment has both, the samples are taken as they are, although
+# final renders (full settings) are slower per pixel: such a model is
+# uncalibrated (Calibrated) and its predictions are low.
+#
+# The predictions drive longest job first work assignment (LongestFirst),
+# cost balanced shards (BalancedChunks) and the ETA of StereoAnimator
+# (CostTracker). Predicted and actual times of the final renders are kept side
+# by side in the model file; to see the model and how well it predicted:
+#	python stereoCost.py shot.stereocost.jsonl
+#############################################################################################
+import heapq
+import optparse
+import os
+import sys
+import time
+
+try:
+	import json
+except ImportError:
+	import simplejson as json
+
+MODEL_EXT = '.stereocost.jsonl'
+SEGMENT_FRAMES = 25
+HISTORY = 20				# renders per camera, segment and kind the fit keeps (the latest)
+KINDS = ['sample', 'preview', 'render']
+
+# RETURN: the default model file of a .blend file
+def ModelPath(blendFile):
+	return os.path.splitext(blendFile)[0] + MODEL_EXT
+
+# RETURN: count frames spread evenly over frames (the middle of equal parts)
+def SampleFrames(frames, count):
+	if count >= len(frames):
+		return list(frames)
+	picked = []
+	for i in range(count):
+		frame = frames[int((i + 0.5) * len(frames) / count)]
+		if frame not in picked:
+			picked.append(frame)
+	return picked
+
+# Assign jobs to workers longest first, each to the worker with the least work
+# RETURN: (worker index of every job, seconds of work of every worker)
+def LongestFirst(costs, workers):
+	loads = [(0., w) for w in range(max(1, workers))]
+	assignment = [0] * len(costs)
+	for index in sorted(range(len(costs)), key=lambda i: -costs[i]):
+		[load, worker] = heapq.heappop(loads)
+		assignment[index] = worker
+		heapq.heappush(loads, (load + costs[index], worker))
+	totals = [0.] * max(1, workers)
+	for load, worker in loads:
+		totals[worker] = load
+	return assignment, totals
+
+# RETURN: the wall time of jobs assigned with LongestFirst
+def Makespan(costs, workers):
+	return max(LongestFirst(costs, workers)[1])
+
+# Split frames into count runs of consecutive frames with about the same cost
+#	costs		seconds of every frame (all cameras)
+# RETURN: list of frame lists
+def BalancedChunks(frames, costs, count):
+	count = max(1, min(count, len(frames)))
+	total = float(sum(costs))
+	chunks = [[]]
+	done = 0.
+	for frame, cost in zip(frames, costs):
+		# cut where the cost of the chunks so far is closest to their share
+		if chunks[-1] and len(chunks) < count and done + cost / 2. > total * len(chunks) / count:
+			chunks.append([])
+		chunks[-1].append(frame)
+		done += cost
+	return chunks
+
+# RETURN: the observations of a model file (a missing file has none)
+def ReadObservations(path):
+	observations = []
+	if not path or not os.path.isfile(path):
+		return observations
+	f = open(path)
+	for line in f:
+		line = line.strip()
+		if not line:
+			continue
+		try:
+			observations.append(json.loads(line))
+		except ValueError:
+			pass			# a line cut off by a dying worker
+	f.close()
+	return observations
+
+# Append observations to a model file with one write, so the workers of a job
+# can share it
+def AppendObservations(path, observations):
+	if not observations:
+		return
+	data = ''.join([json.dumps(o, sort_keys=True) + '\n' for o in observations])
+	fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+	try:
+		os.write(fd, data)
+	finally:
+		os.close(fd)
+
+def _Mean(values):
+	return sum(values) / float(len(values))
+
+def _Median(values):
+	values = sorted(values)
+	return values[len(values) // 2]
+
+class CostModel:
+	##########################################
+	# Class Member Data ([Type] [name]):
+	#
+	# String path			// Model file (None: keep observations in memory)
+	# Integer segmentFrames	// Frames per segment of the fit
+	# String run			// Id of this run in the observations
+	# List observations		// All observations, oldest first
+	# List pending			// Observations not written to path and not fitted yet (Flush)
+	# Dict rates			// camera -> {segment: seconds per pixel of a final render}
+	# Dict pixels			// camera -> pixels of its final renders
+	# Dict corrections		// camera -> final / sample seconds per pixel
+	# Boolean calibrated	// no rate is a sample without a final / sample ratio
+	# Boolean fitted		// rates are up to date with observations
+	##########################################
+
+	def __init__(self, path=None, segmentFrames=SEGMENT_FRAMES):
+		self.path = path
+		self.segmentFrames = segmentFrames
+		self.run = '%d-%d' % (time.time(), os.getpid())
+		self.observations = ReadObservations(path)
+		self.pending = []
+		self.rates = {}
+		self.pixels = {}
+		self.corrections = {}
+		self.calibrated = True
+		self.fitted = False
+
+	def Segment(self, frame):
+		return frame // self.segmentFrames
+
+	# Add the time of one render
+	#	kind		one of KINDS
+	#	size		render size in percent
+	#	pixels		pixels rendered (at that size)
+	#	predicted	seconds the model predicted for it (None: no prediction)
+	def Observe(self, camera, frame, seconds, kind='render', size=100, pixels=1, predicted=None):
+		observation = {'run': self.run, 'camera': camera, 'frame': frame, 'seconds': round(seconds, 4),
+			'kind': kind, 'size': size, 'pixels': pixels, 't': round(time.time(), 1)}
+		if predicted is not None:
+			observation['predicted'] = round(predicted, 4)
+		self.pending.append(observation)
+
+	# Append the new observations to the model file and fit them
+	def Flush(self):
+		if not self.pending:
+			return
+		if self.path is not None:
+			AppendObservations(self.path, self.pending)
+		self.observations += self.pending
+		self.pending = []
+		self.fitted = False
+
+	# RETURN: True if the model can predict anything
+	def HasData(self):
+		self.Fit()
+		return bool(self.rates)
+
+	def Fit(self):
+		if self.fitted:
+			return
+		history = {}
+		for o in self.observations:
+			if o.get('seconds') is None or not o.get('pixels'):
+				continue
+			key = (o['camera'], self.Segment(o['frame']))
+			kind = o.get('kind') == 'render' and 'render' or 'sample'
+			values = history.setdefault(key, {}).setdefault(kind, [])
+			values.append(o['seconds'] / float(o['pixels']))
+			del values[:-HISTORY]
+			if kind == 'render':
+				self.pixels[o['camera']] = o['pixels']
+			elif not self.pixels.has_key(o['camera']):
+				self.pixels[o['camera']] = o['pixels'] * (100. / o.get('size', 100)) ** 2
+
+		# how much slower the final renders are than the samples (per pixel)
+		ratios = {}
+		for (camera, segment), kinds in history.items():
+			if kinds.has_key('render') and kinds.has_key('sample'):
+				ratios.setdefault(camera, []).append(_Mean(kinds['render']) / _Mean(kinds['sample']))
+		everything = []
+		for values in ratios.values():
+			everything += values
+		self.corrections = {}
+		for camera, values in ratios.items():
+			self.corrections[camera] = _Median(values)
+		if everything:
+			default = _Median(everything)
+		else:
+			default = 1.
+
+		self.rates = {}
+		self.calibrated = True
+		for (camera, segment), kinds in history.items():
+			if kinds.has_key('render'):
+				rate = _Mean(kinds['render'])
+			else:
+				rate = _Mean(kinds['sample']) * self.corrections.get(camera, default)
+				self.calibrated = self.calibrated and bool(everything)
+			self.rates.setdefault(camera, {})[segment] = rate
+		self.fitted = True
+
+	# RETURN: False if predictions rest on sample or preview renders only (no
+	# final renders to scale them by), so they are too low
+	def Calibrated(self):
+		self.Fit()
+		return self.calibrated
+
+	# RETURN: seconds per pixel of a final render of camera on frame, or None
+	def Rate(self, camera, frame):
+		self.Fit()
+		if not self.rates.has_key(camera):
+			if not self.rates:
+				return None
+			return _Mean([self.Rate(c, frame) for c in self.rates.keys()])
+		rates = self.rates[camera]
+		segment = self.Segment(frame)
+		if rates.has_key(segment):
+			return rates[segment]
+		below = [s for s in rates.keys() if s < segment]
+		above = [s for s in rates.keys() if s > segment]
+		if not below:
+			return rates[min(above)]
+		if not above:
+			return rates[max(below)]
+		[a, b] = [max(below), min(above)]
+		return rates[a] + (rates[b] - rates[a]) * (segment - a) / float(b - a)
+
+	# RETURN: predicted seconds of a final render of one eye, or None
+	#	pixels		pixels of the render (None: those of the camera's renders so far)
+	def Predict(self, camera, frame, pixels=None):
+		rate = self.Rate(camera, frame)
+		if rate is None:
+			return None
+		if pixels is None:
+			pixels = self.pixels.get(camera) or _Mean(self.pixels.values())
+		return rate * pixels
+
+	# RETURN: predicted seconds of every frame for all eyes of all cameras
+	# (0 for everything if the model has no data)
+	def FrameCosts(self, frames, cameras, eyes=2):
+		costs = []
+		for frame in frames:
+			cost = 0.
+			for camera in cameras:
+				cost += (self.Predict(camera, frame) or 0.) * eyes
+			costs.append(cost)
+		return costs
+
+	# RETURN: lines with the fitted seconds per final image of every camera
+	# and segment
+	def Table(self):
+		self.Fit()
+		lines = ['%-20s %12s %10s %11s' % ('camera', 'frames', 'seconds', 'correction')]
+		for camera in sorted(self.rates.keys()):
+			for segment in sorted(self.rates[camera].keys()):
+				first = segment * self.segmentFrames
+				lines.append('%-20s %12s %10.3f %11s' % (camera, '%d-%d' % (first, first + self.segmentFrames - 1),
+					self.rates[camera][segment] * self.pixels.get(camera, 1),
+					self.corrections.has_key(camera) and '%.2f' % self.corrections[camera] or '-'))
+		return lines
+
+	# RETURN: lines comparing predicted and actual seconds of the final
+	# renders of every run
+	def Accuracy(self):
+		runs = []
+		stats = {}
+		for o in self.observations:
+			if o.get('kind') != 'render' or o.get('predicted') is None:
+				continue
+			if not stats.has_key(o['run']):
+				runs.append(o['run'])
+				stats[o['run']] = [0, 0., 0., 0., o.get('t', 0)]
+			s = stats[o['run']]
+			s[0] += 1
+			s[1] += o['predicted']
+			s[2] += o['seconds']
+			s[3] += abs(o['predicted'] - o['seconds']) / max(o['seconds'], 1e-6)
+		lines = ['%-24s %8s %12s %12s %10s' % ('run', 'images', 'predicted', 'actual', 'error')]
+		for run in runs:
+			[count, predicted, actual, error, t] = stats[run]
+			lines.append('%-24s %8d %11.1fs %11.1fs %9.1f%%' % (time.strftime('%Y-%m-%d %H:%M',
+				time.localtime(t)), count, predicted, actual, error * 100. / count))
+		return lines
+
+class CostTracker:
+	##########################################
+	# Class Member Data ([Type] [name]):
+	#
+	# Float remaining		// Predicted seconds of the renders still to do
+	# Float predicted		// Predicted seconds of the renders done so far
+	# Float actual			// Actual seconds of the renders done so far
+	# Boolean calibrated	// predictions of a calibrated model (CostModel.Calibrated)
+	##########################################
+
+	# predictions: seconds of every render still to do (None: unknown, counted
+	# as the mean of the known ones)
+	def __init__(self, predictions, calibrated=True):
+		known = [p for p in predictions if p is not None]
+		mean = known and _Mean(known) or 0.
+		self.remaining = sum(known) + mean * (len(predictions) - len(known))
+		self.predicted = 0.
+		self.actual = 0.
+		self.calibrated = calibrated
+
+	# RETURN: True if Remaining is calibrated, by the model or by the renders
+	# of this run
+	def Calibrated(self):
+		return self.calibrated or self.predicted > 0
+
+	# Count one finished render (actual None: skipped, e.g. by --resume)
+	def Done(self, predicted, actual):
+		if predicted is None:
+			return
+		self.remaining = max(0., self.remaining - predicted)
+		if actual is not None:
+			self.predicted += predicted
+			self.actual += actual
+
+	# RETURN: seconds of rendering left, corrected by how far off the
+	# predictions of this run have been so far
+	def Remaining(self):
+		if self.predicted <= 0:
+			return self.remaining
+		return self.remaining * self.actual / self.predicted
+
+def main(argv):
+	parser = optparse.OptionParser(usage="python stereoCost.py [options] shot%s" % MODEL_EXT)
+	parser.add_option('--segment', type='int', default=SEGMENT_FRAMES,
+		help="frames per segment of the fit (default: %d)" % SEGMENT_FRAMES)
+	(options, args) = parser.parse_args(argv[1:])
+	if len(args) != 1:
+		parser.error("expected the model file")
+	model = CostModel(args[0], options.segment)
+	if not model.HasData():
+		print 'No renders in', args[0]
+		return 1
+	for line in model.Table() + [''] + model.Accuracy():
+		print line
+	if not model.Calibrated():
+		print '\nUncalibrated: no final renders yet, predictions from samples are too low'
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,99 @@
+# Convergence crop of the _SLEFT/_SRIGHT sequences written by StereoAnimator.
+#
+# The off-axis shift makes both eye frustums coincide at the focal distance
+# only; towards clipEnd each eye sees a strip along one side of the image that
+# the other eye never sees. StereoAnimator.WriteCropInfo records how wide that
+# strip gets over the rendered frames in <output>/<Camera>/stereo_crop.json;
+# this pass cuts the same window from both eyes (all views of an N-view rig)
+# of every frame, so the zero parallax plane stays where it was.
+#
+# Output mirrors the input layout below a second root:
+#	<dest>/<Camera>/<Camera>_SLEFT/<Camera>_SLEFT_0001[.ext]
+#
+# Uncompressed Targa/BMP frames are cropped through memory-mapped files a few
+# rows at a time (see stereoImageIO.CropColumns), other formats go through PIL.
+#
+# To use:
+#	python stereoCrop.py --workers 8 /tmp/shot		(writes /tmp/shot_crop)
+#############################################################################################
+import multiprocessing
+import optparse
+import os
+import sys
+
+import stereoImageIO
+import stereoLayout
+
+DEFAULT_CHUNK_ROWS = 256
+
+def _CropFrame(task):
+	(src, dest, box, chunkRows) = task
+	stereoImageIO.CropColumns(src, dest, box[0], box[2], chunkRows)
+	return 1
+
+# RETURN: list of crop tasks (source, destination, box, chunkRows) of one camera
+def FrameTasks(output, dest, camera, box, frames=None, chunkRows=DEFAULT_CHUNK_ROWS):
+	tasks = []
+	for suffix in stereoLayout.ListViews(output, camera):
+		files = stereoLayout.ListFrameFiles(output, camera, camera + suffix)
+		for frame in sorted(files.keys()):
+			if frames is not None and frame not in frames:
+				continue
+			src = files[frame]
+			target = os.path.join(dest, camera, camera + suffix, os.path.basename(src))
+			tasks.append((src, target, box, chunkRows))
+	return tasks
+
+# Crop all frames of the given cameras with a pool of worker processes
+# RETURN: number of images written
+def CropSequences(output, dest, cameras, frames=None, workers=None, chunkRows=DEFAULT_CHUNK_ROWS):
+	tasks = []
+	for camera in cameras:
+		info = stereoLayout.ReadCropInfo(output, camera)
+		if info is None:
+			print 'Skipping %s: no %s (render with StereoAnimator.py first)' % (camera, stereoLayout.CROP_NAME)
+			continue
+		print 'Cropping %s to %s (%d pixels per side)' % (camera, info['box'], info['margin'])
+		stereoLayout.WriteCropInfo(dest, camera, info)
+		tasks += FrameTasks(output, dest, camera, info['box'], frames, chunkRows)
+	if not tasks:
+		return 0
+	if workers == 1:
+		return sum(map(_CropFrame, tasks))
+	pool = multiprocessing.Pool(workers)
+	try:
+		written = 0
+		for count in pool.imap_unordered(_CropFrame, tasks):
+			written += count
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	pool.join()
+	return written
+
+def main(argv):
+	parser = optparse.OptionParser(usage="python stereoCrop.py [options] output_root")
+	parser.add_option('--dest', default=None, help="root of the cropped tree (default: <output_root>_crop)")
+	parser.add_option('--cameras', default=None, help="comma separated camera names (default: all)")
+	parser.add_option('--frames', default=None, help="frames to crop, e.g. '1-100'")
+	parser.add_option('--workers', type='int', default=None, help="worker processes (default: one per core)")
+	parser.add_option('--chunk-rows', dest='chunkRows', type='int', default=DEFAULT_CHUNK_ROWS,
+		help="rows copied at a time (default: %d)" % DEFAULT_CHUNK_ROWS)
+	(options, args) = parser.parse_args(argv[1:])
+	if len(args) != 1:
+		parser.error("expected the output root directory")
+	stereoImageIO.RequireImageSupport()
+
+	output = args[0]
+	dest = options.dest or os.path.normpath(output) + '_crop'
+	if os.path.abspath(dest) == os.path.abspath(output):
+		parser.error("--dest must differ from the output root")
+	cameras = options.cameras and options.cameras.split(',') or stereoLayout.ListCameras(output)
+	frames = options.frames and stereoLayout.ParseFrameSpec(options.frames) or None
+	written = CropSequences(output, dest, cameras, frames and set(frames), options.workers, options.chunkRows)
+	print 'Wrote %d images to %s' % (written, dest)
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,404 @@
+# Store the right eye of the _SLEFT/_SRIGHT sequences as a residual against the
+# left eye. Both eyes of the parallel off-axis rig see nearly the same image,
+# mostly shifted horizontally, so instead of a second full image only
+#
+#	residual = right - prediction (mod 256, per byte)
+#
+# is kept, compressed with zlib, where the prediction is the left image shifted
+#
+#	shift	by one number of columns for the whole frame, searched on every
+#			8th row within the disparity range of the rig
+#	block	by its own number of columns for every block x block tile (the
+#			disparities are stored with the residual), for scenes with a lot
+#			of depth
+#
+# The search range is the crop margin StereoAnimator records in
+# stereo_crop.json: the largest disparity the rig's shiftX gives behind the
+# screen up to clipEnd. The right eye comes back bit for bit (the pixels; the
+# file is written again in its format). The left eye is not touched.
+#
+# Only lossless right eyes are encoded: JPEG files, or images PIL has to
+# convert to RGB (palette, 16 bit, ...), would be written back with other
+# pixels, so they are skipped and stay as they are. A right eye is also kept
+# when its delta is not smaller than the file.
+#
+# <output>/<Camera>/<Camera>_SDELTA/<Camera>_SDELTA_0001.sdelta:
+#	header		magic, size, bands, method, shift, rows per band, PIL mode and
+#				the extension of the right eye file
+#	stream		one zlib stream of bands of rows; in block mode each band
+#				starts with the int16 disparities of its tiles
+#
+# Frames are encoded and decoded a band of rows at a time, so the compressed
+# stream is written and read as it goes. Encoding checks that the delta
+# decodes to the right eye before that is removed (unless --keep).
+#
+# To use (NumPy and PIL, plain Python, after the render):
+#	python stereoDelta.py report /tmp/shot				(sizes only, nothing written)
+#	python stereoDelta.py encode --method block --workers 8 /tmp/shot
+#	python stereoDelta.py decode /tmp/shot				(the _SRIGHT files again)
+#############################################################################################
+import multiprocessing
+import optparse
+import os
+import struct
+import sys
+import tempfile
+import zlib
+
+try:
+	import json
+except ImportError:
+	import simplejson as json
+
+import stereoImageIO
+import stereoLayout
+from stereoImageIO import numpy
+
+DELTA_EXT = '.sdelta'
+REPORT_NAME = 'stereo_delta.json'
+MAGIC = 'STDELTA1'
+HEADER = struct.Struct('<8sIIBBhH8s8s')	# magic, width, height, bands, method, shift, rows, mode, ext
+METHODS = ['shift', 'block']
+DEFAULT_BLOCK = 16
+DEFAULT_SEARCH = 32			# without stereo_crop.json
+DEFAULT_CHUNK_ROWS = 64
+SAMPLE_ROWS = 8				# shift search on every 8th row
+READ_SIZE = 1 << 16
+LEVEL = 6
+LOSSY_EXTS = ('.jpg', '.jpeg')
+MODES = ('RGB', 'RGBA', 'L')	# modes ReadImageBands keeps as they are
+
+# RETURN: source column of every column of a frame shifted by shift columns
+# (positive: to the right), repeating the edge column
+def ShiftColumns(shift, width):
+	return numpy.clip(numpy.arange(width) - shift, 0, width - 1)
+
+# RETURN: source columns of a band whose tiles are shifted by disparities
+def BlockColumns(disparities, width, block):
+	shift = numpy.repeat(disparities.astype(numpy.int64), block)[:width]
+	return numpy.clip(numpy.arange(width) - shift, 0, width - 1)
+
+# Candidate shifts, smallest first so ties keep the smaller one
+def Candidates(search):
+	shifts = [0]
+	for d in range(1, search + 1):
+		shifts += [d, -d]
+	return shifts
+
+# RETURN: the shift of the whole left image that predicts the right best
+def GlobalShift(left, right, search):
+	l = left[::SAMPLE_ROWS]
+	r = right[::SAMPLE_ROWS].astype(numpy.int16)
+	best = None
+	for d in Candidates(search):
+		cost = numpy.abs(r - l[:, ShiftColumns(d, left.shape[1])]).sum()
+		if best is None or cost < best[0]:
+			best = (cost, d)
+	return best[1]
+
+# RETURN: the shift of every block x block tile of a band of rows (int16)
+def BlockDisparities(left, right, block, search):
+	width = left.shape[1]
+	tiles = (width + block - 1) // block
+	pad = tiles * block - width
+	r = right.astype(numpy.int16)
+	best = numpy.empty(tiles)
+	best.fill(numpy.inf)
+	disparities = numpy.zeros(tiles, numpy.int16)
+	for d in Candidates(search):
+		cost = numpy.abs(r - left[:, ShiftColumns(d, width)]).sum(axis=2).sum(axis=0)
+		if pad:
+			cost = numpy.concatenate((cost, numpy.zeros(pad, cost.dtype)))
+		cost = cost.reshape(tiles, block).sum(axis=1)
+		better = cost < best
+		best[better] = cost[better]
+		disparities[better] = d
+	return disparities
+
+# Encode the right eye against the left into path. The residual is compressed
+# and written a band of rows at a time.
+# RETURN: the shift (shift method) or the mean absolute tile disparity
+def EncodeDelta(path, left, right, mode, ext, method='shift', search=DEFAULT_SEARCH, block=DEFAULT_BLOCK,
+		chunkRows=DEFAULT_CHUNK_ROWS):
+	if left.shape != right.shape:
+		raise ValueError("Left and right images differ: %r != %r" % (left.shape, right.shape))
+	height, width, bands = right.shape
+	shift = 0
+	rows = chunkRows
+	if method == 'shift':
+		shift = GlobalShift(left, right, search)
+		columns = ShiftColumns(shift, width)
+	elif method == 'block':
+		rows = block
+	else:
+		raise ValueError("Unknown delta method '%s'" % method)
+	stereoLayout.MakeDirs(os.path.dirname(path))
+	f = open(path + '.tmp', 'wb')
+	f.write(HEADER.pack(MAGIC, width, height, bands, METHODS.index(method), shift, rows, mode, ext))
+	stream = zlib.compressobj(LEVEL)
+	total = 0
+	for r0 in range(0, height, rows):
+		l = left[r0:r0+rows]
+		r = right[r0:r0+rows]
+		if method == 'block':
+			disparities = BlockDisparities(l, r, block, search)
+			total += numpy.abs(disparities).sum()
+			f.write(stream.compress(disparities.astype('<i2').tostring()))
+			columns = BlockColumns(disparities, width, block)
+		f.write(stream.compress((r - l[:, columns]).tostring()))
+	f.write(stream.flush())
+	f.close()
+	os.rename(path + '.tmp', path)
+	if method == 'block':
+		return total / float(((width + block - 1) // block) * ((height + block - 1) // block))
+	return shift
+
+# RETURN: the header of a delta file as a dictionary
+def ReadHeader(f):
+	[magic, width, height, bands, method, shift, rows, mode, ext] = HEADER.unpack(f.read(HEADER.size))
+	if magic != MAGIC:
+		raise IOError("%s is not a stereo delta" % f.name)
+	return {'width': width, 'height': height, 'bands': bands, 'method': METHODS[method], 'shift': shift,
+		'rows': rows, 'mode': mode.rstrip('\0'), 'ext': ext.rstrip('\0')}
+
+# Decode a delta a band of rows at a time, reading and decompressing only as
+# much of the file as the band needs
+# RETURN: iterator of (first row, rows of the right eye)
+def DecodeBands(path, left):
+	f = open(path, 'rb')
+	try:
+		header = ReadHeader(f)
+		height, width, bands = header['height'], header['width'], header['bands']
+		if left.shape != (height, width, bands):
+			raise ValueError("%s does not belong to a left eye of %r" % (path, left.shape))
+		rows = header['rows']
+		tiles = (width + rows - 1) // rows
+		columns = ShiftColumns(header['shift'], width)
+		stream = zlib.decompressobj()
+		buffer = ''
+		for r0 in range(0, height, rows):
+			count = min(rows, height - r0)
+			need = count * width * bands
+			if header['method'] == 'block':
+				need += tiles * 2
+			while len(buffer) < need:
+				data = f.read(READ_SIZE)
+				if not data:
+					buffer += stream.flush()
+					if len(buffer) < need:
+						raise IOError("%s is truncated" % path)
+					break
+				buffer += stream.decompress(data)
+			band = buffer[:need]
+			buffer = buffer[need:]
+			if header['method'] == 'block':
+				disparities = numpy.frombuffer(band[:tiles * 2], '<i2')
+				columns = BlockColumns(disparities, width, rows)
+				band = band[tiles * 2:]
+			residual = numpy.frombuffer(band, numpy.uint8).reshape(count, width, bands)
+			yield r0, left[r0:r0+count][:, columns] + residual
+	finally:
+		f.close()
+
+# RETURN: the right eye of a delta file as (pixels, PIL mode, extension)
+def Decode(path, left):
+	f = open(path, 'rb')
+	header = ReadHeader(f)
+	f.close()
+	right = numpy.empty(left.shape, numpy.uint8)
+	for r0, rows in DecodeBands(path, left):
+		right[r0:r0+len(rows)] = rows
+	return right, header['mode'], header['ext']
+
+# RETURN: path of the delta of a frame
+def DeltaPath(output, camera, frame):
+	name = camera + stereoLayout.DELTA_SUFFIX
+	return stereoLayout.FramePrefix(output, camera, name) + stereoLayout.FrameString(frame) + DELTA_EXT
+
+# RETURN: the disparity search range of a camera (see the top of this file)
+def SearchRange(output, camera, default=DEFAULT_SEARCH):
+	info = stereoLayout.ReadCropInfo(output, camera)
+	if info is None or not info.get('margin'):
+		return default
+	return int(info['margin']) + 1
+
+# RETURN: True if the pixels of an image file come back as they are when it is
+# written again in its format
+def IsLossless(path):
+	if os.path.splitext(path)[1].lower() in LOSSY_EXTS:
+		return False
+	return stereoImageIO.Image.open(path).mode in MODES
+
+# Work item for the pool: (frame, left, right, delta path, method, search,
+# block, chunk rows, command, keep). 'report' encodes into a temporary file
+# and leaves the output alone; 'encode' removes the right eye unless keep.
+# A delta that is not smaller than the right eye is removed again.
+# RETURN: (frame, left bytes, right bytes, delta bytes, shift, stored)
+def _EncodeFrame(task):
+	(frame, leftPath, rightPath, deltaPath, method, search, block, chunkRows, command, keep) = task
+	if not IsLossless(rightPath):
+		raise ValueError("%s is not stored losslessly" % rightPath)
+	left, mode = stereoImageIO.ReadImageBands(leftPath)
+	right, rightMode = stereoImageIO.ReadImageBands(rightPath)
+	if mode != rightMode:
+		raise ValueError("%s is %s, %s is %s" % (leftPath, mode, rightPath, rightMode))
+	sizes = (os.path.getsize(leftPath), os.path.getsize(rightPath))
+	if command == 'report':
+		[fd, deltaPath] = tempfile.mkstemp(suffix=DELTA_EXT)
+		os.close(fd)
+	try:
+		shift = EncodeDelta(deltaPath, left, right, mode, os.path.splitext(rightPath)[1], method, search,
+			block, chunkRows)
+		size = os.path.getsize(deltaPath)
+		stored = size < sizes[1]
+		if command == 'encode':
+			if not stored:
+				os.remove(deltaPath)
+			elif not numpy.array_equal(Decode(deltaPath, left)[0], right):
+				os.remove(deltaPath)
+				raise IOError("%s does not decode to %s" % (deltaPath, rightPath))
+			elif not keep:
+				os.remove(rightPath)
+	finally:
+		if command == 'report':
+			os.remove(deltaPath)
+	return (frame,) + sizes + (size, float(shift), stored)
+
+# Work item for the pool: (frame, left, delta path, right eye prefix, keep)
+# RETURN: (frame, left bytes, right bytes, delta bytes, shift, stored)
+def _DecodeFrame(task):
+	(frame, leftPath, deltaPath, prefix, keep) = task
+	left, mode = stereoImageIO.ReadImageBands(leftPath)
+	[right, mode, ext] = Decode(deltaPath, left)
+	rightPath = prefix + stereoLayout.FrameString(frame) + ext
+	stereoImageIO.WriteImage(rightPath, right, mode)
+	size = os.path.getsize(deltaPath)
+	if not keep:
+		os.remove(deltaPath)
+	return (frame, os.path.getsize(leftPath), os.path.getsize(rightPath), size, 0., True)
+
+# Build the work items of one camera: frames with both eyes for encode and 
+# report (lossless right eyes only, see IsLossless), frames with a delta and
+# a left eye for decode
+# RETURN: (list of tasks, number of frames skipped as lossy)
+def FrameTasks(command, output, camera, frames=None, method='shift', search=None, block=DEFAULT_BLOCK,
+		chunkRows=DEFAULT_CHUNK_ROWS, keep=False):
+	lefts = stereoLayout.ListFrameFiles(output, camera, camera + stereoLayout.EYE_SUFFIXES[0])
+	if command == 'decode':
+		deltas = stereoLayout.ListFrameFiles(output, camera, camera + stereoLayout.DELTA_SUFFIX)
+		prefix = stereoLayout.FramePrefix(output, camera, camera + stereoLayout.EYE_SUFFIXES[1])
+		return [(frame, lefts[frame], deltas[frame], prefix, keep) for frame in sorted(deltas.keys())
+			if lefts.has_key(frame) and (frames is None or frame in frames)], 0
+	rights = stereoLayout.ListFrameFiles(output, camera, camera + stereoLayout.EYE_SUFFIXES[1])
+	if search is None:
+		search = SearchRange(output, camera)
+	tasks = []
+	lossy = 0
+	for frame in sorted(rights.keys()):
+		if not lefts.has_key(frame) or (frames is not None and frame not in frames):
+			continue
+		if not IsLossless(rights[frame]):
+			lossy += 1
+			continue
+		tasks.append((frame, lefts[frame], rights[frame], DeltaPath(output, camera, frame), method, search,
+			block, chunkRows, command, keep))
+	return tasks, lossy
+
+# Run the tasks of one camera with a pool of worker processes
+# RETURN: list of the results of the tasks
+def RunTasks(command, tasks, workers=None):
+	function = command == 'decode' and _DecodeFrame or _EncodeFrame
+	if workers == 1:
+		return map(function, tasks)
+	pool = multiprocessing.Pool(workers)
+	try:
+		# imap keeps only a few decoded frames in flight per worker
+		results = list(pool.imap_unordered(function, tasks))
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	pool.join()
+	return results
+
+# Record the sizes of encoded frames in <output>/<Camera>/stereo_delta.json
+# (dropped again when they are decoded; right eyes kept as files are not
+# recorded)
+# RETURN: the report, frame -> [left bytes, right bytes, delta bytes, shift]
+def UpdateReport(output, camera, command, results):
+	path = os.path.join(output, camera, REPORT_NAME)
+	report = {}
+	if os.path.isfile(path):
+		f = open(path)
+		report = json.load(f)
+		f.close()
+	for result in results:
+		if command == 'decode':
+			report.pop(str(result[0]), None)
+		elif result[5]:
+			report[str(result[0])] = list(result[1:5])
+	if command != 'report' and (report or os.path.isfile(path)):
+		f = open(path + '.tmp', 'w')
+		json.dump(report, f, sort_keys=True)
+		f.close()
+		os.rename(path + '.tmp', path)
+	return report
+
+# RETURN: a line with the compression of the right eye and of both eyes
+def Summary(camera, sizes):
+	if not sizes:
+		return '%s: no frames' % camera
+	left = sum([s[0] for s in sizes])
+	right = sum([s[1] for s in sizes])
+	delta = max(1, sum([s[2] for s in sizes]))
+	return ('%s: %d frames, right eye %.1f MB as files, %.1f MB as deltas (%.2fx); both eyes %.1f MB -> '
+		'%.1f MB (%.2fx); mean shift %.1f px' % (camera, len(sizes), right / 1e6, delta / 1e6, right / float(delta),
+		(left + right) / 1e6, (left + delta) / 1e6, (left + right) / float(left + delta),
+		sum([s[3] for s in sizes]) / len(sizes)))
+
+def main(argv):
+	parser = optparse.OptionParser(usage="python stereoDelta.py report|encode|decode [options] output_root")
+	parser.add_option('--method', default='shift', choices=METHODS,
+		help="prediction of the right eye: shift (one shift per frame, default) or block (per tile)")
+	parser.add_option('--block', type='int', default=DEFAULT_BLOCK,
+		help="tile size of the block method in pixels (default: %d)" % DEFAULT_BLOCK)
+	parser.add_option('--search', type='int', default=None,
+		help="largest shift tried in pixels (default: the crop margin of the camera, or %d)" % DEFAULT_SEARCH)
+	parser.add_option('--cameras', default=None, help="comma separated camera names (default: all)")
+	parser.add_option('--frames', default=None, help="frames to encode or decode, e.g. '1-100'")
+	parser.add_option('--keep', action='store_true', default=False,
+		help="keep the right eye files when encoding and the deltas when decoding")
+	parser.add_option('--workers', type='int', default=None, help="worker processes (default: one per core)")
+	parser.add_option('--chunk-rows', dest='chunkRows', type='int', default=DEFAULT_CHUNK_ROWS,
+		help="rows encoded at a time by the shift method (default: %d)" % DEFAULT_CHUNK_ROWS)
+	(options, args) = parser.parse_args(argv[1:])
+	if len(args) != 2 or args[0] not in ('report', 'encode', 'decode'):
+		parser.error("expected report, encode or decode and the output root directory")
+	stereoImageIO.RequireImageSupport()
+
+	[command, output] = args
+	cameras = options.cameras and options.cameras.split(',') or stereoLayout.ListCameras(output)
+	frames = options.frames and set(stereoLayout.ParseFrameSpec(options.frames)) or None
+	for camera in cameras:
+		[tasks, lossy] = FrameTasks(command, output, camera, frames, options.method, options.search,
+			options.block, options.chunkRows, options.keep)
+		if lossy:
+			print '%s: skipped %d lossy right eye images (JPEG or converted by PIL)' % (camera, lossy)
+		results = RunTasks(command, tasks, options.workers)
+		report = UpdateReport(output, camera, command, results)
+		if command == 'decode':
+			directory = os.path.dirname(DeltaPath(output, camera, 0))
+			if os.path.isdir(directory) and not os.listdir(directory):
+				os.rmdir(directory)
+			print 'Decoded %d right eye images of %s' % (len(results), camera)
+		elif command == 'encode':
+			larger = len([r for r in results if not r[5]])
+			if larger:
+				print '%s: kept %d right eye images whose delta is not smaller' % (camera, larger)
+			print Summary(camera, report.values())
+		else:
+			print Summary(camera, [r[1:5] for r in results])
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
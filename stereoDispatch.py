@@ -0,0 +1,666 @@
+# Parallel stereo rendering: split the frame range (and optionally the camera
+# list) of a shot into shards and render each shard in its own background
+# Blender process:
+#
+#	blender -b shot.blend -P StereoAnimator.py -- --frames 1-40 --output <staging>
+#
+# Every shard renders into a staging directory below <output>/.shards so that a
+# worker which dies half way through cannot leave broken frames in the final
+# tree. Once a worker reports success its staging tree is merged into the usual
+# <output>/<Camera>/<Camera>_SLEFT/ layout; failed shards are retried.
+#
+# To use:
+#	python stereoDispatch.py --output /tmp/shot --frames 1-4000 --workers 16 shot.blend
+#
+# Options after '--' are passed on to every worker (StereoAnimator.py), e.g.
+#	python stereoDispatch.py --output /tmp/shot --frames 1-4000 shot.blend -- --eye-sep 5.5 --archive
+# except the ones the dispatcher sets itself (WORKER_RESERVED).
+#
+# With --resume, images already recorded in <output>/stereo_manifest.jsonl (see
+# stereoManifest.py) are skipped by the workers; each shard's manifest records
+# are merged into it together with the images.
+#
+# Run with --local to replace Blender by a stand-in worker that writes
+# placeholder frames (see LocalRunner). This exercises the sharding, merge
+# and failure handling without Blender.
+#
+# With --queue, several render nodes share one job: every node runs this script
+# with the same --output (a shared filesystem) and claims shards from the task
+# queue in <output>/.queue (see stereoQueue.py) until all are done. Shards of a
+# node that dies are taken over once its lease expires:
+#
+#	node1$ python stereoDispatch.py --queue --output /shared/shot --frames 1-4000 --workers 8 shot.blend
+#	node2$ python stereoDispatch.py --queue --output /shared/shot --frames 1-4000 --workers 8 shot.blend
+#	python stereoQueue.py /shared/shot				(progress and per node throughput)
+#
+# Workers add their render times to the cost model of the shot (see
+# stereoCost.py; <shot>.stereocost.jsonl next to the .blend). Once it has
+# data, shards are cut to equal predicted render time instead of equal frame
+# counts and started longest first, and an ETA is printed as shards finish.
+# --cost-sample N first times N frames of every camera at low resolution in
+# one worker, so even the first run of a shot is balanced.
+#############################################################################################
+import optparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import stereoArchive
+import stereoCost
+import stereoLayout
+import stereoManifest
+import stereoQueue
+import stereoTrace
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# StereoAnimator options the dispatcher sets per shard, not passed through
+WORKER_RESERVED = ['--frames', '--output', '--shard-done', '--cameras', '--resume', '--resume-from',
+	'--cost-model', '--cost-sample', '--cost-only', '--jobs']
+
+class Shard:
+	##########################################
+	# Class Member Data ([Type] [name]):
+	#
+	# Integer index		// Position of the shard in the job
+	# List frames		// Frames rendered by this shard
+	# List cameras		// Camera names rendered by this shard (None: all cameras)
+	# String staging	// Private directory of the shard worker
+	# Integer attempts	// Number of times a worker was started for this shard
+	# Float predicted	// Render seconds the cost model predicts (None: no model)
+	# String costModel	// Cost model file the worker adds its render times to
+	# List options		// Options of the job passed through to the worker
+	##########################################
+
+	def __init__(self, index, frames, cameras, stagingRoot, resumeFrom=None):
+		self.index = index
+		self.frames = frames
+		self.cameras = cameras
+		self.resumeFrom = resumeFrom
+		self.staging = os.path.join(stagingRoot, 'shard-%.4d' % index)
+		self.attempts = 0
+		self.process = None
+		self.log = None
+		self.started = None
+		self.predicted = None
+		self.costModel = None
+		self.options = []
+
+	# Directory the worker renders into
+	def OutputDir(self):
+		return os.path.join(self.staging, 'out')
+
+	# Marker file written by the worker once all of its frames are rendered
+	def DoneFile(self):
+		return os.path.join(self.staging, 'done')
+
+	def LogFile(self):
+		return os.path.join(self.staging, 'worker.log')
+
+	# Arguments understood by StereoAnimator.ParseArguments
+	def WorkerArguments(self):
+		args = ['--frames', stereoLayout.FormatFrameSpec(self.frames),
+				'--output', self.OutputDir(),
+				'--shard-done', self.DoneFile()]
+		if self.cameras:
+			args += ['--cameras', ','.join(self.cameras)]
+		if self.resumeFrom:
+			args += ['--resume-from', self.resumeFrom]
+		if self.costModel:
+			args += ['--cost-model', self.costModel]
+		return args + self.options
+
+	def __repr__(self):
+		desc = 'shard %d (frames %s' % (self.index, stereoLayout.FormatFrameSpec(self.frames))
+		if self.cameras:
+			desc += ', cameras %s' % ','.join(self.cameras)
+		return desc + ')'
+
+# Starts a background Blender running StereoAnimator.py on one shard
+class BlenderRunner:
+	def __init__(self, blendFile, blender='blender', script=None):
+		self.blendFile = blendFile
+		self.blender = blender
+		self.script = script or os.path.join(SCRIPT_DIR, 'StereoAnimator.py')
+
+	# RETURN: the command line of the worker process
+	def Command(self, shard):
+		return [self.blender, '-b', self.blendFile, '-P', self.script, '--'] + shard.WorkerArguments()
+
+	# RETURN: the command line of a worker that only times count frames of 
+	# every camera for the cost model
+	def SampleCommand(self, frames, cameras, count, output, costModel, options=[]):
+		args = ['--frames', stereoLayout.FormatFrameSpec(frames), '--output', output, '--cost-model', costModel,
+			'--cost-sample', str(count), '--cost-only']
+		if cameras:
+			args += ['--cameras', ','.join(cameras)]
+		return [self.blender, '-b', self.blendFile, '-P', self.script, '--'] + args + options
+
+# Local stand-in for the Blender render call. Runs this module as the worker
+# (see LocalWorker), which writes small placeholder images into the same layout
+# as RenderFrame, optionally sleeping per image and failing on purpose. Of the
+# options passed through to StereoAnimator it only understands --archive.
+class LocalRunner:
+	##########################################
+	# Class Member Data ([Type] [name]):
+	#
+	# List cameras			// Camera names the fake scene contains
+	# String seconds		// Simulated render time per image, e.g. '0.1' or
+	#							'Left=0.1,Right=0.3' (see LocalSeconds)
+	# Dict failures			// shard index -> number of attempts that should fail
+	##########################################
+
+	def __init__(self, cameras, seconds='0', failures=None):
+		self.cameras = cameras
+		self.seconds = str(seconds)
+		self.failures = failures or {}
+
+	def Command(self, shard):
+		cmd = [sys.executable, os.path.abspath(__file__), '--local-worker',
+			'--seconds', self.seconds] + shard.WorkerArguments()
+		if not shard.cameras:
+			cmd += ['--cameras', ','.join(self.cameras)]
+		if shard.attempts <= self.failures.get(shard.index, 0):
+			# die half way through the shard, without writing the done marker
+			cmd += ['--fail-after', str(max(1, len(shard.frames) // 2))]
+		return cmd
+
+	def SampleCommand(self, frames, cameras, count, output, costModel, options=[]):
+		return [sys.executable, os.path.abspath(__file__), '--local-worker', '--seconds', self.seconds,
+			'--frames', stereoLayout.FormatFrameSpec(frames), '--cameras', ','.join(cameras or self.cameras),
+			'--output', output, '--cost-model', costModel, '--cost-sample', str(count)]
+
+# RETURN: the simulated render seconds of a camera: spec is one number for
+# all cameras or 'Camera=seconds,...' (cameras not listed take 0)
+def LocalSeconds(spec, camera):
+	if '=' not in spec:
+		return float(spec)
+	for part in spec.split(','):
+		[name, seconds] = part.split('=', 1)
+		if name == camera:
+			return float(seconds)
+	return 0.
+
+# Worker used by LocalRunner: mimics RenderAllRigsByFrame without Blender
+def LocalWorker(argv):
+	parser = optparse.OptionParser()
+	parser.add_option('--local-worker', action='store_true')
+	parser.add_option('--frames')
+	parser.add_option('--cameras')
+	parser.add_option('--output')
+	parser.add_option('--shard-done', dest='shardDone')
+	parser.add_option('--seconds', default='0')
+	parser.add_option('--fail-after', dest='failAfter', type='int', default=None)
+	parser.add_option('--resume-from', dest='resumeFrom', action='append', default=[])
+	parser.add_option('--cost-model', dest='costModel', default=None)
+	parser.add_option('--cost-sample', dest='costSample', type='int', default=0)
+	parser.add_option('--archive', action='store_true', default=False)
+	(options, args) = parser.parse_args(argv)
+
+	frames = stereoLayout.ParseFrameSpec(options.frames)
+	model = options.costModel and stereoCost.CostModel(options.costModel) or None
+	if options.costSample:
+		# samples at 25%: a sixteenth of the pixels
+		for frame in stereoCost.SampleFrames(frames, options.costSample):
+			for cam in options.cameras.split(','):
+				seconds = LocalSeconds(options.seconds, cam) / 16.
+				time.sleep(seconds)
+				model.Observe(cam, frame, seconds, 'sample', 25, 1)
+		model.Flush()
+		return 0
+	manifest = stereoManifest.FrameManifest(options.output, options.resumeFrom)
+	archives = {}
+	for count, frame in enumerate(frames):
+		if options.failAfter is not None and count >= options.failAfter:
+			print 'Simulated worker failure at frame', frame
+			return 1
+		for cam in options.cameras.split(','):
+			for suffix in stereoLayout.EYE_SUFFIXES:
+				if options.resumeFrom and manifest.IsComplete(frame, suffix, cam, 'local'):
+					continue
+				prefix = stereoLayout.FramePrefix(options.output, cam, cam + suffix)
+				stereoLayout.MakeDirs(os.path.dirname(prefix))
+				seconds = LocalSeconds(options.seconds, cam)
+				time.sleep(seconds)
+				if model is not None:
+					model.Observe(cam, frame, seconds, 'render', 100, 16, model.Predict(cam, frame, 16))
+				data = '%s%s frame %d\n' % (cam, suffix, frame)
+				if options.archive:
+					if not archives.has_key(cam):
+						archives[cam] = stereoArchive.StereoArchive(stereoArchive.ArchivePath(options.output, cam),
+							stereoLayout.EYE_SUFFIXES, frames, writable=True)
+					archives[cam].Append(frame, suffix, data, '.png')
+					manifest.RecordArchived(frame, suffix, cam, archives[cam], 'local')
+					continue
+				path = prefix + stereoLayout.FrameString(frame) + '.png'
+				f = open(path, 'wb')
+				f.write(data)
+				f.close()
+				manifest.Record(frame, suffix, cam, path, 'local')
+	for archive in archives.values():
+		archive.Close()
+	if model is not None:
+		model.Flush()
+	if options.shardDone:
+		f = open(options.shardDone, 'w')
+		f.write('%d\n' % len(frames))
+		f.close()
+	return 0
+
+# Split a job into shards: chunks of consecutive frames (see 
+# stereoLayout.SplitFrames and stereoCost.BalancedChunks), optionally crossed
+# with single cameras
+# RETURN: list of Shard
+def MakeShards(chunks, cameras, splitCameras, stagingRoot, resumeFrom=None):
+	if splitCameras and cameras:
+		cameraSets = [[c] for c in cameras]
+	else:
+		cameraSets = [cameras]
+	shards = []
+	for chunk in chunks:
+		for cams in cameraSets:
+			shards.append(Shard(len(shards), chunk, cams, stagingRoot, resumeFrom))
+	return shards
+
+# Move everything a shard rendered into the final output tree, then add the
+# shard's manifest records to the final manifest (only once the files are there).
+# Archives (--archive) are merged into the final camera archive image by image.
+# renew is called after every file (to keep a lock alive during long merges).
+# RETURN: number of images merged
+def MergeShard(shard, output, renew=None):
+	merged = 0
+	root = shard.OutputDir()
+	for dirpath, dirnames, filenames in os.walk(root):
+		rel = os.path.relpath(dirpath, root)
+		dest = os.path.normpath(os.path.join(output, rel))
+		for name in filenames:
+			if rel == '.' and name == stereoManifest.MANIFEST_NAME:
+				continue
+			stereoLayout.MakeDirs(dest)
+			target = os.path.join(dest, name)
+			if name == stereoLayout.CROP_NAME:
+				camera = os.path.basename(dest)
+				info = stereoLayout.MergeCropInfo(stereoLayout.ReadCropInfo(output, camera),
+					stereoLayout.ReadCropInfo(root, camera))
+				stereoLayout.WriteCropInfo(output, camera, info)
+				os.remove(os.path.join(dirpath, name))
+				continue
+			if name.endswith(stereoArchive.ARCHIVE_EXT):
+				merged += stereoArchive.MergeArchive(target, os.path.join(dirpath, name))
+			else:
+				if os.path.exists(target):
+					os.remove(target)
+				# rename is atomic as long as the staging tree is on the same filesystem
+				shutil.move(os.path.join(dirpath, name), target)
+				merged += 1
+			if renew is not None:
+				renew()
+	stereoManifest.FrameManifest(output).Merge(stereoManifest.FrameManifest(root))
+	return merged
+
+class Dispatcher:
+	##########################################
+	# Class Member Data ([Type] [name]):
+	#
+	# Object runner			// BlenderRunner or LocalRunner
+	# String output			// Root of the final output tree
+	# Integer workers		// Number of worker processes run at the same time
+	# Integer retries		// How often a failed shard is restarted
+	# List shards			// All shards of the job
+	# String costModel		// Cost model file of the shot (None: no cost model)
+	# List costs			// (predicted, actual) seconds of the finished shards
+	# List options			// Options passed through to every worker
+	##########################################
+
+	def __init__(self, runner, output, workers, retries=1, resume=False, costModel=None, options=None):
+		self.runner = runner
+		self.output = output
+		self.workers = max(1, workers)
+		self.retries = retries
+		self.resume = resume
+		self.stagingRoot = os.path.join(output, '.shards')
+		self.shards = []
+		self.failed = []
+		self.merged = 0
+		self.costModel = costModel
+		self.costs = []
+		self.options = options or []
+
+	# Time count frames of every camera in one worker for the cost model
+	def SampleCosts(self, frames, cameras, count):
+		output = os.path.join(self.stagingRoot, 'cost-sample')
+		stereoLayout.MakeDirs(output)
+		log = open(os.path.join(output, 'worker.log'), 'w')
+		print 'Timing %d frames of every camera for %s' % (count, self.costModel)
+		status = subprocess.call(self.runner.SampleCommand(frames, cameras, count, output, self.costModel,
+			self.options), stdout=log, stderr=subprocess.STDOUT)
+		log.close()
+		if status != 0:
+			print 'Timing the samples failed (exit status %s), see %s' % (status, log.name)
+			return
+		shutil.rmtree(output)
+
+	def AddShards(self, frames, cameras=None, chunkSize=None, splitCameras=False):
+		if chunkSize is None:
+			# a few shards per worker so that fast shards do not leave workers idle
+			chunkSize = -(-len(frames) // (self.workers * 4))
+		model = self.costModel and stereoCost.CostModel(self.costModel) or None
+		if model is None or not model.HasData():
+			self.shards = MakeShards(stereoLayout.SplitFrames(frames, chunkSize), cameras, splitCameras,
+				self.stagingRoot, self.resume and self.output or None)
+			for shard in self.shards:
+				shard.costModel = self.costModel
+				shard.options = self.options
+			return
+		# as many shards, but each with about the same predicted render time
+		costCameras = cameras or sorted(model.rates.keys())
+		chunks = stereoCost.BalancedChunks(frames, model.FrameCosts(frames, costCameras), 
+			-(-len(frames) // chunkSize))
+		self.shards = MakeShards(chunks, cameras, splitCameras, self.stagingRoot, 
+			self.resume and self.output or None)
+		for shard in self.shards:
+			shard.costModel = self.costModel
+			shard.options = self.options
+			shard.predicted = sum(model.FrameCosts(shard.frames, shard.cameras or costCameras))
+		# longest first, so no long shard starts when the others are done
+		self.shards.sort(key=lambda shard: -shard.predicted)
+		predicted = [shard.predicted for shard in self.shards]
+		print 'Predicted render time: %s, %s with %d workers%s' % (stereoTrace.FormatDuration(sum(predicted)),
+			stereoTrace.FormatDuration(stereoCost.Makespan(predicted, self.workers)), self.workers,
+			not model.Calibrated() and ' (uncalibrated: sample renders only, final renders take longer)' or '')
+
+	# RETURN: the predicted seconds until pending and running shards are
+	# done, scaled by how far off the finished shards were; None without
+	# predictions
+	def ETA(self, pending, running):
+		if not self.shards or self.shards[0].predicted is None:
+			return None
+		now = time.time()
+		left = [shard.predicted for shard in pending]
+		left += [max(0., shard.predicted - (now - shard.started)) for shard in running]
+		predicted = sum([c[0] for c in self.costs])
+		scale = predicted > 0 and sum([c[1] for c in self.costs]) / predicted or 1.
+		return stereoCost.Makespan([c * scale for c in left], self.workers)
+
+	def Start(self, shard):
+		if os.path.isdir(shard.staging):
+			shutil.rmtree(shard.staging)
+		stereoLayout.MakeDirs(shard.OutputDir())
+		shard.attempts += 1
+		shard.log = open(shard.LogFile(), 'w')
+		shard.started = time.time()
+		shard.process = subprocess.Popen(self.runner.Command(shard),
+			stdout=shard.log, stderr=subprocess.STDOUT)
+		print 'Started %r, attempt %d' % (shard, shard.attempts)
+
+	# A shard is done when the worker exited cleanly AND wrote its marker:
+	# Blender itself exits with status 0 when the Python script fails
+	def Succeeded(self, shard):
+		return shard.process.returncode == 0 and os.path.isfile(shard.DoneFile())
+
+	def Finish(self, shard):
+		shard.log.close()
+		elapsed = time.time() - shard.started
+		if self.Succeeded(shard):
+			count = MergeShard(shard, self.output)
+			self.merged += count
+			shutil.rmtree(shard.staging)
+			print 'Finished %r: %d images in %.1fs%s' % (shard, count, elapsed, 
+				shard.predicted is not None and ' (predicted %.1fs)' % shard.predicted or '')
+			if shard.predicted is not None:
+				self.costs.append((shard.predicted, elapsed))
+			return True
+		print 'FAILED %r (exit status %s), see %s' % (shard, shard.process.returncode, shard.LogFile())
+		return False
+
+	# Run all shards with at most self.workers processes at a time
+	# RETURN: list of shards that failed after all retries
+	def Run(self, poll=0.2):
+		pending = list(self.shards)
+		running = []
+		self.failed = []
+		while pending or running:
+			while pending and len(running) < self.workers:
+				shard = pending.pop(0)
+				self.Start(shard)
+				running.append(shard)
+			time.sleep(poll)
+			for shard in list(running):
+				if shard.process.poll() is None:
+					continue
+				running.remove(shard)
+				if self.Finish(shard):
+					eta = self.ETA(pending, running)
+					if eta is not None:
+						print 'ETA %s' % stereoTrace.FormatDuration(eta)
+					continue
+				if shard.attempts <= self.retries:
+					pending.append(shard)
+				else:
+					self.failed.append(shard)
+		if not self.failed and os.path.isdir(self.stagingRoot) and not os.listdir(self.stagingRoot):
+			os.rmdir(self.stagingRoot)
+		# all workers are gone, so nobody else appends to the manifest now
+		manifest = stereoManifest.FrameManifest(self.output)
+		if manifest.records:
+			manifest.Compact()
+		return self.failed
+
+# Dispatcher of one render node of a --queue job: shards come from the shared
+# TaskQueue instead of a fixed list, and each node stages into its own directory
+class QueueDispatcher(Dispatcher):
+	##########################################
+	# Class Member Data ([Type] [name]):
+	#
+	# TaskQueue queue		// The shared task queue
+	# Dict tasks			// shard index -> queue task
+	##########################################
+
+	def __init__(self, runner, output, workers, retries=1, resume=False, node=None, 
+			lease=stereoQueue.DEFAULT_LEASE, costModel=None, options=None):
+		Dispatcher.__init__(self, runner, output, workers, retries, resume, costModel, options)
+		self.queue = stereoQueue.TaskQueue(output, node, lease, retries + 1)
+		self.stagingRoot = os.path.join(self.queue.root, 'work', self.queue.node)
+		self.tasks = {}
+
+	# Create the job's task list, or join the one another node created (its
+	# frames, cameras and worker options win). Tasks are claimed in list order, which is
+	# longest first when the cost model has data.
+	def AddShards(self, frames, cameras=None, chunkSize=None, splitCameras=False):
+		Dispatcher.AddShards(self, frames, cameras, chunkSize, splitCameras)
+		tasks = []
+		for shard in self.shards:
+			tasks.append({'id': 't%.5d' % shard.index, 'frames': shard.frames, 'cameras': shard.cameras,
+				'predicted': shard.predicted, 'options': shard.options})
+		if not self.queue.Create(tasks):
+			print 'Joining the queued job in %s as %s' % (self.queue.root, self.queue.node)
+		resumeFrom = self.resume and self.output or None
+		self.shards = []
+		for index, task in enumerate(self.queue.tasks):
+			shard = Shard(index, task['frames'], task['cameras'], self.stagingRoot, resumeFrom)
+			shard.predicted = task.get('predicted')
+			shard.costModel = self.costModel
+			shard.options = task.get('options', [])
+			self.shards.append(shard)
+			self.tasks[index] = task
+
+	# Merge under the queue's merge lock: other nodes merge into the same tree.
+	# A shard whose task another node has taken over meanwhile is dropped.
+	def Finish(self, shard):
+		task = self.tasks[shard.index]
+		shard.log.close()
+		elapsed = time.time() - shard.started
+		if not self.queue.Renew(task):
+			print 'Lost %r to another node, dropping it' % shard
+			shutil.rmtree(shard.staging, True)
+			return False
+		if not self.Succeeded(shard):
+			print 'FAILED %r (exit status %s), see %s' % (shard, shard.process.returncode, shard.LogFile())
+			self.queue.Release(task, 'exit status %s' % shard.process.returncode, elapsed)
+			return False
+		lock = self.queue.Lock('merge')
+		try:
+			count = MergeShard(shard, self.output, lambda: self.RenewMergeLock(lock))
+		finally:
+			self.queue.Unlock(lock)
+		self.merged += count
+		shutil.rmtree(shard.staging, True)
+		self.queue.Complete(task, count, elapsed)
+		print 'Finished %r: %d images in %.1fs' % (shard, count, elapsed)
+		return True
+
+	# Touch the merge lock every quarter lease while merging, so that other
+	# nodes do not take a long merge for one of a dead node
+	def RenewMergeLock(self, lock):
+		if not self.queue.RenewLock(lock, self.queue.lease / 4.):
+			print 'WARNING: another node took %s over while this one was merging' % lock
+
+	# Claim and run shards until every task of the job is done or failed,
+	# renewing the leases of the running ones
+	# RETURN: list of shards that failed on all attempts (on any node)
+	def Run(self, poll=0.2):
+		running = []
+		lastRenew = time.time()
+		while True:
+			while len(running) < self.workers:
+				task = self.queue.Claim()
+				if task is None:
+					break
+				shard = self.shards[self.queue.tasks.index(task)]
+				self.Start(shard)
+				running.append(shard)
+			if not running:
+				if self.queue.Finished():
+					break
+				# the rest is being rendered by other nodes; wait for them to
+				# finish or for their leases to expire
+				time.sleep(max(poll, min(self.queue.lease / 4., 5.)))
+				continue
+			time.sleep(poll)
+			if time.time() - lastRenew > self.queue.lease / 4.:
+				lastRenew = time.time()
+				for shard in list(running):
+					if not self.queue.Renew(self.tasks[shard.index]):
+						print 'Lost %r to another node, stopping it' % shard
+						shard.process.kill()
+						shard.process.wait()
+						shard.log.close()
+						shutil.rmtree(shard.staging, True)
+						running.remove(shard)
+			for shard in list(running):
+				if shard.process.poll() is None:
+					continue
+				running.remove(shard)
+				self.Finish(shard)
+		states = self.queue.States()
+		self.failed = [s for s in self.shards if states[self.tasks[s.index]['id']] == 'failed']
+		# staging left behind by dead nodes; their shards were rendered again.
+		# Nodes that still hold a lease or read the clock lately may be alive
+		# (e.g. one that was suspended) and keep theirs.
+		work = os.path.dirname(self.stagingRoot)
+		if os.path.isdir(work):
+			active = self.queue.ActiveNodes()
+			for node in os.listdir(work):
+				if node == self.queue.node:
+					shutil.rmtree(os.path.join(work, node), True)
+				elif node not in active:
+					print 'Removing the staging of %s' % node
+					shutil.rmtree(os.path.join(work, node), True)
+		# compact only under the merge lock, other nodes may still be merging
+		lock = self.queue.Lock('merge')
+		try:
+			manifest = stereoManifest.FrameManifest(self.output)
+			if manifest.records:
+				manifest.Compact()
+		finally:
+			self.queue.Unlock(lock)
+		return self.failed
+
+def main(argv):
+	if '--local-worker' in argv:
+		return LocalWorker(argv)
+
+	# options for the workers follow '--', as on the Blender command line
+	workerOptions = []
+	if '--' in argv:
+		workerOptions = argv[argv.index('--')+1:]
+		argv = argv[:argv.index('--')]
+	parser = optparse.OptionParser(usage="python stereoDispatch.py [options] file.blend [-- worker options]")
+	parser.add_option('--output', help="output root directory (required)")
+	parser.add_option('--frames', help="frames to render, e.g. '1-4000'")
+	parser.add_option('--cameras', default=None,
+		help="comma separated camera names (required for --split-cameras and --local)")
+	parser.add_option('--split-cameras', dest='splitCameras', action='store_true', default=False,
+		help="give every camera its own shards")
+	parser.add_option('--workers', type='int', default=2, help="number of parallel workers")
+	parser.add_option('--chunk', type='int', default=None, help="frames per shard")
+	parser.add_option('--retries', type='int', default=1, help="restarts of a failed shard")
+	parser.add_option('--resume', action='store_true', default=False,
+		help="skip images already completed in the output manifest")
+	parser.add_option('--blender', default='blender', help="Blender executable")
+	parser.add_option('--local', action='store_true', default=False,
+		help="use the stand-in worker instead of Blender")
+	parser.add_option('--local-seconds', dest='localSeconds', default='0',
+		help="simulated render time per image of the stand-in worker, e.g. 0.1 or Left=0.1,Right=0.3")
+	parser.add_option('--queue', action='store_true', default=False,
+		help="share the job with other nodes through the task queue in <output>/.queue")
+	parser.add_option('--node', default=None, help="name of this node in the queue (default: host-pid)")
+	parser.add_option('--lease', type='float', default=stereoQueue.DEFAULT_LEASE,
+		help="seconds after which the shards of a silent node are taken over (default: %.0f)"
+			% stereoQueue.DEFAULT_LEASE)
+	parser.add_option('--cost-model', dest='costModel', default=None, metavar='FILE',
+		help="render times of the shot (default: <blend>%s; none with --local)" % stereoCost.MODEL_EXT)
+	parser.add_option('--no-cost-model', dest='noCostModel', action='store_true', default=False,
+		help="neither predict nor record render times")
+	parser.add_option('--cost-sample', dest='costSample', type='int', default=0, metavar='N',
+		help="time N frames of every camera at low resolution before cutting the shards")
+	(options, args) = parser.parse_args(argv[1:])
+
+	if not options.output or not options.frames:
+		parser.error("--output and --frames are required")
+	for arg in workerOptions:
+		if arg.split('=', 1)[0] in WORKER_RESERVED:
+			parser.error("%s is set by the dispatcher, not passed through to the workers" % arg)
+	cameras = options.cameras and options.cameras.split(',') or None
+	if options.local:
+		if not cameras:
+			parser.error("--local needs --cameras")
+		runner = LocalRunner(cameras, options.localSeconds)
+	else:
+		if len(args) != 1:
+			parser.error("expected one .blend file")
+		runner = BlenderRunner(os.path.abspath(args[0]), options.blender)
+	costModel = options.costModel and os.path.abspath(options.costModel)
+	if not costModel and not options.local:
+		costModel = stereoCost.ModelPath(os.path.abspath(args[0]))
+	if options.noCostModel:
+		costModel = None
+	elif options.costSample > 0 and not costModel:
+		parser.error("--cost-sample needs --cost-model with --local")
+
+	if options.queue:
+		dispatcher = QueueDispatcher(runner, os.path.abspath(options.output), options.workers, 
+			options.retries, options.resume, options.node, options.lease, costModel, workerOptions)
+	else:
+		dispatcher = Dispatcher(runner, os.path.abspath(options.output), options.workers, options.retries,
+			options.resume, costModel, workerOptions)
+	frames = stereoLayout.ParseFrameSpec(options.frames)
+	# in a queued job, only the node that sets up the job samples
+	if costModel and options.costSample > 0 and not (options.queue and 
+			os.path.isfile(os.path.join(dispatcher.queue.root, 'job.json'))):
+		dispatcher.SampleCosts(frames, cameras, options.costSample)
+	dispatcher.AddShards(frames, cameras, options.chunk, options.splitCameras)
+	failed = dispatcher.Run()
+	print '%d of %d shards rendered, %d images merged into %s' % (len(dispatcher.shards) - len(failed),
+		len(dispatcher.shards), dispatcher.merged, dispatcher.output)
+	for shard in failed:
+		print 'FAILED: %r' % shard
+	if options.queue:
+		for line in dispatcher.queue.Report():
+			print line
+	return len(failed) and 1 or 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,353 @@
+# Image reading and writing for the stand-alone stereo tools (stereoComposite.py,
+# ...). Frames are handled as NumPy arrays of shape (height, width, 3), dtype
+# uint8, RGB. Decoding and encoding is done by PIL; both packages are needed
+# by the tools but not by StereoAnimator.py itself, which runs inside Blender.
+#
+# Uncompressed Targa ("Targa Raw" in Blender) and BMP files are also accessed
+# directly through numpy.memmap (RawImage), so that e.g. cropping streams the
+# pixel rows instead of decoding whole 4K/8K frames. ImageRows reads any image
+# a band of rows at a time (through the memmap where it can) and RowWriter
+# writes PNG, Targa and BMP files a band of rows at a time.
+#############################################################################################
+import os
+import struct
+import zlib
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+try:
+	from PIL import Image
+except ImportError:
+	try:
+		import Image
+	except ImportError:
+		Image = None
+
+# Fail early (and readably) if a tool is started without its dependencies
+def RequireImageSupport():
+	missing = []
+	if numpy is None:
+		missing.append('numpy')
+	if Image is None:
+		missing.append('PIL')
+	if missing:
+		raise ImportError("The stereo image tools need %s" % ' and '.join(missing))
+
+# RETURN: the RGB pixels of an image file as a (height, width, 3) uint8 array
+def ReadImage(path):
+	image = Image.open(path)
+	if image.mode != 'RGB':
+		image = image.convert('RGB')
+	return numpy.asarray(image, dtype=numpy.uint8)
+
+# RETURN: the pixels of an image file as a (height, width, bands) uint8 array 
+# and the PIL mode of the array: RGB, RGBA and L images are kept as they are,
+# everything else is converted to RGB
+def ReadImageBands(path):
+	image = Image.open(path)
+	if image.mode not in ('RGB', 'RGBA', 'L'):
+		image = image.convert('RGB')
+	pixels = numpy.asarray(image, dtype=numpy.uint8)
+	if pixels.ndim == 2:
+		pixels = pixels[:, :, numpy.newaxis]
+	return pixels, image.mode
+
+# Write a (height, width, 3) uint8 array (or bands of another PIL mode); the 
+# format follows the file extension
+def WriteImage(path, pixels, mode='RGB'):
+	directory = os.path.dirname(path)
+	if directory and not os.path.isdir(directory):
+		try:
+			os.makedirs(directory)
+		except OSError:
+			if not os.path.isdir(directory):
+				raise
+	# write under a temporary name so readers never see half an image
+	base, ext = os.path.splitext(path)
+	tmp = base + '.tmp' + ext
+	if mode == 'L' and pixels.ndim == 3:
+		pixels = pixels[:, :, 0]
+	Image.fromarray(numpy.ascontiguousarray(pixels), mode).save(tmp)
+	os.rename(tmp, path)
+
+# RETURN: (width, height) of an image file without decoding its pixels
+def ImageSize(path):
+	return Image.open(path).size
+
+# Layout of an uncompressed Targa or BMP file, for memory-mapped access
+class RawImage:
+	##########################################
+	# Class Member Data ([Type] [name]):
+	#
+	# String format			// 'tga' or 'bmp'
+	# String header			// Everything before the pixel rows
+	# Integer width, height	// Size in pixels
+	# Integer pixelBytes	// Bytes per pixel (1, 3 or 4)
+	# Integer stride		// Bytes per stored row (BMP rows are padded to 4 bytes)
+	# Integer offset		// File offset of the first stored row
+	# Boolean topDown		// The top row is stored first (else the bottom row)
+	##########################################
+
+	def __init__(self, format, header, width, height, pixelBytes, stride, offset, topDown=False):
+		self.format = format
+		self.header = header
+		self.width = width
+		self.height = height
+		self.pixelBytes = pixelBytes
+		self.stride = stride
+		self.offset = offset
+		self.topDown = topDown
+
+	# RETURN: the stored rows as a read-only (height, stride) uint8 memmap. Row
+	# order is as stored (bottom-up for most files), which does not matter for
+	# operations on columns.
+	def Map(self, path):
+		return numpy.memmap(path, numpy.uint8, 'r', self.offset, (self.height, self.stride))
+
+	# RETURN: the header of the same file with a different width
+	def HeaderForWidth(self, width):
+		header = self.header
+		if self.format == 'tga':
+			return header[:12] + struct.pack('<H', width) + header[14:]
+		stride = RowStride(width, self.pixelBytes, self.format)
+		size = stride * self.height
+		header = header[:2] + struct.pack('<I', len(header) + size) + header[6:]
+		header = header[:18] + struct.pack('<i', width) + header[22:]
+		return header[:34] + struct.pack('<I', size) + header[38:]
+
+# RETURN: bytes per stored row
+def RowStride(width, pixelBytes, format):
+	stride = width * pixelBytes
+	if format == 'bmp':
+		stride = (stride + 3) & ~3
+	return stride
+
+# RETURN: a RawImage if path is an uncompressed Targa or BMP, otherwise None
+def OpenRawImage(path):
+	f = open(path, 'rb')
+	head = f.read(54)
+	f.close()
+	if len(head) >= 18 and path.lower().endswith('.tga'):
+		idLength, mapType, imageType = struct.unpack('<BBB', head[:3])
+		width, height, bits = struct.unpack('<HHB', head[12:17])
+		if mapType != 0 or imageType not in (2, 3) or bits not in (8, 24, 32):
+			return None
+		offset = 18 + idLength
+		f = open(path, 'rb')
+		header = f.read(offset)
+		f.close()
+		descriptor = ord(head[17])
+		if descriptor & 0x10:
+			return None		# right to left
+		return RawImage('tga', header, width, height, bits // 8, width * (bits // 8), offset, 
+			bool(descriptor & 0x20))
+	if len(head) >= 54 and head[:2] == 'BM':
+		offset = struct.unpack('<I', head[10:14])[0]
+		headerSize, width, height, planes, bits, compression = struct.unpack('<IiiHHI', head[14:34])
+		if headerSize < 40 or height <= 0 or compression != 0 or bits not in (24, 32):
+			return None
+		f = open(path, 'rb')
+		header = f.read(offset)
+		f.close()
+		return RawImage('bmp', header, width, height, bits // 8, RowStride(width, bits // 8, 'bmp'), offset)
+	return None
+
+# Copy the pixel columns [x0, x1) of an image to dest. Uncompressed Targa/BMP
+# files are streamed through a memmap chunkRows rows at a time and written in
+# the same format; everything else is decoded with PIL.
+def CropColumns(path, dest, x0, x1, chunkRows=256):
+	raw = OpenRawImage(path)
+	directory = os.path.dirname(dest)
+	if directory and not os.path.isdir(directory):
+		try:
+			os.makedirs(directory)
+		except OSError:
+			if not os.path.isdir(directory):
+				raise
+	if raw is None:
+		image = Image.open(path)
+		width, height = image.size
+		base, ext = os.path.splitext(dest)
+		tmp = base + '.tmp' + ext
+		image.crop((x0, 0, x1, height)).save(tmp)
+		os.rename(tmp, dest)
+		return
+
+	rows = raw.Map(path)
+	width = x1 - x0
+	stride = RowStride(width, raw.pixelBytes, raw.format)
+	padding = stride - width * raw.pixelBytes
+	tmp = dest + '.tmp'
+	out = open(tmp, 'wb')
+	out.write(raw.HeaderForWidth(width))
+	for r0 in range(0, raw.height, chunkRows):
+		chunk = rows[r0:r0+chunkRows, x0*raw.pixelBytes:x1*raw.pixelBytes]
+		if padding:
+			chunk = numpy.hstack((chunk, numpy.zeros((chunk.shape[0], padding), numpy.uint8)))
+		out.write(numpy.ascontiguousarray(chunk).tostring())
+	out.close()
+	del rows
+	os.rename(tmp, dest)
+
+# Rows of an image, read a band at a time. Of uncompressed Targa and BMP files
+# only the rows of the band are read (plain reads rather than a memmap, whose
+# pages would stay resident until the whole frame is done); other formats are
+# decoded as a whole when they are opened.
+class ImageRows:
+	##########################################
+	# Class Member Data ([Type] [name]):
+	#
+	# Integer width, height	// Size in pixels
+	# RawImage raw			// Layout of an uncompressed file (None: decoded by PIL)
+	# File file				// The open uncompressed file
+	# Array pixels			// The decoded RGB pixels (PIL)
+	##########################################
+
+	def __init__(self, path):
+		self.raw = OpenRawImage(path)
+		self.file = None
+		self.pixels = None
+		if self.raw is None:
+			self.pixels = ReadImage(path)
+			[self.height, self.width] = self.pixels.shape[:2]
+		else:
+			self.file = open(path, 'rb')
+			[self.width, self.height] = [self.raw.width, self.raw.height]
+
+	# RETURN: rows [r0, r1) counted from the top as a (r1 - r0, width, 3) RGB 
+	# uint8 array
+	def Band(self, r0, r1):
+		raw = self.raw
+		if raw is None:
+			return self.pixels[r0:r1]
+		if raw.topDown:
+			first = r0
+		else:
+			first = raw.height - r1
+		self.file.seek(raw.offset + first * raw.stride)
+		rows = numpy.frombuffer(self.file.read((r1 - r0) * raw.stride), numpy.uint8).reshape(r1 - r0, raw.stride)
+		if not raw.topDown:
+			rows = rows[::-1]
+		rows = rows[:, :raw.width*raw.pixelBytes].reshape(r1 - r0, raw.width, raw.pixelBytes)
+		if raw.pixelBytes == 1:
+			return numpy.repeat(rows, 3, axis=2)
+		return numpy.ascontiguousarray(rows[:, :, 2::-1])	# BGR(A) -> RGB
+
+	def Close(self):
+		self.pixels = None
+		if self.file is not None:
+			self.file.close()
+			self.file = None
+
+# Write an RGB image a band of rows at a time, top row first. PNG, Targa and 
+# BMP files (by extension) are encoded as the rows come, so only a band is in
+# memory; other formats are collected and saved by PIL at Close. Readers only
+# see the file once it is complete.
+class RowWriter:
+	##########################################
+	# Class Member Data ([Type] [name]):
+	#
+	# String path			// The image file
+	# String tmp			// Temporary name while it is written
+	# String format			// 'png', 'tga', 'bmp' or None (PIL)
+	# Integer width, height	// Size in pixels
+	# Integer row			// Rows written so far
+	# File file				// The open temporary file (streamed formats)
+	# Object stream			// zlib compressor of the PNG rows
+	# Array previous		// Last row written (PNG Up filter)
+	# Array pixels			// The whole image (PIL formats)
+	##########################################
+
+	def __init__(self, path, width, height):
+		self.path = path
+		base, ext = os.path.splitext(path)
+		self.tmp = base + '.tmp' + ext
+		self.format = {'.png': 'png', '.tga': 'tga', '.bmp': 'bmp'}.get(ext.lower())
+		self.width = width
+		self.height = height
+		self.row = 0
+		self.file = None
+		self.pixels = None
+		directory = os.path.dirname(path)
+		if directory and not os.path.isdir(directory):
+			try:
+				os.makedirs(directory)
+			except OSError:
+				if not os.path.isdir(directory):
+					raise
+		if self.format is None:
+			self.pixels = numpy.empty((height, width, 3), numpy.uint8)
+			return
+		self.file = open(self.tmp, 'wb')
+		if self.format == 'png':
+			self.file.write('\x89PNG\r\n\x1a\n')
+			self.Chunk('IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+			self.stream = zlib.compressobj(6)
+			self.previous = numpy.zeros((1, width, 3), numpy.uint8)
+		elif self.format == 'tga':
+			# uncompressed true color, top row first
+			self.file.write(struct.pack('<BBBHHBHHHHBB', 0, 0, 2, 0, 0, 0, 0, 0, width, height, 24, 0x20))
+		else:
+			stride = RowStride(width, 3, 'bmp')
+			self.file.write(struct.pack('<2sIHHIIiiHHIIiiII', 'BM', 54 + stride * height, 0, 0, 54, 40,
+				width, height, 1, 24, 0, stride * height, 2835, 2835, 0, 0))
+			self.file.truncate(54 + stride * height)
+
+	# Write one PNG chunk
+	def Chunk(self, kind, data):
+		self.file.write(struct.pack('>I', len(data)) + kind + data + 
+			struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+	# Write the next rows, a (rows, width, 3) uint8 array
+	def Write(self, rows):
+		count = rows.shape[0]
+		if self.format is None:
+			self.pixels[self.row:self.row+count] = rows
+		elif self.format == 'png':
+			# every row with the Up filter: the difference to the row above
+			lines = numpy.empty((count, 1 + self.width * 3), numpy.uint8)
+			lines[:, 0] = 2
+			above = numpy.concatenate((self.previous, rows[:-1]))
+			lines[:, 1:] = (rows - above).reshape(count, self.width * 3)
+			self.previous = rows[-1:].copy()
+			data = self.stream.compress(lines.tostring())
+			if data:
+				self.Chunk('IDAT', data)
+		elif self.format == 'tga':
+			self.file.write(numpy.ascontiguousarray(rows[:, :, ::-1]).tostring())
+		else:
+			# BMP rows are stored bottom up: the band goes before the rows above it
+			stride = RowStride(self.width, 3, 'bmp')
+			lines = numpy.zeros((count, stride), numpy.uint8)
+			lines[:, :self.width*3] = rows[::-1, :, ::-1].reshape(count, self.width * 3)
+			self.file.seek(54 + (self.height - self.row - count) * stride)
+			self.file.write(lines.tostring())
+		self.row += count
+
+	# Finish the file and give it its name
+	def Close(self):
+		if self.row != self.height:
+			self.Abort()
+			raise ValueError("%s: %d of %d rows written" % (self.path, self.row, self.height))
+		if self.format is None:
+			Image.fromarray(self.pixels, 'RGB').save(self.tmp)
+			self.pixels = None
+		else:
+			if self.format == 'png':
+				self.Chunk('IDAT', self.stream.flush())
+				self.Chunk('IEND', '')
+			self.file.close()
+			self.file = None
+		os.rename(self.tmp, self.path)
+
+	# Give up the file
+	def Abort(self):
+		self.pixels = None
+		if self.file is not None:
+			self.file.close()
+			self.file = None
+		if os.path.exists(self.tmp):
+			os.remove(self.tmp)
@@ -0,0 +1,210 @@
+# Helpers shared by StereoAnimator.py and the stand-alone tools that work on
+# its output. Nothing in here imports Blender, so the tools can run with a
+# plain Python interpreter.
+#
+# Output layout written by StereoAnimator.RenderFrame:
+#	<output>/<Camera>/<Camera>_SLEFT/<Camera>_SLEFT_0001[.ext]
+#	<output>/<Camera>/<Camera>_SRIGHT/<Camera>_SRIGHT_0001[.ext]
+#	<output>/<Camera>/<Camera>_SV01/<Camera>_SV01_0001[.ext]	(N-view rigs, left to right)
+#	<output>/<Camera>/stereo_crop.json			(convergence crop, see stereoCrop.py)
+#	<output>/<Camera>/<Camera>_SDELTA/<Camera>_SDELTA_0001.sdelta	(right eye stored as a
+#												residual against the left, see stereoDelta.py)
+#	<output>/preview/<Camera>/...				(low resolution previews, same layout)
+#############################################################################################
+import glob
+import os
+import shutil
+
+try:
+	import json
+except ImportError:
+	import simplejson as json
+
+EYE_SUFFIXES = ['_SLEFT', '_SRIGHT']
+VIEW_PREFIX = '_SV'
+DELTA_SUFFIX = '_SDELTA'
+
+CROP_NAME = 'stereo_crop.json'
+PREVIEW_DIR = 'preview'
+
+# Name suffixes of the cameras of a rig with the given number of views, left 
+# to right: _SLEFT/_SRIGHT for stereo, _SV01 ... _SVnn otherwise
+def ViewSuffixes(views):
+	if views == 2:
+		return list(EYE_SUFFIXES)
+	return ['%s%.2d' % (VIEW_PREFIX, i+1) for i in range(views)]
+
+# RETURN: the view suffix a camera or sequence name ends with, or None
+def ViewSuffix(name):
+	for suffix in EYE_SUFFIXES:
+		if name.endswith(suffix):
+			return suffix
+	suffix = name[-len(VIEW_PREFIX)-2:]
+	if len(name) > len(suffix) and suffix.startswith(VIEW_PREFIX) and suffix[-2:].isdigit():
+		return suffix
+	return None
+
+# Parse a frame specification such as "1-100,120,200-250" into a sorted list
+# of unique frame numbers
+# RETURN: list of frames
+def ParseFrameSpec(spec):
+	frames = {}
+	for part in spec.split(','):
+		part = part.strip()
+		if not part:
+			continue
+		if '-' in part[1:]:
+			# allow a leading minus sign on the first number
+			split = part.index('-', 1)
+			first, last = int(part[:split]), int(part[split+1:])
+			if last < first:
+				raise ValueError("Bad frame range '%s'" % part)
+			for f in range(first, last+1):
+				frames[f] = True
+		else:
+			frames[int(part)] = True
+	frames = frames.keys()
+	frames.sort()
+	return frames
+
+# Inverse of ParseFrameSpec: collapse runs of consecutive frames
+# RETURN: frame specification string
+def FormatFrameSpec(frames):
+	frames = sorted(frames)
+	runs = []
+	for f in frames:
+		if runs and runs[-1][1] == f - 1:
+			runs[-1][1] = f
+		else:
+			runs.append([f, f])
+	return ','.join([(a == b and '%d' % a) or '%d-%d' % (a, b) for a, b in runs])
+
+# Split a list of frames into contiguous chunks of at most chunkSize frames
+# RETURN: list of frame lists
+def SplitFrames(frames, chunkSize):
+	chunkSize = max(1, int(chunkSize))
+	return [frames[i:i+chunkSize] for i in range(0, len(frames), chunkSize)]
+
+# Frame number as it appears in output file names
+def FrameString(frame):
+	return '%.4d' % frame
+
+# Render path prefix for one stereo camera; RenderFrame hands this to
+# setRenderPath and Blender appends the frame string (and extension)
+def FramePrefix(output, origName, stereoName):
+	return '%s/%s/%s/%s_' % (output, origName, stereoName, stereoName)
+
+# Find the file written for a frame, with or without an image extension
+# RETURN: path or None
+def FindFrameFile(prefix, frame):
+	base = prefix + FrameString(frame)
+	if os.path.isfile(base):
+		return base
+	matches = glob.glob(base + '.*')
+	matches.sort()
+	for m in matches:
+		if os.path.isfile(m):
+			return m
+	return None
+
+# Scan the sequence of one stereo camera, whatever its frame numbering and
+# image extension
+# RETURN: dictionary frame -> path
+def ListFrameFiles(output, origName, stereoName):
+	directory = os.path.dirname(FramePrefix(output, origName, stereoName))
+	start = stereoName + '_'
+	files = {}
+	if not os.path.isdir(directory):
+		return files
+	for name in os.listdir(directory):
+		if not name.startswith(start) or '.tmp' in name:
+			continue
+		digits = name[len(start):].split('.', 1)[0]
+		if digits.isdigit() and not files.has_key(int(digits)):
+			files[int(digits)] = os.path.join(directory, name)
+	return files
+
+# RETURN: the view suffixes of the sequences of a camera below output, left
+# to right (EYE_SUFFIXES for a stereo rig)
+def ListViews(output, camera):
+	directory = os.path.join(output, camera)
+	if not os.path.isdir(directory):
+		return []
+	views = []
+	for name in os.listdir(directory):
+		suffix = ViewSuffix(name)
+		if suffix and name == camera + suffix and os.path.isdir(os.path.join(directory, name)):
+			views.append(suffix)
+	views.sort(key=lambda v: v in EYE_SUFFIXES and (0, EYE_SUFFIXES.index(v)) or (1, v))
+	return views
+
+# RETURN: names of the cameras with a stereo (or N-view) sequence below output
+def ListCameras(output):
+	cams = []
+	if not os.path.isdir(output):
+		return cams
+	for name in sorted(os.listdir(output)):
+		if ListViews(output, name):
+			cams.append(name)
+	return cams
+
+# Create a directory (and its parents) if it does not exist yet
+def MakeDirs(path):
+	if not os.path.isdir(path):
+		try:
+			os.makedirs(path)
+		except OSError:
+			# another process may have created it in the meantime
+			if not os.path.isdir(path):
+				raise
+
+# Put the image src at dest as well: as a hard link where the filesystem
+# allows it, otherwise as a copy (for frames that did not change)
+# RETURN: 'link' or 'copy'
+def LinkOrCopy(src, dest):
+	tmp = dest + '.tmp'
+	if os.path.exists(tmp):
+		os.remove(tmp)
+	try:
+		os.link(src, tmp)
+		how = 'link'
+	except (OSError, AttributeError):
+		shutil.copy2(src, tmp)
+		how = 'copy'
+	os.rename(tmp, dest)
+	return how
+
+# Remove path if it is hard linked to other frames, so that writing a new
+# image there does not overwrite those as well
+def BreakLink(path):
+	if path is not None and os.path.isfile(path) and os.stat(path).st_nlink > 1:
+		os.remove(path)
+
+# Write the convergence crop of a camera (a dictionary with at least 'box')
+def WriteCropInfo(output, origName, info):
+	directory = os.path.join(output, origName)
+	MakeDirs(directory)
+	path = os.path.join(directory, CROP_NAME)
+	f = open(path + '.tmp', 'w')
+	f.write(json.dumps(info, indent=1, sort_keys=True) + '\n')
+	f.close()
+	os.rename(path + '.tmp', path)
+
+# RETURN: the convergence crop written by WriteCropInfo, or None
+def ReadCropInfo(output, origName):
+	path = os.path.join(output, origName, CROP_NAME)
+	if not os.path.isfile(path):
+		return None
+	f = open(path)
+	try:
+		return json.loads(f.read())
+	finally:
+		f.close()
+
+# Shards of a parallel render each see only some frames; the crop of the whole
+# sequence is the one with the largest margin
+# RETURN: the crop info to keep
+def MergeCropInfo(a, b):
+	if a is None or b['margin'] > a['margin']:
+		return b
+	return a
@@ -0,0 +1,179 @@
+# On-disk manifest of the images a stereo render has completed, so that an
+# interrupted render can be resumed without redoing finished frames.
+#
+# The manifest lives in <output>/stereo_manifest.jsonl and is an append-only
+# journal with one record per saved image:
+#	<crc32> {"frame": 12, "eye": "_SLEFT", "camera": "Camera", "path": ..., "size": ..., "rig": ...}
+# Each record is written with a single write() on an O_APPEND descriptor and
+# fsync'ed, so a crash leaves at most one torn line at the end of the file; the
+# next Append ends it. Torn or corrupt lines fail their checksum and are
+# ignored when the manifest is read.
+# Paths are relative to the output root, so a manifest can be moved with its tree.
+# Images packed into a camera archive (stereoArchive.py) are recorded with the
+# archive as path, the length of the image as size and "archive": true.
+#############################################################################################
+import os
+import zlib
+
+import stereoArchive
+
+try:
+	import json
+except ImportError:
+	import simplejson as json
+
+MANIFEST_NAME = 'stereo_manifest.jsonl'
+
+class FrameManifest:
+	##########################################
+	# Class Member Data ([Type] [name]):
+	#
+	# String root			// Output root the manifest describes
+	# String path			// The journal file
+	# Dict records			// (frame, eye, camera) -> latest record
+	# List references		// Read-only manifests of other output roots that
+	#							also count as complete (e.g. the final tree of
+	#							a sharded render)
+	# Dict archives			// archive path -> StereoArchive opened for Lookup
+	##########################################
+
+	def __init__(self, root, references=None):
+		self.root = root
+		self.path = os.path.join(root, MANIFEST_NAME)
+		self.records = {}
+		self.references = []
+		self.archives = {}
+		for ref in references or []:
+			self.references.append(FrameManifest(ref))
+		self.Load()
+
+	def Key(self, frame, eye, camera):
+		return (int(frame), eye, camera)
+
+	# Read the journal, keeping the last valid record for every image
+	def Load(self):
+		self.records = {}
+		if not os.path.isfile(self.path):
+			return
+		f = open(self.path, 'rb')
+		for line in f:
+			record = DecodeRecord(line)
+			if record is not None:
+				self.records[self.Key(record['frame'], record['eye'], record['camera'])] = record
+		f.close()
+
+	# RETURN: absolute path of a record's image
+	def AbsolutePath(self, record):
+		return os.path.join(self.root, record['path'])
+
+	# An image is complete if it was recorded with the same rig parameters and
+	# the file on disk still has the recorded size. Files that were only partly
+	# written never got a record (or have the wrong size) and are rendered again.
+	# RETURN: the matching record or None
+	def Lookup(self, frame, eye, camera, rigHash):
+		record = self.records.get(self.Key(frame, eye, camera))
+		if record is not None and record['rig'] == rigHash:
+			path = self.AbsolutePath(record)
+			if record.get('archive'):
+				if self.ArchivedSize(path, frame, eye) == record['size']:
+					return record
+			elif os.path.isfile(path) and os.path.getsize(path) == record['size']:
+				return record
+		for ref in self.references:
+			record = ref.Lookup(frame, eye, camera, rigHash)
+			if record is not None:
+				return record
+		return None
+
+	# RETURN: the length of an image in an archive, or None if it is not there
+	def ArchivedSize(self, path, frame, eye):
+		if not os.path.isfile(path):
+			return None
+		archive = self.archives.get(path)
+		# an archive that grew was replaced by a new file
+		if archive is None or os.fstat(archive.file.fileno()).st_ino != os.stat(path).st_ino:
+			if archive is not None:
+				archive.Close()
+			self.archives[path] = stereoArchive.StereoArchive(path)
+		entry = self.archives[path].Entry(int(frame), eye)
+		return entry and entry[1]
+
+	def IsComplete(self, frame, eye, camera, rigHash):
+		return self.Lookup(frame, eye, camera, rigHash) is not None
+
+	# Record a saved image. Call this only after the image is completely written.
+	def Record(self, frame, eye, camera, path, rigHash):
+		record = {'frame': int(frame), 'eye': eye, 'camera': camera,
+			'path': os.path.relpath(path, self.root),
+			'size': os.path.getsize(path), 'rig': rigHash}
+		self.Append([record])
+		return record
+
+	# Record an image appended to a camera archive (see stereoArchive.py)
+	def RecordArchived(self, frame, eye, camera, archive, rigHash):
+		record = {'frame': int(frame), 'eye': eye, 'camera': camera,
+			'path': os.path.relpath(archive.path, self.root),
+			'size': archive.Entry(frame, eye)[1], 'rig': rigHash, 'archive': True}
+		self.Append([record])
+		return record
+
+	# Append records to the journal, one write() per record. A line torn by
+	# a crash is ended first, so the next record does not continue it.
+	def Append(self, records):
+		if not os.path.isdir(self.root):
+			os.makedirs(self.root)
+		fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0644)
+		try:
+			size = os.fstat(fd).st_size
+			if size:
+				os.lseek(fd, size - 1, 0)
+				if os.read(fd, 1) != '\n':
+					os.write(fd, '\n')
+			for record in records:
+				os.write(fd, EncodeRecord(record))
+				self.records[self.Key(record['frame'], record['eye'], record['camera'])] = record
+			os.fsync(fd)
+		finally:
+			os.close(fd)
+
+	# Take over the records of a manifest whose files were moved below our
+	# root with the same relative paths (see stereoDispatch.MergeShard)
+	def Merge(self, other):
+		records = other.records.values()
+		records.sort(key=lambda r: (r['frame'], r['camera'], r['eye']))
+		if records:
+			self.Append(records)
+
+	# Rewrite the journal with only the latest record per image. The new file
+	# replaces the old one with an atomic rename.
+	def Compact(self):
+		tmp = self.path + '.tmp'
+		f = open(tmp, 'wb')
+		keys = self.records.keys()
+		keys.sort()
+		for key in keys:
+			f.write(EncodeRecord(self.records[key]))
+		f.flush()
+		os.fsync(f.fileno())
+		f.close()
+		os.rename(tmp, self.path)
+
+# RETURN: one journal line for a record
+def EncodeRecord(record):
+	data = json.dumps(record, sort_keys=True)
+	return '%08x %s\n' % (zlib.crc32(data) & 0xffffffff, data)
+
+# RETURN: the record stored in a journal line, or None if the line is damaged
+def DecodeRecord(line):
+	if not line.endswith('\n'):
+		return None
+	line = line.rstrip('\n')
+	parts = line.split(' ', 1)
+	if len(parts) != 2:
+		return None
+	try:
+		if int(parts[0], 16) != zlib.crc32(parts[1]) & 0xffffffff:
+			return None
+		return json.loads(parts[1])
+	except ValueError:
+		return None
@@ -0,0 +1,168 @@
+# Combine the views of an N-view rig (StereoAnimator.py -- --views N) into the
+# frame format of an autostereoscopic display:
+#
+#	mosaic		the views as tiles of a grid (--grid COLSxROWS), view 1 at the
+#				bottom left, filling rows left to right, bottom to top (the
+#				"quilt" layout of most lenticular displays)
+#	interleave	lenticular subpixel interleaving at the render resolution:
+#				subpixel c (0-2) of pixel (x, y) comes from view
+#					floor(((3x + c + slant*y + offset) mod pitch) * N / pitch)
+#				with the lens pitch and slant measured in subpixels
+#
+# Output goes to <output>/<Camera>/<MODE>/<MODE>_<frame>.<format>, like
+# stereoComposite.py. The views of a frame are read one at a time and copied
+# into the output, so only one view is decoded at any time.
+#
+# To use:
+#	python stereoMosaic.py --mode mosaic --grid 4x2 --workers 8 /tmp
+#	python stereoMosaic.py --mode interleave --pitch 8 --slant 1 /tmp
+#############################################################################################
+import math
+import multiprocessing
+import optparse
+import sys
+
+import stereoComposite
+import stereoImageIO
+import stereoLayout
+from stereoImageIO import numpy
+
+MODES = ['mosaic', 'interleave']
+
+# RETURN: (columns, rows) of the most square grid that holds views tiles
+def DefaultGrid(views):
+	columns = int(math.ceil(math.sqrt(views)))
+	return columns, int(math.ceil(views / float(columns)))
+
+# RETURN: (x, y) of the top left corner of a view's tile in the mosaic
+def TileOrigin(view, grid, width, height):
+	columns, rows = grid
+	return (view % columns) * width, (rows - 1 - view // columns) * height
+
+# RETURN: (height, width, 3) uint8 array of the view each subpixel comes from
+def InterleaveMap(width, height, views, pitch, slant=0., offset=0.):
+	x = numpy.arange(width, dtype=numpy.float64).reshape(1, width, 1)
+	y = numpy.arange(height, dtype=numpy.float64).reshape(height, 1, 1)
+	c = numpy.arange(3, dtype=numpy.float64).reshape(1, 1, 3)
+	phase = numpy.mod(3*x + c + slant*y + offset, pitch)
+	return numpy.minimum(numpy.floor(phase * views / pitch), views - 1).astype(numpy.uint8)
+
+# Build the mosaic of one frame, reading the views one after the other
+def Mosaic(paths, grid):
+	out = None
+	for view, path in enumerate(paths):
+		pixels = stereoImageIO.ReadImage(path)
+		height, width = pixels.shape[:2]
+		if out is None:
+			out = numpy.zeros((grid[1]*height, grid[0]*width, 3), numpy.uint8)
+		x, y = TileOrigin(view, grid, width, height)
+		out[y:y+height, x:x+width] = pixels
+	return out
+
+# Interleave one frame, reading the views one after the other
+def Interleave(paths, pitch, slant=0., offset=0.):
+	out = None
+	for view, path in enumerate(paths):
+		pixels = stereoImageIO.ReadImage(path)
+		if out is None:
+			height, width = pixels.shape[:2]
+			out = numpy.zeros((height, width, 3), numpy.uint8)
+			viewMap = InterleaveMap(width, height, len(paths), pitch, slant, offset)
+		mask = viewMap == view
+		out[mask] = pixels[mask]
+	return out
+
+def _MosaicFrame(task):
+	(paths, mode, target, settings) = task
+	if mode == 'mosaic':
+		out = Mosaic(paths, settings['grid'])
+	else:
+		out = Interleave(paths, settings['pitch'], settings['slant'], settings['offset'])
+	stereoImageIO.WriteImage(target, out)
+	return 1
+
+# RETURN: list of tasks (view paths, mode, target, settings), one per frame
+# that has all views
+def FrameTasks(output, camera, mode, format, settings, frames=None):
+	views = stereoLayout.ListViews(output, camera)
+	sequences = [stereoLayout.ListFrameFiles(output, camera, camera + v) for v in views]
+	tasks = []
+	if len(views) < 2:
+		return tasks
+	for frame in sorted(sequences[0].keys()):
+		if frames is not None and frame not in frames:
+			continue
+		missing = [v for v, files in zip(views, sequences) if not files.has_key(frame)]
+		if missing:
+			print 'Skipping %s frame %d: no %s image' % (camera, frame, ', '.join(missing))
+			continue
+		paths = [files[frame] for files in sequences]
+		target = stereoComposite.OutputPath(output, camera, mode, frame, format)
+		tasks.append((paths, mode, target, settings))
+	return tasks
+
+# Combine all frames of the given cameras with a pool of worker processes
+# RETURN: number of images written
+def MosaicSequences(output, cameras, mode, settings, format='png', frames=None, workers=None):
+	tasks = []
+	for camera in cameras:
+		cameraSettings = dict(settings)
+		if mode == 'mosaic' and cameraSettings.get('grid') is None:
+			cameraSettings['grid'] = DefaultGrid(len(stereoLayout.ListViews(output, camera)))
+		if mode == 'interleave' and cameraSettings.get('pitch') is None:
+			cameraSettings['pitch'] = float(len(stereoLayout.ListViews(output, camera)))
+		tasks += FrameTasks(output, camera, mode, format, cameraSettings, frames)
+	if not tasks:
+		return 0
+	if workers == 1:
+		return sum(map(_MosaicFrame, tasks))
+	pool = multiprocessing.Pool(workers)
+	try:
+		written = 0
+		for count in pool.imap_unordered(_MosaicFrame, tasks):
+			written += count
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	pool.join()
+	return written
+
+def main(argv):
+	parser = optparse.OptionParser(usage="python stereoMosaic.py [options] output_root")
+	parser.add_option('--mode', default='mosaic', help="%s (default: mosaic)" % ' or '.join(MODES))
+	parser.add_option('--grid', default=None, help="mosaic columns x rows, e.g. 4x2 (default: most square)")
+	parser.add_option('--pitch', type='float', default=None,
+		help="interleave: lens pitch in subpixels (default: the number of views)")
+	parser.add_option('--slant', type='float', default=0., help="interleave: subpixels of lens shift per row")
+	parser.add_option('--offset', type='float', default=0., help="interleave: subpixel offset of the first lens")
+	parser.add_option('--cameras', default=None, help="comma separated camera names (default: all)")
+	parser.add_option('--frames', default=None, help="frames to combine, e.g. '1-100'")
+	parser.add_option('--format', default='png', help="output image format/extension (default: png)")
+	parser.add_option('--workers', type='int', default=None, help="worker processes (default: one per core)")
+	(options, args) = parser.parse_args(argv[1:])
+	if len(args) != 1:
+		parser.error("expected the output root directory")
+	if options.mode not in MODES:
+		parser.error("unknown mode '%s'" % options.mode)
+	grid = None
+	if options.grid:
+		try:
+			grid = tuple([int(n) for n in options.grid.lower().split('x')])
+		except ValueError:
+			grid = ()
+		if len(grid) != 2:
+			parser.error("--grid must look like 4x2")
+	stereoImageIO.RequireImageSupport()
+
+	output = args[0]
+	cameras = options.cameras and options.cameras.split(',') or stereoLayout.ListCameras(output)
+	frames = options.frames and stereoLayout.ParseFrameSpec(options.frames) or None
+	settings = {'grid': grid, 'pitch': options.pitch, 'slant': options.slant, 'offset': options.offset}
+	written = MosaicSequences(output, cameras, options.mode, settings, options.format,
+		frames and set(frames), options.workers)
+	print 'Wrote %d images for %s' % (written, ', '.join(cameras))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
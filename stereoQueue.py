@@ -0,0 +1,369 @@
+# Task queue for render nodes sharing one output directory (stereoDispatch.py
+# --queue). Every node runs its own dispatcher; instead of a fixed shard list
+# the dispatchers claim tasks - a chunk of frames, optionally of one camera -
+# from <output>/.queue, which only needs a shared filesystem (NFS included):
+#
+#	job.json				the task list, written once by the first node
+#	leases/<task>.<gen>		claim number gen of a task. Created with O_EXCL, so
+#							only one node wins a generation; the holder touches
+#							it while rendering (Renew)
+#	done/<task>.json		written by the node that finished and merged the task
+#	failures/<task>			one line per failed attempt
+#	nodes/<node>.json		throughput of each node (Report)
+#	clock/<node>			touched to read the file server's clock
+#	work/<node>				staging of the shards a node renders (stereoDispatch.py)
+#
+# A lease whose file was not touched for lease seconds (file server time, so
+# node clocks do not matter) belongs to a dead node: the next claimer creates
+# the following generation, and the old holder sees that at its next Renew and
+# gives the task up. Merging into the output tree is serialized with a lock
+# file, as appends to one file from several NFS clients are not atomic.
+#
+# To see how a job is doing (reads the queue only):
+#	python stereoQueue.py /shared/shot
+#############################################################################################
+import os
+import socket
+import sys
+import time
+
+try:
+	import json
+except ImportError:
+	import simplejson as json
+
+import stereoLayout
+
+QUEUE_DIR = '.queue'
+DEFAULT_LEASE = 120.
+
+# RETURN: a node name that is unique on the shared filesystem
+def DefaultNodeName():
+	return '%s-%d' % (socket.gethostname().split('.')[0], os.getpid())
+
+# Write data to path only if path does not exist yet (link is atomic, also on NFS)
+# RETURN: True if this call created path
+def CreateOnce(path, data):
+	tmp = '%s.%s.tmp' % (path, DefaultNodeName())
+	f = open(tmp, 'w')
+	f.write(data)
+	f.close()
+	try:
+		try:
+			os.link(tmp, path)
+			return True
+		except OSError:
+			return False
+	finally:
+		os.remove(tmp)
+
+# Replace path with data (temporary file and rename)
+def WriteFile(path, data):
+	tmp = '%s.tmp' % path
+	f = open(tmp, 'w')
+	f.write(data)
+	f.close()
+	os.rename(tmp, path)
+
+def ReadJson(path):
+	f = open(path)
+	try:
+		return json.load(f)
+	finally:
+		f.close()
+
+class TaskQueue:
+	##########################################
+	# Class Member Data ([Type] [name]):
+	#
+	# String root			// The queue directory (<output>/.queue)
+	# String node			// Name of this node
+	# Float lease			// Seconds without Renew after which a lease is expired
+	# Integer attempts		// Failed attempts after which a task is given up
+	# List tasks			// {'id', 'frames', 'cameras'} of the job (Create/Load)
+	# Dict held				// task id -> generation of the leases this node holds
+	# Dict stats			// This node's throughput (nodes/<node>.json)
+	# Dict locks			// lock file -> local time this node last touched it
+	# Boolean readOnly		// Only look at the queue (Report): nothing is created
+	#							and the local clock is used
+	##########################################
+
+	def __init__(self, output, node=None, lease=DEFAULT_LEASE, attempts=2, readOnly=False):
+		self.root = os.path.join(output, QUEUE_DIR)
+		self.node = node or DefaultNodeName()
+		self.lease = lease
+		self.attempts = attempts
+		self.readOnly = readOnly
+		self.tasks = []
+		self.held = {}
+		self.locks = {}
+		if not readOnly:
+			for name in ['leases', 'done', 'failures', 'nodes', 'clock']:
+				stereoLayout.MakeDirs(os.path.join(self.root, name))
+		self.stats = {'node': self.node, 'host': socket.gethostname(), 'tasks': 0, 'images': 0,
+			'failed': 0, 'reclaimed': 0, 'lost': 0, 'seconds': 0., 'started': self.Now()}
+
+	# Set up the job, or join the job another node set up
+	# RETURN: True if this node created the job
+	def Create(self, tasks):
+		created = CreateOnce(os.path.join(self.root, 'job.json'), json.dumps({'tasks': tasks}))
+		self.Load()
+		return created
+
+	def Load(self):
+		self.tasks = ReadJson(os.path.join(self.root, 'job.json'))['tasks']
+
+	# RETURN: the current time of the file server (of this host if read only)
+	def Now(self):
+		if self.readOnly:
+			return time.time()
+		path = os.path.join(self.root, 'clock', self.node)
+		open(path, 'a').close()
+		os.utime(path, None)
+		return os.stat(path).st_mtime
+
+	def DonePath(self, task):
+		return os.path.join(self.root, 'done', task['id'] + '.json')
+
+	def LeasePath(self, task, generation):
+		return os.path.join(self.root, 'leases', '%s.%d' % (task['id'], generation))
+
+	# RETURN: task id -> generations of its lease files
+	def Leases(self):
+		leases = {}
+		for name in os.listdir(os.path.join(self.root, 'leases')):
+			[task, generation] = name.rsplit('.', 1)
+			if generation.isdigit():
+				leases.setdefault(task, []).append(int(generation))
+		return leases
+
+	# RETURN: number of failed attempts of a task
+	def Failures(self, task):
+		path = os.path.join(self.root, 'failures', task['id'])
+		if not os.path.isfile(path):
+			return 0
+		f = open(path)
+		count = len(f.readlines())
+		f.close()
+		return count
+
+	# RETURN: 'done', 'failed', 'leased' or 'pending' for every task, by id
+	def States(self, now=None):
+		now = now or self.Now()
+		leases = self.Leases()
+		states = {}
+		for task in self.tasks:
+			if os.path.isfile(self.DonePath(task)):
+				states[task['id']] = 'done'
+			elif self.Failures(task) >= self.attempts:
+				states[task['id']] = 'failed'
+			elif leases.has_key(task['id']) and not self.Expired(task, max(leases[task['id']]), now):
+				states[task['id']] = 'leased'
+			else:
+				states[task['id']] = 'pending'
+		return states
+
+	# RETURN: True if a lease was not renewed for self.lease seconds
+	def Expired(self, task, generation, now):
+		try:
+			return now - os.stat(self.LeasePath(task, generation)).st_mtime > self.lease
+		except OSError:
+			return True
+
+	# RETURN: names of the nodes that hold a lease that has not expired or
+	# read the clock within the last lease seconds; their staging is in use
+	def ActiveNodes(self, now=None):
+		now = now or self.Now()
+		active = set()
+		for task, generations in self.Leases().items():
+			path = self.LeasePath({'id': task}, max(generations))
+			try:
+				if now - os.stat(path).st_mtime <= self.lease:
+					active.add(ReadJson(path)['node'])
+			except (OSError, IOError, ValueError):
+				pass		# completed, or still being written by its claimer
+		directory = os.path.join(self.root, 'clock')
+		for node in os.listdir(directory):
+			try:
+				if now - os.stat(os.path.join(directory, node)).st_mtime <= self.lease:
+					active.add(node)
+			except OSError:
+				pass
+		return active
+
+	# Claim the first pending task, taking over expired leases of other nodes
+	# RETURN: the task, or None if no task is pending right now
+	def Claim(self):
+		now = self.Now()
+		leases = self.Leases()
+		for task in self.tasks:
+			if self.held.has_key(task['id']) or os.path.isfile(self.DonePath(task)):
+				continue
+			if self.Failures(task) >= self.attempts:
+				continue
+			generation = 0
+			if leases.has_key(task['id']):
+				last = max(leases[task['id']])
+				if not self.Expired(task, last, now):
+					continue
+				generation = last + 1
+			try:
+				fd = os.open(self.LeasePath(task, generation), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0644)
+			except OSError:
+				continue		# another node was faster
+			os.write(fd, json.dumps({'node': self.node, 'pid': os.getpid()}))
+			os.close(fd)
+			if os.path.isfile(self.DonePath(task)):
+				# finished while we looked at it
+				os.remove(self.LeasePath(task, generation))
+				continue
+			if generation > 0:
+				self.stats['reclaimed'] += 1
+			self.held[task['id']] = generation
+			return task
+		return None
+
+	# Keep a held lease alive
+	# RETURN: False if another node has taken the task over (give it up)
+	def Renew(self, task):
+		generation = self.held[task['id']]
+		if max(self.Leases().get(task['id'], [generation])) > generation:
+			self.Lost(task)
+			return False
+		try:
+			os.utime(self.LeasePath(task, generation), None)
+		except OSError:
+			self.Lost(task)
+			return False
+		return True
+
+	def Lost(self, task):
+		del self.held[task['id']]
+		self.stats['lost'] += 1
+
+	# Mark a held task done and remove its leases
+	def Complete(self, task, images, seconds):
+		generation = self.held.pop(task['id'])
+		record = {'node': self.node, 'images': images, 'seconds': seconds, 'generation': generation}
+		CreateOnce(self.DonePath(task), json.dumps(record))
+		for other in self.Leases().get(task['id'], []):
+			try:
+				os.remove(self.LeasePath(task, other))
+			except OSError:
+				pass
+		self.stats['tasks'] += 1
+		self.stats['images'] += images
+		self.stats['seconds'] += seconds
+		self.WriteStats()
+
+	# Give a held task back after a failed attempt; it expires at once
+	def Release(self, task, error, seconds=0.):
+		generation = self.held.pop(task['id'])
+		fd = os.open(os.path.join(self.root, 'failures', task['id']), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+		os.write(fd, json.dumps({'node': self.node, 'error': error}) + '\n')
+		os.close(fd)
+		try:
+			os.utime(self.LeasePath(task, generation), (0, 0))
+		except OSError:
+			pass
+		self.stats['failed'] += 1
+		self.stats['seconds'] += seconds
+		self.WriteStats()
+
+	def WriteStats(self):
+		self.stats['updated'] = self.Now()
+		WriteFile(os.path.join(self.root, 'nodes', self.node + '.json'), json.dumps(self.stats))
+
+	# RETURN: True if every task is done or given up
+	def Finished(self):
+		return not [s for s in self.States().values() if s in ('leased', 'pending')]
+
+	# Take a lock file for a critical section (merging into the output tree).
+	# A lock that was not touched for the lease is left over from a dead node;
+	# a holder that keeps it longer calls RenewLock.
+	def Lock(self, name, poll=0.2):
+		path = os.path.join(self.root, name + '.lock')
+		while True:
+			try:
+				fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0644)
+				os.write(fd, self.node)
+				os.close(fd)
+				self.locks[path] = time.time()
+				return path
+			except OSError:
+				pass
+			try:
+				if self.Now() - os.stat(path).st_mtime > self.lease:
+					os.remove(path)
+					continue
+			except OSError:
+				continue
+			time.sleep(poll)
+
+	# RETURN: the node that holds a lock file, or None if there is none
+	def LockOwner(self, path):
+		try:
+			f = open(path)
+			try:
+				return f.read()
+			finally:
+				f.close()
+		except IOError:
+			return None
+
+	# Keep a held lock alive; it is touched at most every interval seconds
+	# RETURN: False if another node has taken the lock over
+	def RenewLock(self, path, interval=0.):
+		if time.time() - self.locks.get(path, 0.) < interval:
+			return True
+		if self.LockOwner(path) != self.node:
+			return False
+		try:
+			os.utime(path, None)
+		except OSError:
+			return False
+		self.locks[path] = time.time()
+		return True
+
+	# Remove a held lock (unless another node has taken it over)
+	def Unlock(self, path):
+		self.locks.pop(path, None)
+		if self.LockOwner(path) == self.node:
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+
+	# RETURN: lines on the state of the job and the throughput of every node
+	def Report(self):
+		now = self.Now()
+		states = self.States(now).values()
+		lines = ['%d tasks: %d done, %d rendering, %d pending, %d failed' % (len(states),
+			states.count('done'), states.count('leased'), states.count('pending'), states.count('failed'))]
+		lines.append('%-24s %6s %8s %7s %10s %9s %10s' % ('node', 'tasks', 'images', 'failed', 'reclaimed',
+			'images/h', 'last seen'))
+		directory = os.path.join(self.root, 'nodes')
+		for name in sorted(os.listdir(directory)):
+			if not name.endswith('.json'):
+				continue
+			stats = ReadJson(os.path.join(directory, name))
+			wall = max(stats['updated'] - stats['started'], 1e-6)
+			lines.append('%-24s %6d %8d %7d %10d %9.0f %9.0fs' % (stats['node'], stats['tasks'], stats['images'],
+				stats['failed'], stats['reclaimed'], stats['images'] * 3600. / wall, now - stats['updated']))
+		return lines
+
+def main(argv):
+	if len(argv) != 2:
+		print 'usage: python stereoQueue.py output_root'
+		return 2
+	if not os.path.isfile(os.path.join(argv[1], QUEUE_DIR, 'job.json')):
+		print 'No queued job in', argv[1]
+		return 1
+	queue = TaskQueue(argv[1], node='status', readOnly=True)
+	queue.Load()
+	for line in queue.Report():
+		print line
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,98 @@
+# Stereo rig geometry for whole frame ranges at once.
+#
+# StereoAnimator.UpdateRig finds the eye positions by moving a two vertex
+# "_SEP" mesh onto the original camera (CopyRotLoc) and transforming its
+# vertices (-sep/2, 0, 0) and (sep/2, 0, 0) with the mesh's world matrix. That
+# is the camera location plus/minus sep/2 times the first row of the rotation
+# matrix, which is all we compute here, for every frame in one batch. The
+# shiftX formula is the one of UpdateRig.
+#
+# NumPy is used when it is available (Blender's Python usually does not ship it);
+# otherwise the same math runs in plain Python.
+#############################################################################################
+import math
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+# First row of Blender's rotation matrix for Euler angles (RotX, RotY, RotZ) in
+# radians (the local X axis in world space); see EulToMat3 in Blender's arithb.c
+def EulerXAxis(rx, ry, rz):
+	cj, sj = math.cos(ry), math.sin(ry)
+	ch, sh = math.cos(rz), math.sin(rz)
+	return (cj*ch, cj*sh, -sj)
+
+# Eye positions for a batch of camera transforms
+#	locations: sequence of (LocX, LocY, LocZ), one per frame
+#	rotations: sequence of (RotX, RotY, RotZ) in radians, one per frame
+# RETURN: (left positions, right positions), each a list of (x, y, z)
+def EyePositions(locations, rotations, separation):
+	half = separation / 2.
+	if numpy is not None and len(locations):
+		loc = numpy.asarray(locations, dtype=numpy.float64)
+		rot = numpy.asarray(rotations, dtype=numpy.float64)
+		cj, sj = numpy.cos(rot[:, 1]), numpy.sin(rot[:, 1])
+		ch, sh = numpy.cos(rot[:, 2]), numpy.sin(rot[:, 2])
+		axis = numpy.column_stack((cj*ch, cj*sh, -sj))
+		return [tuple(p) for p in (loc - half*axis)], [tuple(p) for p in (loc + half*axis)]
+	lefts, rights = [], []
+	for (x, y, z), (rx, ry, rz) in zip(locations, rotations):
+		ax, ay, az = EulerXAxis(rx, ry, rz)
+		lefts.append((x - half*ax, y - half*ay, z - half*az))
+		rights.append((x + half*ax, y + half*ay, z + half*az))
+	return lefts, rights
+
+# Views of an N-view rig along the baseline between the outer views
+# (separation), evenly spaced and left to right: view i sits at fraction 
+# t = i/(N-1) from the left to the right outer view, and its shiftX is the one
+# of the left eye blended to that of the right eye, so every view converges 
+# at the same focal distance.
+# RETURN: list of (position, shiftX) per view
+def InterpolateViews(views, left, right, shift):
+	result = []
+	for i in range(views):
+		t = i / float(views - 1)
+		position = tuple([l + t*(r - l) for l, r in zip(left, right)])
+		result.append((position, shift * (0.5 - t)))
+	return result
+
+# Off-axis shift (in units of the image width) that makes a parallel rig
+# converge at focalDist; 0 means no convergence (parallel cameras).
+# From http://www.noeol.de/s3d/BStereoOffAxisCamera_0_5_2.py
+# RETURN: the full shift; the left eye gets +shift/2, the right eye -shift/2
+def ShiftX(renderWidth, separation, focalDist, angle):
+	if focalDist == 0:
+		return 0.
+	camera_fov = math.radians(angle / 2.)
+	delta = (renderWidth*separation)/(2.*focalDist*math.tan(camera_fov))
+	return delta/renderWidth
+
+# ShiftX for a batch of frames (focal distance and angle may be animated)
+# RETURN: list of shifts
+def ShiftXBatch(renderWidth, separation, focalDists, angles):
+	if numpy is not None and len(focalDists):
+		dist = numpy.asarray(focalDists, dtype=numpy.float64)
+		fov = numpy.radians(numpy.asarray(angles, dtype=numpy.float64) / 2.)
+		safe = numpy.where(dist == 0, 1., dist)
+		delta = (renderWidth*separation)/(2.*safe*numpy.tan(fov))
+		return list(numpy.where(dist == 0, 0., delta/renderWidth))
+	return [ShiftX(renderWidth, separation, d, a) for d, a in zip(focalDists, angles)]
+
+# Width in pixels of the strip at each side of the image that the other eye
+# never sees for anything up to clipEnd. With the off-axis shift both frustums
+# coincide at focalDist; behind it the disparity grows towards shift*width at
+# infinity, so at clipEnd it is shift*width*(1 - focalDist/clipEnd).
+# RETURN: margin in whole pixels (0 for parallel cameras)
+def CropMargin(renderWidth, shift, focalDist, clipEnd):
+	if focalDist == 0 or shift == 0 or clipEnd <= focalDist:
+		return 0
+	disparity = abs(shift) * renderWidth * (1. - focalDist / float(clipEnd))
+	return min(int(math.ceil(disparity - 1e-9)), renderWidth // 2)
+
+# Crop box that removes margin pixels from both sides; the same box is used for
+# both eyes so that the zero parallax plane stays at the focal distance
+# RETURN: (left, top, right, bottom) in pixels, right/bottom exclusive
+def CropBox(renderWidth, renderHeight, margin):
+	return (margin, 0, renderWidth - margin, renderHeight)
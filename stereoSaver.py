@@ -0,0 +1,213 @@
+# Background image saving for StereoAnimator (--async-save).
+#
+# Blender 2.49 cannot hand a render result to Python, so saving cannot be
+# moved off the render loop completely. What can be moved is the expensive
+# part: Blender writes every image as an uncompressed Targa into a local spool
+# directory (fast), and a pool of helper processes - plain Python, started with
+# --save-python - encodes it into the scene's image format and writes it to
+# the output tree (slow formats, network storage). If the helpers have no PIL
+# or the format is one PIL cannot write, Blender saves in the scene format and
+# the helpers only move the files.
+#
+# The pool is bounded: Submit blocks once depth images are queued or being
+# written (backpressure). Results are handed back in submission order
+# (Completed), so the manifest is appended in render order, and failures are
+# reported per image.
+#
+# Helpers talk JSON lines over stdin/stdout:
+#	hello	{"pil": true}
+#	task	{"index": 3, "spool": "/tmp/...tga", "dest": ".../Cam_SLEFT_0001.png", "quality": 90}
+#	result	{"index": 3, "path": ".../Cam_SLEFT_0001.png"} or {"index": 3, "error": "..."}
+#############################################################################################
+import os
+import select
+import shutil
+import subprocess
+import sys
+
+try:
+	import json
+except ImportError:
+	import simplejson as json
+
+try:
+	from PIL import Image
+except ImportError:
+	try:
+		import Image
+	except ImportError:
+		Image = None
+
+# File extensions of the formats the helpers can encode (with PIL)
+PIL_FORMATS = {'.png': 'PNG', '.jpg': 'JPEG', '.jpeg': 'JPEG', '.tga': 'TGA', '.bmp': 'BMP',
+	'.tif': 'TIFF', '.tiff': 'TIFF'}
+
+# Make dest from a spooled image: encode it if the format differs, otherwise
+# move it. Written under a temporary name and renamed, like stereoImageIO.
+# RETURN: dest
+def Convert(spool, dest, quality=90):
+	directory = os.path.dirname(dest)
+	if directory and not os.path.isdir(directory):
+		try:
+			os.makedirs(directory)
+		except OSError:
+			if not os.path.isdir(directory):
+				raise
+	base, ext = os.path.splitext(dest)
+	tmp = base + '.tmp' + ext
+	if os.path.splitext(spool)[1].lower() == ext.lower():
+		shutil.move(spool, tmp)
+	else:
+		image = Image.open(spool)
+		options = {}
+		format = PIL_FORMATS[ext.lower()]
+		if format == 'JPEG':
+			options['quality'] = quality
+			if image.mode not in ('RGB', 'L'):
+				image = image.convert('RGB')
+		image.save(tmp, format, **options)
+		os.remove(spool)
+	os.rename(tmp, dest)
+	return dest
+
+# Helper process: convert the tasks read from stdin until it is closed
+def Worker():
+	sys.stdout.write(json.dumps({'pil': Image is not None}) + '\n')
+	sys.stdout.flush()
+	while True:
+		line = sys.stdin.readline()
+		if not line:
+			break
+		task = json.loads(line)
+		result = {'index': task['index']}
+		try:
+			result['path'] = Convert(task['spool'], task['dest'], task.get('quality', 90))
+		except Exception, e:
+			result['error'] = '%s: %s' % (e.__class__.__name__, e)
+		sys.stdout.write(json.dumps(result) + '\n')
+		sys.stdout.flush()
+	return 0
+
+class SaverPool:
+	##########################################
+	# Class Member Data ([Type] [name]):
+	#
+	# List processes		// Helper processes (subprocess.Popen)
+	# Dict busy				// helper index -> task it is working on
+	# List queued			// Tasks submitted but not yet handed to a helper
+	# Integer depth			// Most tasks queued or in progress at a time
+	# Dict results			// index -> finished task (with 'path' or 'error')
+	# Integer nextIndex		// Index of the next task Completed hands back
+	# Boolean canEncode		// All helpers have PIL
+	##########################################
+
+	def __init__(self, workers, depth=None, python='python'):
+		self.processes = []
+		self.busy = {}
+		self.queued = []
+		self.depth = max(1, depth or 2 * workers)
+		self.results = {}
+		self.submitted = 0
+		self.nextIndex = 0
+		self.canEncode = True
+		for i in range(max(1, workers)):
+			script = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+			process = subprocess.Popen([python, script, '--worker'],
+				stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+			hello = process.stdout.readline()
+			if not hello:
+				self.Close()
+				raise RuntimeError("Save helper '%s' did not start" % python)
+			self.canEncode = self.canEncode and json.loads(hello).get('pil', False)
+			self.processes.append(process)
+
+	# Queue an image; blocks while depth images are pending (backpressure)
+	# RETURN: the index of the task
+	def Submit(self, spool, dest, quality=90):
+		while len(self.queued) + len(self.busy) >= self.depth:
+			self.Wait(None)
+		task = {'index': self.submitted, 'spool': spool, 'dest': dest, 'quality': quality}
+		self.submitted += 1
+		self.queued.append(task)
+		self.Dispatch()
+		self.Wait(0)
+		return task['index']
+
+	# Hand queued tasks to idle helpers
+	def Dispatch(self):
+		for i, process in enumerate(self.processes):
+			if not self.queued:
+				return
+			if self.busy.has_key(i) or process is None:
+				continue
+			task = self.queued.pop(0)
+			self.busy[i] = task
+			try:
+				process.stdin.write(json.dumps(task) + '\n')
+				process.stdin.flush()
+			except (IOError, OSError), e:
+				self.Failed(i, 'save helper died (%s)' % e)
+
+	# Collect the results of helpers that finished, waiting up to timeout
+	# seconds (None: until at least one finished)
+	def Wait(self, timeout):
+		pipes = dict([(self.processes[i].stdout, i) for i in self.busy.keys()])
+		if not pipes:
+			return
+		ready = select.select(pipes.keys(), [], [], timeout)[0]
+		for pipe in ready:
+			i = pipes[pipe]
+			line = pipe.readline()
+			if not line:
+				self.Failed(i, 'save helper exited')
+				continue
+			result = json.loads(line)
+			task = self.busy.pop(i)
+			task.update(result)
+			self.results[task['index']] = task
+		self.Dispatch()
+
+	# Give up on a helper: its task and (if no helper is left) all queued tasks fail
+	def Failed(self, i, error):
+		task = self.busy.pop(i)
+		task['error'] = error
+		self.results[task['index']] = task
+		self.processes[i] = None
+		if not [p for p in self.processes if p is not None]:
+			for task in self.queued:
+				task['error'] = error
+				self.results[task['index']] = task
+			self.queued = []
+
+	# RETURN: the finished tasks that follow the ones already returned, in
+	# submission order (stops at the first one still in progress)
+	def Completed(self):
+		done = []
+		while self.results.has_key(self.nextIndex):
+			done.append(self.results.pop(self.nextIndex))
+			self.nextIndex += 1
+		return done
+
+	# RETURN: True if no task is queued or in progress
+	def Idle(self):
+		return not self.queued and not self.busy
+
+	# Wait until every submitted task is finished
+	# RETURN: the remaining finished tasks in submission order
+	def Flush(self):
+		while not self.Idle():
+			self.Wait(None)
+		return self.Completed()
+
+	def Close(self):
+		for process in self.processes:
+			if process is not None:
+				process.stdin.close()
+				process.wait()
+		self.processes = []
+
+if __name__ == '__main__':
+	if sys.argv[1:] == ['--worker']:
+		sys.exit(Worker())
+	print 'stereoSaver.py is started by StereoAnimator.py --async-save'
+	sys.exit(2)
@@ -0,0 +1,91 @@
+# Render order of the (frame, rig, eye) images of a StereoAnimator job.
+#
+# Every image needs its frame evaluated (Blender.Set('curframe'), which
+# re-evaluates the whole scene), its rig updated for that frame, and the
+# active camera and render path switched to its eye. Which of these dominates
+# depends on the scene, so the task list is built up front and sorted:
+#
+#	frame	frame by frame, all rigs and eyes per frame (the original order):
+#			one evaluation per frame, but a camera/directory switch per image
+#	camera	rig by rig, both eyes per frame: one evaluation per frame and rig
+#	eye		rig by rig and eye by eye: one evaluation per image, but the
+#			camera and output directory only change once per sequence
+#	auto	whichever of the above has the lowest estimated cost (Cost)
+#
+# StereoAnimator.RenderTasks runs the list and skips every frame change, rig
+# update, camera switch and setRenderPath that would not change anything.
+#
+# With a preview step, the job is rendered in passes of increasing quality
+# (RefinementPasses): low resolution every Nth frame, low resolution of the
+# frames in between, then the same two at full resolution.
+#############################################################################################
+
+ORDERS = ['frame', 'camera', 'eye', 'auto']
+
+# Sort keys of the orders; a task is (frame index, rig index, eye index)
+ORDER_KEYS = {
+	'frame': lambda t: (t[0], t[1], t[2]),
+	'camera': lambda t: (t[1], t[0], t[2]),
+	'eye': lambda t: (t[1], t[2], t[0]),
+}
+
+# RETURN: the number of frame evaluations, rig updates and camera/path
+# switches an order needs for frames x rigs x eyes images
+def Counts(order, frames, rigs, eyes):
+	images = frames * rigs * eyes
+	if order == 'frame':
+		evaluations, updates = frames, frames * rigs
+		switches = rigs * eyes > 1 and images or 1
+	elif order == 'camera':
+		evaluations = rigs > 1 and frames * rigs or frames
+		updates = frames * rigs
+		switches = eyes > 1 and images or rigs
+	else:
+		evaluations = rigs * eyes > 1 and images or frames
+		updates = images
+		switches = rigs * eyes
+	return evaluations, updates, switches
+
+# Estimated seconds an order spends on anything but rendering
+#	evaluateCost	seconds per frame change
+#	updateCost		seconds per rig update
+#	switchCost		seconds per camera/render path switch
+def Cost(order, frames, rigs, eyes, evaluateCost, updateCost, switchCost):
+	evaluations, updates, switches = Counts(order, frames, rigs, eyes)
+	return evaluations * evaluateCost + updates * updateCost + switches * switchCost
+
+# RETURN: the order with the lowest estimated cost (ties go to frame order)
+def ChooseOrder(frames, rigs, eyes, evaluateCost, updateCost, switchCost):
+	best = None
+	for order in ['frame', 'camera', 'eye']:
+		cost = Cost(order, frames, rigs, eyes, evaluateCost, updateCost, switchCost)
+		if best is None or cost < best[0]:
+			best = (cost, order)
+	return best[1]
+
+# RETURN: list of (preview, frames) passes; a step below 1 is a single full
+# resolution pass
+def RefinementPasses(frames, step, previewOnly=False):
+	if step < 1:
+		return [(False, frames)]
+	coarse = frames[::step]
+	taken = dict([(f, True) for f in coarse])
+	rest = [f for f in frames if not taken.has_key(f)]
+	passes = []
+	for preview in previewOnly and [True] or [True, False]:
+		passes.append((preview, coarse))
+		if rest:
+			passes.append((preview, rest))
+	return passes
+
+# Build the task list of a job in the given order ('auto' must be resolved
+# with ChooseOrder first)
+# RETURN: list of (frame, rig index, eye index)
+def BuildTasks(frames, rigs, eyes, order):
+	tasks = []
+	for f in range(len(frames)):
+		for r in range(rigs):
+			for e in range(eyes):
+				tasks.append((f, r, e))
+	tasks.sort(key=ORDER_KEYS[order])
+	return [(frames[f], r, e) for (f, r, e) in tasks]
@@ -0,0 +1,165 @@
+# Logging and timing for StereoAnimator.
+#
+# Log levels (SetLogLevel, or --log-level on the command line):
+#	0 LOG_WARNING	warnings and errors only
+#	1 LOG_INFO		setup, summary
+#	2 LOG_FRAME		one progress line per frame and per saved image (default)
+#	3 LOG_DEBUG		per rig details (eye separation, shiftX, clone lookups, ...)
+#
+# RenderTrace times the phases of a render (setup, clone, precompute, update,
+# render, save, frame) and writes one JSON line per measurement to a trace file:
+#	{"phase": "render", "seconds": 12.3, "frame": 7, "eye": "_SLEFT", "camera": "Camera", "t": ...}
+# Summary() gives p50/p95 per phase, frames per hour and the remaining time.
+#############################################################################################
+import sys
+import time
+
+try:
+	import json
+except ImportError:
+	import simplejson as json
+
+LOG_WARNING = 0
+LOG_INFO = 1
+LOG_FRAME = 2
+LOG_DEBUG = 3
+
+LOG_LEVEL_NAMES = {'warning': LOG_WARNING, 'info': LOG_INFO, 'frame': LOG_FRAME, 'debug': LOG_DEBUG}
+
+_logLevel = LOG_FRAME
+
+def SetLogLevel(level):
+	global _logLevel
+	if LOG_LEVEL_NAMES.has_key(level):
+		level = LOG_LEVEL_NAMES[level]
+	_logLevel = int(level)
+
+def GetLogLevel():
+	return _logLevel
+
+# print the arguments (like the print statement) if level is enabled
+def Log(level, *args):
+	if level <= _logLevel:
+		sys.stdout.write(' '.join([str(a) for a in args]) + '\n')
+
+# RETURN: the p-th percentile (0..100) of a list of numbers
+def Percentile(values, p):
+	if not values:
+		return 0.
+	values = sorted(values)
+	index = int(round((p / 100.) * (len(values) - 1)))
+	return values[index]
+
+# RETURN: seconds as e.g. '2h05m' or '42.0s'
+def FormatDuration(seconds):
+	if seconds < 60:
+		return '%.1fs' % seconds
+	minutes = int(seconds // 60)
+	if minutes < 60:
+		return '%dm%02ds' % (minutes, int(seconds) % 60)
+	return '%dh%02dm' % (minutes // 60, minutes % 60)
+
+class RenderTrace:
+	##########################################
+	# Class Member Data ([Type] [name]):
+	#
+	# File traceFile		// JSON lines output (None: keep timings in memory only)
+	# Dict phases			// phase name -> list of durations in seconds
+	# Float started			// wall clock time of the first measurement
+	# Float framesDone		// frames finished so far (fractions for the images
+	#							of frames that are not complete yet)
+	# Integer framesTotal	// frames of the whole render (for the ETA)
+	# CostTracker predictor	// Predicted render time left (None: ETA from the
+	#							frames rendered so far, see stereoCost.py)
+	##########################################
+
+	def __init__(self, path=None):
+		self.traceFile = None
+		if path:
+			self.traceFile = open(path, 'a')
+		self.phases = {}
+		self.started = time.time()
+		self.framesDone = 0
+		self.framesTotal = 0
+		self.predictor = None
+
+	# RETURN: a start time to hand to Stop
+	def Start(self):
+		return time.time()
+
+	# Record the time since start for a phase, with optional frame/eye/camera tags
+	# RETURN: the duration in seconds
+	def Stop(self, start, phase, **tags):
+		seconds = time.time() - start
+		self.phases.setdefault(phase, []).append(seconds)
+		if self.traceFile is not None:
+			tags['phase'] = phase
+			tags['seconds'] = round(seconds, 6)
+			tags['t'] = round(start - self.started, 6)
+			# one line per write, flushed, so a killed render leaves whole lines
+			self.traceFile.write(json.dumps(tags, sort_keys=True) + '\n')
+			self.traceFile.flush()
+		return seconds
+
+	def SetFrameCount(self, frames):
+		self.framesTotal = frames
+		self.framesDone = 0
+
+	# Count a finished frame, or the given fraction of one (render orders
+	# other than frame by frame finish frames piece by piece)
+	def FrameDone(self, fraction=1.):
+		self.framesDone += fraction
+
+	# RETURN: the number of whole frames finished
+	def FramesDone(self):
+		return int(self.framesDone + 1e-6)
+
+	# RETURN: frames finished per hour of wall time so far
+	def FramesPerHour(self):
+		elapsed = time.time() - self.started
+		if elapsed <= 0 or not self.framesDone:
+			return 0.
+		return self.framesDone * 3600. / elapsed
+
+	# RETURN: estimated seconds until all frames are done: the predicted
+	# render time left plus the time spent on anything else per frame so far,
+	# or the mean time per frame so far
+	def ETA(self):
+		if self.predictor is not None:
+			other = 0.
+			if self.framesDone:
+				elapsed = time.time() - self.started
+				other = max(0., elapsed - sum(self.phases.get('render', []))) / self.framesDone
+			return self.predictor.Remaining() + max(0, self.framesTotal - self.framesDone) * other
+		if not self.framesDone:
+			return None
+		frameTimes = self.phases.get('frame')
+		if frameTimes:
+			perFrame = sum(frameTimes) / len(frameTimes)
+		else:
+			perFrame = (time.time() - self.started) / self.framesDone
+		return max(0, self.framesTotal - self.framesDone) * perFrame
+
+	# RETURN: one line of progress, e.g. for the end of every frame
+	def Progress(self):
+		eta = self.ETA()
+		line = 'frame %d of %d, %.1f frames/hour, ETA %s' % (self.FramesDone(), self.framesTotal,
+			self.FramesPerHour(), eta is None and '?' or FormatDuration(eta))
+		if eta is not None and self.predictor is not None and not self.predictor.Calibrated():
+			line += ' (uncalibrated)'
+		return line
+
+	# RETURN: multi-line summary table of all phases
+	def Summary(self):
+		lines = ['%-12s %8s %10s %10s %10s' % ('phase', 'count', 'total', 'p50', 'p95')]
+		for phase in sorted(self.phases.keys()):
+			values = self.phases[phase]
+			lines.append('%-12s %8d %10s %9.3fs %9.3fs' % (phase, len(values),
+				FormatDuration(sum(values)), Percentile(values, 50), Percentile(values, 95)))
+		lines.append(self.Progress())
+		return '\n'.join(lines)
+
+	def Close(self):
+		if self.traceFile is not None:
+			self.traceFile.close()
+			self.traceFile = None
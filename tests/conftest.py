@@ -0,0 +1,15 @@
+# pytest setup: the modules under test live in the repository root; the
+# StereoAnimator tests run it against the fake Blender API of the benchmarks
+# (benchmarks/fakeblender, see benchmarks/stereoBench.py).
+#
+# To use (the Python the helper modules run with, not Blender's):
+#	python -m pytest -q tests
+#############################################################################################
+import os
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TESTS_DIR)
+for path in [ROOT, os.path.join(ROOT, 'benchmarks'), os.path.join(ROOT, 'benchmarks', 'fakeblender')]:
+	if path not in sys.path:
+		sys.path.insert(0, path)
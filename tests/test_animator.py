@@ -0,0 +1,138 @@
+# StereoAnimator against the fake Blender API
+import sys
+
+import pytest
+
+import stereoBench
+import stereoManifest
+from Blender import Camera, Mesh, Scene
+
+def Animator(scene, output):
+	animator = stereoBench.NewAnimator(scene, output)
+	animator.trace.Close()
+	return animator
+
+def test_resume_skips_completed_images(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(2, 3, 1, output, 0)
+	context = scene.getRenderingContext()
+	Animator(scene, output).RenderAllRigsByFrame()
+	assert context.renders == 12
+
+	context.renders = 0
+	animator = Animator(scene, output)
+	animator.SetResume(True)
+	animator.RenderAllRigsByFrame()
+	assert context.renders == 0
+
+	# a file cut short is rendered again
+	manifest = stereoManifest.FrameManifest(output)
+	f = open(manifest.AbsolutePath(manifest.records[(2, '_SRIGHT', 'Cam1')]), 'ab')
+	f.write('partial')
+	f.close()
+	animator = Animator(scene, output)
+	animator.SetResume(True)
+	animator.RenderAllRigsByFrame()
+	assert context.renders == 1
+
+	# other render settings make other images
+	context.renders = 0
+	context.quality = 50
+	animator = Animator(scene, output)
+	animator.SetResume(True)
+	animator.RenderAllRigsByFrame()
+	assert context.renders == 12
+
+def test_rig_hash_covers_render_settings(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(1, 1, 0, output, 0)
+	context = scene.getRenderingContext()
+	animator = Animator(scene, output)
+	animator.GenerateStereoRigs(animator.eyeSep)
+	rig = animator.rigs[0]
+	hashes = set([animator.RigHash(rig.left)])
+	for name, value in [('imageType', 4), ('OSALevel', 16), ('rayTracing', False), ('renderwinSize', 50),
+			('border', [0., 0., .5, .5])]:
+		setattr(context, name, value)
+		hashes.add(animator.RigHash(rig.left))
+	assert len(hashes) == 6
+
+def test_rig_hash_is_the_same_with_the_saver(tmpdir):
+	pytest.importorskip('PIL')
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(2, 3, 0, output, 0)
+	context = scene.getRenderingContext()
+	Animator(scene, output).RenderAllRigsByFrame()
+	assert context.renders == 12
+
+	# the saver has Blender dump RAWTGA; the images are still PNG ones
+	context.renders = 0
+	animator = Animator(scene, output)
+	animator.SetResume(True)
+	animator.StartSaver(1, sys.executable, str(tmpdir.join('spool')))
+	try:
+		assert context.imageType == Scene.Render.RAWTGA
+		animator.RenderAllRigsByFrame()
+	finally:
+		animator.StopSaver()
+	assert context.renders == 0
+	assert context.imageType == Scene.Render.PNG
+
+def test_precomputed_rigs_match_update_rig(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(3, 8, 0, output, 0)
+	animator = Animator(scene, output)
+	animator.verifyRigs = True
+	animator.GenerateStereoRigs(animator.eyeSep)
+	frames = animator.GetRenderFrames()
+	animator.PrecomputeRigs(frames)
+	for frame in frames:
+		animator.SetFrame(frame)
+		for rig in animator.rigs:
+			assert animator.CheckRigCache(rig.seg, rig.orig, frame) < 1e-4
+			animator.UpdateRig(rig.left, rig.right, rig.seg, rig.orig)
+			placed = [rig.left.loc, rig.right.loc, rig.left.getData().shiftX]
+			animator.UpdateRigCached(rig.left, rig.right, rig.orig, frame)
+			for a, b in zip(placed[0] + placed[1], rig.left.loc + rig.right.loc):
+				assert abs(a - b) < 1e-4
+			assert abs(placed[2] - rig.left.getData().shiftX) < 1e-6
+
+def test_parented_camera_is_placed_by_update_rig(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(2, 2, 0, output, 0)
+	parent = scene.objects.new(Mesh.New('Dolly'), 'Dolly')
+	parent.LocX = 10.
+	cameras = dict([(ob.getName(), ob) for ob in scene.objects])
+	parent.makeParent([cameras['Cam1']])
+	animator = Animator(scene, output)
+	animator.GenerateStereoRigs(animator.eyeSep)
+	rigs = dict([(rig.orig.getName(), rig) for rig in animator.rigs])
+	assert rigs['Cam0'].cached and not rigs['Cam1'].cached
+	assert rigs['Cam1'].seg is not None
+
+	# the driven rig follows its camera through the _SEP segment (UpdateRig)
+	animator.PrecomputeRigs([1])
+	animator.SetFrame(1)
+	for index, rig in enumerate(animator.rigs):
+		animator.UpdateRigFor(index, 1)
+	seg = rigs['Cam1'].seg
+	assert (seg.LocX, seg.LocY, seg.LocZ) == (cameras['Cam1'].LocX, cameras['Cam1'].LocY, cameras['Cam1'].LocZ)
+
+def test_user_objects_with_rig_names_are_left_alone(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(1, 1, 0, output, 0)
+	user = scene.objects.new(Camera.New('persp', 'UserData'), 'Cam0_SLEFT')
+	prop = scene.objects.new(Mesh.New('UserMesh'), 'Cam0_SEP')
+	for run in range(2):
+		animator = Animator(scene, output)
+		animator.GenerateStereoRigs(animator.eyeSep)
+		rigs = dict([(rig.orig.getName(), rig) for rig in animator.rigs])
+		# the user camera gets a rig of its own, Cam0's left eye another name
+		assert sorted(rigs.keys()) == ['Cam0', 'Cam0_SLEFT']
+		assert rigs['Cam0'].left is not user
+		assert animator.RigName(rigs['Cam0'].left) == 'Cam0_SLEFT'
+		assert animator.EyeName(rigs['Cam0'].left, rigs['Cam0'].orig) == '_SLEFT'
+		objects = list(scene.objects)
+		assert user in objects and prop in objects
+	# the second run reused the rig objects of the first
+	assert len([ob for ob in objects if ob.getName().startswith('Cam0_SLEFT.')]) == 1
@@ -0,0 +1,124 @@
+# stereoArchive: aliases of static frames, growing the index, dropping
+# replaced images and merging shard archives; archived renders
+import os
+
+import pytest
+
+import stereoArchive
+import stereoBench
+
+VIEWS = ['_SLEFT', '_SRIGHT']
+
+def NewArchive(path, first, capacity):
+	stereoArchive.Create(path, VIEWS, first, capacity)
+	return stereoArchive.StereoArchive(path, writable=True)
+
+def Image(frame, view, version=''):
+	return ('%d%s%s ' % (frame, view, version)) * 100
+
+def test_grow_keeps_aliases_and_drops_replaced_images(tmpdir):
+	path = str(tmpdir.join('Cam.stereopack'))
+	archive = NewArchive(path, 1, 3)
+	for frame in [1, 2]:
+		for view in VIEWS:
+			archive.Append(frame, view, Image(frame, view), '.png')
+	for view in VIEWS:
+		assert archive.Alias(3, view, 2)
+		archive.Append(1, view, Image(1, view, 'new'), '.png')
+	assert archive.Unreferenced() == len(Image(1, '_SLEFT')) + len(Image(1, '_SRIGHT'))
+
+	archive.Append(5, '_SLEFT', Image(5, '_SLEFT'), '.png')		# outside the index: Grow
+	assert (archive.firstFrame, archive.capacity) == (1, 5)
+	assert archive.Unreferenced() == 0
+	for view in VIEWS:
+		assert archive.Entry(3, view)[0] == archive.Entry(2, view)[0]
+		assert archive.Read(3, view) == Image(2, view)
+		assert archive.Read(1, view) == Image(1, view, 'new')
+	assert archive.Read(4, '_SLEFT') is None
+	archive.Close()
+
+def test_compact(tmpdir):
+	path = str(tmpdir.join('Cam.stereopack'))
+	archive = NewArchive(path, 1, 2)
+	for version in ['', 'again', 'final']:
+		archive.Append(1, '_SLEFT', Image(1, '_SLEFT', version), '.png')
+	size = os.path.getsize(path)
+	archive.Compact()
+	assert os.path.getsize(path) < size
+	assert archive.Unreferenced() == 0
+	assert archive.Read(1, '_SLEFT') == Image(1, '_SLEFT', 'final')
+	archive.Close()
+
+def test_merge_keeps_aliases(tmpdir):
+	target = str(tmpdir.join('final.stereopack'))
+	source = str(tmpdir.join('shard.stereopack'))
+	NewArchive(target, 1, 2).Close()
+	archive = NewArchive(source, 3, 3)
+	archive.Append(3, '_SLEFT', Image(3, '_SLEFT'), '.png')
+	archive.Alias(4, '_SLEFT', 3)
+	archive.Alias(5, '_SLEFT', 3)
+	archive.Close()
+
+	assert stereoArchive.MergeArchive(target, source) == 3
+	assert not os.path.exists(source)
+	archive = stereoArchive.StereoArchive(target)
+	assert archive.Covers(1) and archive.Covers(5)
+	offsets = set([archive.Entry(frame, '_SLEFT')[0] for frame in [3, 4, 5]])
+	assert len(offsets) == 1
+	assert archive.Read(5, '_SLEFT') == Image(3, '_SLEFT')
+	archive.Close()
+
+def test_corrupt_image_is_detected(tmpdir):
+	path = str(tmpdir.join('Cam.stereopack'))
+	archive = NewArchive(path, 1, 1)
+	archive.Append(1, '_SLEFT', Image(1, '_SLEFT'), '.png')
+	offset = archive.Entry(1, '_SLEFT')[0]
+	archive.Close()
+	f = open(path, 'r+b')
+	f.seek(offset)
+	f.write('X')
+	f.close()
+	archive = stereoArchive.StereoArchive(path)
+	try:
+		archive.Read(1, '_SLEFT')
+		assert False, "corrupt image read"
+	except IOError:
+		pass
+	archive.Close()
+
+def RenderArchived(scene, output, views):
+	animator = stereoBench.NewAnimator(scene, output)
+	animator.trace.Close()
+	animator.SetViews(views)
+	animator.SetResume(True)
+	animator.StartArchive(os.path.join(output, 'spool'))
+	try:
+		animator.RenderAllRigsByFrame()
+	finally:
+		animator.CloseArchives()
+
+def test_render_into_archive(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(1, 3, 0, output, 0)
+	context = scene.getRenderingContext()
+	RenderArchived(scene, output, 2)
+	assert context.renders == 6
+	archive = stereoArchive.StereoArchive(stereoArchive.ArchivePath(output, 'Cam0'))
+	assert archive.views == VIEWS
+	assert sorted(archive.Keys()) == [(f, v) for f in [1, 2, 3] for v in VIEWS]
+	archive.Close()
+	RenderArchived(scene, output, 2)
+	assert context.renders == 6
+
+def test_archive_of_other_views_is_refused(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(1, 2, 0, output, 0)
+	context = scene.getRenderingContext()
+	RenderArchived(scene, output, 2)
+	path = stereoArchive.ArchivePath(output, 'Cam0')
+	size = os.path.getsize(path)
+	with pytest.raises(RuntimeError) as error:
+		RenderArchived(scene, output, 3)
+	assert '--views 2' in str(error.value)
+	assert context.renders == 4
+	assert os.path.getsize(path) == size
@@ -0,0 +1,75 @@
+# The stereo comfort check of stereoComfort, on its own and before a render
+import os
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+import stereoBench
+import stereoComfort
+
+WIDTH = 128
+ANGLE = 60.
+
+# A rig looking down -Z with the eyes 1 apart. shiftX puts the screen plane at
+# depth focal, where a point in front of the right eye has a disparity of
+# exactly 0.
+def Rig():
+	return {'frames': [1], 'left': [[-0.5, 0., 0.]], 'right': [[0.5, 0., 0.]], 'rotation': [[0., 0., 0.]],
+		'shift': [1. / WIDTH], 'angle': [ANGLE], 'clipStart': [0.1]}
+
+def Focal():
+	return float((0.5 * WIDTH / numpy.tan(numpy.radians(numpy.array([ANGLE])) / 2.))[0])
+
+def test_disparity_of_the_screen_plane_and_in_front():
+	focal = Focal()
+	# four corners on the screen plane, four half way to it
+	corners = [[0.5, 0., -focal]] * 4 + [[0.5, 0., -focal / 2.]] * 4
+	report = stereoComfort.Analyse('Cam', Rig(), ['Box'], [[corners]], WIDTH, 96, 10., 2.)
+	record = report['frames'][0]
+	assert record['farthest'] == 0.
+	assert record['nearest'] < 0.
+	assert record['violations'] == []
+
+	# a limit behind the screen of less than 0 flags the box with its far side
+	report = stereoComfort.Analyse('Cam', Rig(), ['Box'], [[corners]], WIDTH, 96, 10., -0.5)
+	assert report['frames'][0]['violations'] == [['Box', 'uncrossed', 0.]]
+
+	# a crossed limit flags it with its near side
+	report = stereoComfort.Analyse('Cam', Rig(), ['Box'], [[corners]], WIDTH, 96, 0.1, 2.)
+	assert report['frames'][0]['violations'] == [['Box', 'crossed', record['nearest']]]
+
+def Scene(output, frames):
+	scene = stereoBench.BuildScene(1, frames, 1, output, 0)
+	objects = dict([(ob.getName(), ob) for ob in scene.objects])
+	# one unit in front of the orbiting camera, far out of the screen
+	def follow(ob, frame):
+		cam = objects['Cam0']
+		ob.LocX, ob.LocY, ob.LocZ = cam.LocX * 0.9, cam.LocY * 0.9, cam.LocZ
+	objects['Prop0'].animate = follow
+	return scene
+
+def Animator(scene, output, mode):
+	animator = stereoBench.NewAnimator(scene, output)
+	animator.trace.Close()
+	animator.SetComfort(1., 2., mode, 'python')
+	return animator
+
+def test_abort_before_rendering(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = Scene(output, 3)
+	with pytest.raises(RuntimeError):
+		Animator(scene, output, 'abort').RenderAllRigsByFrame()
+	assert scene.getRenderingContext().renders == 0
+	report = stereoComfort.ReadReport(output, 'Cam0')
+	assert len(stereoComfort.BadFrames(report)) == 3
+	assert report['frames'][0]['nearestObject'] == 'Prop0'
+	assert ['Prop0', 'crossed'] == report['frames'][0]['violations'][0][:2]
+
+def test_report_only(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = Scene(output, 2)
+	Animator(scene, output, 'only').RenderAllRigsByFrame()
+	assert scene.getRenderingContext().renders == 0
+	assert os.path.isfile(os.path.join(output, stereoComfort.SAMPLES_NAME))
+	assert len(stereoComfort.ReadReport(output, 'Cam0')['frames']) == 2
@@ -0,0 +1,44 @@
+# The command line of StereoAnimator: options after '--', --jobs files and
+# the scene left as it was after every job
+import StereoAnimator
+import stereoBench
+from Blender import Camera, Scene
+
+def test_only_options_after_the_separator():
+	(options, args) = StereoAnimator.ParseArguments(['blender', '-b', 'shot.blend', '-P', 'StereoAnimator.py'])
+	assert options.frames is None and args == []
+	(options, args) = StereoAnimator.ParseArguments(['blender', '--frames', '9', '--', '--frames', '1-3',
+		'--order', 'eye'])
+	assert options.frames == '1-3' and options.order == 'eye'
+
+def test_job_lines_override_the_command_line(tmpdir):
+	path = str(tmpdir.join('jobs.txt'))
+	f = open(path, 'w')
+	f.write('# shot 12\n--frames 1-10 --cameras Cam0\n\n--frames 11-20 --quality 50  # the rest\n')
+	f.close()
+	(options, args) = StereoAnimator.ParseArguments(['--', '--jobs', path, '--quality', '80', '--cameras', 'Cam1'])
+	jobs = StereoAnimator.ReadJobs(path, options)
+	assert [(j.frames, j.cameras, j.quality) for j in jobs] == [('1-10', 'Cam0', 80), ('11-20', 'Cam1', 50)]
+	assert options.frames is None
+
+def test_jobs_on_another_scene(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(1, 2, 0, output, 0)
+	other = Scene.New('Other')
+	other.objects.new(Camera.New('persp', 'OtherData'), 'OtherCam')
+	context = other.getRenderingContext()
+	context.setRenderPath(output)
+	context.startFrame(1)
+	context.endFrame(2)
+	path = str(tmpdir.join('jobs.txt'))
+	f = open(path, 'w')
+	f.write('--scene Other --format jpg --quality 40\n--scene Missing\n--frames 1\n')
+	f.close()
+
+	assert StereoAnimator.main(['blender', '--', '--jobs', path, '--log-level', 'warning']) == 1
+	# the current scene and the image settings of both scenes are as they were
+	assert Scene.GetCurrent() is scene
+	assert (context.imageType, context.quality) == (Scene.Render.PNG, 90)
+	assert context.renders == 4
+	assert scene.getRenderingContext().renders == 2
+	assert [ob.getName() for ob in other.objects] == ['OtherCam']
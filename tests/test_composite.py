@@ -0,0 +1,69 @@
+# stereoComposite and the band-wise image I/O of stereoImageIO: the streamed
+# composites equal the whole frame ones for every input and output format
+import pytest
+
+numpy = pytest.importorskip('numpy')
+pytest.importorskip('PIL')
+
+import stereoComposite
+import stereoImageIO
+
+# RETURN: a (height, width, 3) test frame with a different value in every pixel
+def Frame(height, width, seed):
+	y, x = numpy.mgrid[0:height, 0:width]
+	return numpy.dstack([(x * 5 + seed) % 256, (y * 3 + seed) % 256, (x * y + seed) % 256]).astype(numpy.uint8)
+
+def WriteRows(path, pixels, chunkRows=7):
+	writer = stereoImageIO.RowWriter(path, pixels.shape[1], pixels.shape[0])
+	for r0 in range(0, pixels.shape[0], chunkRows):
+		writer.Write(pixels[r0:r0+chunkRows])
+	writer.Close()
+
+@pytest.mark.parametrize('ext', ['.png', '.tga', '.bmp', '.tif'])
+def test_row_writer_and_reader(tmpdir, ext):
+	pixels = Frame(23, 17, 1)
+	path = str(tmpdir.join('frame' + ext))
+	WriteRows(path, pixels)
+	assert numpy.array_equal(stereoImageIO.ReadImage(path), pixels)
+	rows = stereoImageIO.ImageRows(path)
+	try:
+		# the first band too (top-down Targa files start with it)
+		for r0, r1 in [(0, 5), (5, 23), (10, 11)]:
+			assert numpy.array_equal(rows.Band(r0, r1), pixels[r0:r1])
+	finally:
+		rows.Close()
+
+def test_bottom_up_targa_bands(tmpdir):
+	pixels = Frame(9, 6, 2)
+	path = str(tmpdir.join('frame.tga'))
+	stereoImageIO.WriteImage(path, pixels)
+	rows = stereoImageIO.ImageRows(path)
+	try:
+		assert numpy.array_equal(rows.Band(0, 4), pixels[0:4])
+		assert numpy.array_equal(rows.Band(4, 9), pixels[4:9])
+	finally:
+		rows.Close()
+
+@pytest.mark.parametrize('inputExt', ['.png', '.tga', '.bmp'])
+def test_streamed_composites_equal_whole_frames(tmpdir, inputExt):
+	left = Frame(20, 12, 3)
+	right = Frame(20, 12, 40)
+	leftPath = str(tmpdir.join('left' + inputExt))
+	rightPath = str(tmpdir.join('right' + inputExt))
+	WriteRows(leftPath, left)
+	WriteRows(rightPath, right)
+	targets = [(mode, str(tmpdir.join(mode + '.png'))) for mode in stereoComposite.MODES]
+	assert stereoComposite.CompositeFrame(leftPath, rightPath, targets, chunkRows=6) == len(targets)
+	for mode, path in targets:
+		assert numpy.array_equal(stereoImageIO.ReadImage(path), stereoComposite.Composite(mode, left, right))
+
+def test_composite_layouts():
+	left = Frame(4, 3, 5)
+	right = Frame(4, 3, 90)
+	anaglyph = stereoComposite.Composite('anaglyph', left, right, chunkRows=3)
+	assert numpy.array_equal(anaglyph[:, :, 0], left[:, :, 0])
+	assert numpy.array_equal(anaglyph[:, :, 1:], right[:, :, 1:])
+	assert numpy.array_equal(stereoComposite.Composite('sbs', left, right), numpy.hstack((left, right)))
+	assert numpy.array_equal(stereoComposite.Composite('ou', left, right, chunkRows=3), numpy.vstack((left, right)))
+	with pytest.raises(ValueError):
+		stereoComposite.Composite('sbs', left, right[:3])
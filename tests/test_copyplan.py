@@ -0,0 +1,63 @@
+# The attribute copy plans of stereoCopyPlan: a plan is probed once per pair
+# of object kinds and drops what cannot or need not be copied
+import stereoCopyPlan
+
+class Thing(object):
+	type = 'Camera'
+	def __init__(self):
+		self.loc = (0., 0., 0.)
+		self.LocX = 0.
+		self.lens = 35.
+		self.fixed = 2.
+
+# an attribute that accepts assignments and ignores them
+class Locked(Thing):
+	def _GetFixed(self):
+		return 1.
+	def _SetFixed(self, value):
+		pass
+	fixed = property(_GetFixed, _SetFixed)
+
+class Counted(Thing):
+	def __getattribute__(self, name):
+		if name == 'lens':
+			self.__dict__['gets'] = self.__dict__.get('gets', 0) + 1
+		return Thing.__getattribute__(self, name)
+
+ATTRIBUTES = ['users', 'LocX', 'loc', 'missing', 'fixed', 'lens']
+
+def test_plan_drops_what_cannot_be_copied():
+	src, dest = Thing(), Locked()
+	src.loc = (1., 2., 3.)
+	src.lens = 50.
+	plan = stereoCopyPlan.CopyPlan(ATTRIBUTES, dest, src)
+	assert plan.names == ['loc', 'lens']
+	reasons = dict(plan.skipped)
+	assert reasons['users'] == 'read-only'
+	assert reasons['missing'].startswith('not readable')
+	assert reasons['LocX'] == 'superseded by loc'
+	assert reasons['fixed'] == 'no effect'
+	assert dest.loc == (1., 2., 3.) and dest.lens == 50.
+
+	src.lens = 70.
+	plan.Apply(dest, src)
+	assert dest.lens == 70.
+
+def test_cache_probes_each_pair_once():
+	cache = stereoCopyPlan.CopyPlanCache()
+	src, dest = Counted(), Thing()
+	for lens in [40., 45., 60.]:
+		src.lens = lens
+		cache.Copy('camera', ATTRIBUTES, dest, src)
+		assert dest.lens == lens
+	assert len(cache.plans) == 1
+	plan = cache.plans.values()[0]
+	assert 'missing' not in plan.names
+	assert src.gets == 3			# one read per copy, the first one while probing
+
+	# another kind of destination gets its own plan
+	other = Thing()
+	other.type = 'Empty'
+	cache.Copy('camera', ATTRIBUTES, other, src)
+	assert len(cache.plans) == 2
+	assert 'COPY PLAN camera' in cache.Report()
@@ -0,0 +1,61 @@
+# The cost model of stereoCost and its render time predictions
+import os
+
+import stereoBench
+import stereoCost
+
+def test_samples_are_scaled_by_the_final_renders():
+	model = stereoCost.CostModel()
+	model.Observe('Cam', 1, 1., 'sample', 25, 100)
+	model.Flush()
+	# samples only: a guess, too low
+	assert abs(model.Predict('Cam', 1, 1600) - 16.) < 1e-9
+	assert not model.Calibrated()
+
+	# final renders take 3 times as long per pixel as the samples
+	model.Observe('Cam', 2, 48., 'render', 100, 1600)
+	model.Observe('Cam', 200, 1., 'sample', 25, 100)
+	model.Flush()
+	assert model.Calibrated()
+	assert model.corrections == {'Cam': 3.}
+	assert abs(model.Predict('Cam', 200, 1600) - 48.) < 1e-9
+
+def test_tracker():
+	tracker = stereoCost.CostTracker([10., None, 30.], calibrated=False)
+	assert tracker.remaining == 60.
+	assert not tracker.Calibrated()
+	tracker.Done(10., 20.)
+	assert tracker.Calibrated()
+	assert tracker.Remaining() == 100.		# twice as slow as predicted
+	tracker.Done(None, 1.)
+	tracker.Done(30., None)
+	assert tracker.Remaining() == 40.
+
+def test_preview_passes_leave_the_tracker_alone(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(1, 4, 0, output, 0.002)
+	animator = stereoBench.NewAnimator(scene, output)
+	animator.trace.Close()
+	animator.SetCostModel(os.path.join(output, 'shot' + stereoCost.MODEL_EXT), 2)
+	animator.SetPreview(2, 25, False, 'python')
+	animator.CompositePreview = lambda frames: None
+	states = []
+	renderPass = animator.RenderPass
+	def RenderPass(frames, preview, manifest):
+		tracker = animator.costTracker
+		before = (tracker.remaining, tracker.predicted, tracker.actual)
+		images = renderPass(frames, preview, manifest)
+		states.append((preview, before, (tracker.remaining, tracker.predicted, tracker.actual)))
+		assert animator.costTracker is tracker
+		return images
+	animator.RenderPass = RenderPass
+	animator.RenderAllRigsByFrame()
+
+	assert [s[0] for s in states] == [True, True, False, False]
+	planned = states[0][1]
+	assert planned[0] > 0 and planned[1:] == (0., 0.)
+	for preview, before, after in states[:2]:
+		assert after == planned
+	# the final renders are counted
+	assert states[-1][2][0] < planned[0]
+	assert states[-1][2][1] > 0 and states[-1][2][2] > 0
@@ -0,0 +1,72 @@
+# The convergence crop: the margin recorded by StereoAnimator and the columns
+# cut by stereoCrop/stereoImageIO.CropColumns
+import os
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+pytest.importorskip('PIL')
+
+import stereoBench
+import stereoCrop
+import stereoImageIO
+import stereoLayout
+import stereoRigMath
+
+def Frame(height, width, seed):
+	y, x = numpy.mgrid[0:height, 0:width]
+	return numpy.dstack([(x * 7 + seed) % 256, (y * 3 + seed) % 256, (x + y + seed) % 256]).astype(numpy.uint8)
+
+def test_crop_margin():
+	# half way between the focal distance and clipEnd: half the disparity at infinity
+	assert stereoRigMath.CropMargin(100, 0.1, 10., 20.) == 5
+	assert stereoRigMath.CropMargin(100, 0.1, 0., 20.) == 0
+	assert stereoRigMath.CropMargin(100, 0.1, 30., 20.) == 0
+	assert stereoRigMath.CropMargin(100, 0.9, 1., 1000.) == 50
+	assert stereoRigMath.CropBox(100, 60, 5) == (5, 0, 95, 60)
+
+@pytest.mark.parametrize('ext', ['.tga', '.bmp', '.png'])
+def test_crop_columns(tmpdir, ext):
+	# an odd width leaves padding at the end of every BMP row
+	pixels = Frame(11, 15, 3)
+	src = str(tmpdir.join('src' + ext))
+	dest = str(tmpdir.join('out', 'dest' + ext))
+	stereoImageIO.WriteImage(src, pixels)
+	stereoImageIO.CropColumns(src, dest, 2, 11, chunkRows=4)
+	assert numpy.array_equal(stereoImageIO.ReadImage(dest), pixels[:, 2:11])
+	assert not os.path.exists(dest + '.tmp')
+
+def test_crop_sequences(tmpdir):
+	output = str(tmpdir.join('shot'))
+	dest = str(tmpdir.join('shot_crop'))
+	frames = {}
+	for suffix, seed in [('_SLEFT', 1), ('_SRIGHT', 2)]:
+		for frame in [1, 2]:
+			path = stereoLayout.FramePrefix(output, 'Cam', 'Cam' + suffix) + '%04d.tga' % frame
+			if not os.path.isdir(os.path.dirname(path)):
+				os.makedirs(os.path.dirname(path))
+			frames[(suffix, frame)] = Frame(8, 12, seed + frame)
+			stereoImageIO.WriteImage(path, frames[(suffix, frame)])
+	stereoLayout.WriteCropInfo(output, 'Cam', {'camera': 'Cam', 'margin': 3, 'box': [3, 0, 9, 8]})
+
+	assert stereoCrop.CropSequences(output, dest, ['Cam', 'Missing'], workers=1) == 4
+	assert stereoLayout.ReadCropInfo(dest, 'Cam')['box'] == [3, 0, 9, 8]
+	for (suffix, frame), pixels in frames.items():
+		path = stereoLayout.FramePrefix(dest, 'Cam', 'Cam' + suffix) + '%04d.tga' % frame
+		assert numpy.array_equal(stereoImageIO.ReadImage(path), pixels[:, 3:9])
+
+	# only the requested frames
+	assert stereoCrop.CropSequences(output, str(tmpdir.join('one')), ['Cam'], frames=set([2]), workers=1) == 2
+
+def test_render_records_the_largest_margin(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(1, 2, 0, output, 0)
+	animator = stereoBench.NewAnimator(scene, output)
+	animator.trace.Close()
+	animator.RenderAllRigsByFrame()
+	info = stereoLayout.ReadCropInfo(output, 'Cam0')
+	width = scene.getRenderingContext().imageSizeX()
+	data = [ob for ob in scene.objects if ob.getName() == 'Cam0'][0].getData()
+	shift = stereoRigMath.ShiftX(width, animator.eyeSep, data.dofDist, data.angle)
+	assert info['margin'] == stereoRigMath.CropMargin(width, shift, data.dofDist, data.clipEnd) > 0
+	assert info['box'] == list(stereoRigMath.CropBox(width, info['height'], info['margin']))
@@ -0,0 +1,68 @@
+# stereoDelta: the right eye comes back bit for bit; JPEG right eyes are
+# refused, as they would not
+import os
+import warnings
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+pytest.importorskip('PIL')
+
+import stereoDelta
+import stereoImageIO
+import stereoLayout
+
+# RETURN: a left eye and a right eye that is the left one shifted by shift columns
+def EyeImages(width=96, height=48, shift=5):
+	y, x = numpy.mgrid[0:height, 0:width + shift]
+	scene = numpy.dstack([(x * 7 + y * 3) % 256, (x * y) % 256, (x ^ y) % 256]).astype(numpy.uint8)
+	return scene[:, shift:], scene[:, :width]
+
+def WriteEyes(output, camera, frame, ext='.png'):
+	left, right = EyeImages()
+	paths = []
+	for eye, pixels in zip(stereoLayout.EYE_SUFFIXES, [left, right]):
+		prefix = stereoLayout.FramePrefix(output, camera, camera + eye)
+		stereoLayout.MakeDirs(os.path.dirname(prefix))
+		path = prefix + stereoLayout.FrameString(frame) + (eye == '_SLEFT' and '.png' or ext)
+		stereoImageIO.WriteImage(path, pixels, 'RGB')
+		paths.append(path)
+	return paths
+
+@pytest.mark.parametrize('method', ['shift', 'block'])
+def test_round_trip(tmpdir, method):
+	output = str(tmpdir)
+	[left, right] = WriteEyes(output, 'Cam', 1)
+	original = stereoImageIO.ReadImageBands(right)[0].copy()
+
+	[tasks, lossy] = stereoDelta.FrameTasks('encode', output, 'Cam', method=method, search=16)
+	assert (len(tasks), lossy) == (1, 0)
+	[result] = stereoDelta.RunTasks('encode', tasks, 1)
+	assert result[5]
+	assert result[3] < result[2]
+	assert not os.path.exists(right)
+	assert os.path.isfile(stereoDelta.DeltaPath(output, 'Cam', 1))
+
+	# decoding reads the bands without copies or deprecated NumPy calls
+	with warnings.catch_warnings(record=True) as caught:
+		warnings.simplefilter('always')
+		[pixels, mode, ext] = stereoDelta.Decode(stereoDelta.DeltaPath(output, 'Cam', 1),
+			stereoImageIO.ReadImage(left))
+	assert [w for w in caught if issubclass(w.category, DeprecationWarning)] == []
+	assert numpy.array_equal(pixels, original) and (mode, ext) == ('RGB', '.png')
+
+	[tasks, lossy] = stereoDelta.FrameTasks('decode', output, 'Cam')
+	stereoDelta.RunTasks('decode', tasks, 1)
+	assert numpy.array_equal(stereoImageIO.ReadImageBands(right)[0], original)
+	assert not os.path.exists(stereoDelta.DeltaPath(output, 'Cam', 1))
+
+def test_jpeg_right_eye_is_refused(tmpdir):
+	output = str(tmpdir)
+	[left, right] = WriteEyes(output, 'Cam', 1, '.jpg')
+	[tasks, lossy] = stereoDelta.FrameTasks('encode', output, 'Cam')
+	assert (tasks, lossy) == ([], 1)
+	task = (1, left, right, stereoDelta.DeltaPath(output, 'Cam', 1), 'shift', 16, stereoDelta.DEFAULT_BLOCK,
+		stereoDelta.DEFAULT_CHUNK_ROWS, 'encode', False)
+	with pytest.raises(ValueError):
+		stereoDelta._EncodeFrame(task)
+	assert os.path.isfile(right)
@@ -0,0 +1,75 @@
+# Sharded renders with the stand-in worker of stereoDispatch.LocalRunner:
+# merging into the final tree, retries, --resume and options passed through
+# to the workers
+import os
+
+import stereoArchive
+import stereoDispatch
+import stereoLayout
+import stereoManifest
+
+CAMERAS = ['Left', 'Right']
+FRAMES = range(1, 13)
+
+def Render(output, runner, resume=False, options=None, retries=1):
+	dispatcher = stereoDispatch.Dispatcher(runner, output, 3, retries, resume, options=options)
+	dispatcher.AddShards(FRAMES, CAMERAS, chunkSize=4)
+	failed = dispatcher.Run(poll=0.02)
+	return dispatcher, failed
+
+def test_merge_with_retry(tmpdir):
+	output = str(tmpdir.join('shot'))
+	# shard 1 dies half way through its first attempt
+	dispatcher, failed = Render(output, stereoDispatch.LocalRunner(CAMERAS, failures={1: 1}))
+	assert failed == []
+	assert dispatcher.merged == len(FRAMES) * len(CAMERAS) * 2
+	assert not os.path.exists(os.path.join(output, '.shards'))
+	manifest = stereoManifest.FrameManifest(output)
+	for frame in FRAMES:
+		for camera in CAMERAS:
+			for eye in stereoLayout.EYE_SUFFIXES:
+				record = manifest.Lookup(frame, eye, camera, 'local')
+				assert record is not None
+				f = open(manifest.AbsolutePath(record))
+				assert f.read() == '%s%s frame %d\n' % (camera, eye, frame)
+				f.close()
+
+def test_resume_renders_nothing_twice(tmpdir):
+	output = str(tmpdir.join('shot'))
+	Render(output, stereoDispatch.LocalRunner(CAMERAS))
+	dispatcher, failed = Render(output, stereoDispatch.LocalRunner(CAMERAS), resume=True)
+	assert failed == []
+	assert dispatcher.merged == 0
+	assert len(stereoManifest.FrameManifest(output).records) == len(FRAMES) * len(CAMERAS) * 2
+
+def test_shard_that_keeps_failing(tmpdir):
+	output = str(tmpdir.join('shot'))
+	dispatcher, failed = Render(output, stereoDispatch.LocalRunner(CAMERAS, failures={0: 5}))
+	assert [shard.index for shard in failed] == [0]
+	assert failed[0].attempts == 2
+	# the frames of the other shards are in place, the staging of shard 0 is kept
+	manifest = stereoManifest.FrameManifest(output)
+	assert sorted(set([key[0] for key in manifest.records.keys()])) == FRAMES[4:]
+	assert os.path.isfile(failed[0].LogFile())
+
+def test_reserved_options_are_refused(tmpdir):
+	status = None
+	try:
+		stereoDispatch.main(['stereoDispatch.py', '--local', '--cameras', 'Left', '--frames', '1-2',
+			'--output', str(tmpdir), '--', '--frames', '1-4'])
+	except SystemExit, e:
+		status = e.code
+	assert status == 2
+
+def test_archive_shards_are_merged(tmpdir):
+	output = str(tmpdir.join('shot'))
+	dispatcher, failed = Render(output, stereoDispatch.LocalRunner(CAMERAS), options=['--archive'])
+	assert failed == []
+	assert dispatcher.merged == len(FRAMES) * len(CAMERAS) * 2
+	manifest = stereoManifest.FrameManifest(output)
+	for camera in CAMERAS:
+		archive = stereoArchive.StereoArchive(stereoArchive.ArchivePath(output, camera))
+		assert len(archive.Keys()) == len(FRAMES) * 2
+		assert archive.Read(7, '_SRIGHT') == '%s_SRIGHT frame 7\n' % camera
+		archive.Close()
+		assert manifest.IsComplete(7, '_SRIGHT', camera, 'local')
@@ -0,0 +1,45 @@
+# The CRC journal of stereoManifest: torn and corrupt lines are ignored,
+# records only count while their file is intact
+import os
+
+import stereoManifest
+
+def WriteImage(path, data):
+	if not os.path.isdir(os.path.dirname(path)):
+		os.makedirs(os.path.dirname(path))
+	f = open(path, 'wb')
+	f.write(data)
+	f.close()
+
+def test_torn_and_corrupt_lines(tmpdir):
+	root = str(tmpdir)
+	manifest = stereoManifest.FrameManifest(root)
+	for frame in [1, 2]:
+		path = os.path.join(root, 'Cam', 'Cam_SLEFT', 'Cam_SLEFT_%04d.png' % frame)
+		WriteImage(path, 'image %d' % frame)
+		manifest.Record(frame, '_SLEFT', 'Cam', path, 'rig')
+	line = stereoManifest.EncodeRecord({'frame': 3, 'eye': '_SLEFT', 'camera': 'Cam', 'path': 'x',
+		'size': 1, 'rig': 'rig'})
+	f = open(manifest.path, 'ab')
+	f.write(line.replace('"x"', '"y"'))		# checksum no longer matches
+	f.write(line[:len(line) // 2])			# cut off by a crash
+	f.close()
+
+	manifest = stereoManifest.FrameManifest(root)
+	assert sorted(manifest.records.keys()) == [(1, '_SLEFT', 'Cam'), (2, '_SLEFT', 'Cam')]
+	assert manifest.IsComplete(1, '_SLEFT', 'Cam', 'rig')
+	assert not manifest.IsComplete(1, '_SLEFT', 'Cam', 'other rig')
+
+	# a later record of an image wins; a file of the wrong size is not complete
+	path = os.path.join(root, 'Cam', 'Cam_SLEFT', 'Cam_SLEFT_0002.png')
+	WriteImage(path, 'longer image 2')
+	assert not manifest.IsComplete(2, '_SLEFT', 'Cam', 'rig')
+	manifest.Record(2, '_SLEFT', 'Cam', path, 'rig')
+	assert stereoManifest.FrameManifest(root).IsComplete(2, '_SLEFT', 'Cam', 'rig')
+
+def test_decode_record():
+	line = stereoManifest.EncodeRecord({'frame': 1})
+	assert stereoManifest.DecodeRecord(line) == {'frame': 1}
+	assert stereoManifest.DecodeRecord(line[:-1]) is None
+	assert stereoManifest.DecodeRecord('00000000 {"frame": 1}\n') is None
+	assert stereoManifest.DecodeRecord('garbage\n') is None
@@ -0,0 +1,56 @@
+# Preview passes (SetPreview): low resolution images below preview/ first,
+# then the final images where they would be without previews
+import os
+import sys
+
+import stereoArchive
+import stereoBench
+import stereoLayout
+import stereoManifest
+
+def Render(scene, output, step, previewOnly=False, archive=False):
+	animator = stereoBench.NewAnimator(scene, output)
+	animator.trace.Close()
+	animator.SetPreview(step, 25, previewOnly, sys.executable)
+	if archive:
+		animator.StartArchive(os.path.join(output, 'spool'))
+	animator.RenderAllRigsByFrame()
+	return animator
+
+def test_preview_then_final_images(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(1, 5, 0, output, 0)
+	context = scene.getRenderingContext()
+	size = context.renderwinSize
+	Render(scene, output, 2)
+	assert context.renders == 20
+	assert context.renderwinSize == size
+	preview = os.path.join(output, stereoLayout.PREVIEW_DIR)
+	for root in [output, preview]:
+		for eye in stereoLayout.EYE_SUFFIXES:
+			assert sorted(stereoLayout.ListFrameFiles(root, 'Cam0', 'Cam0' + eye).keys()) == range(1, 6)
+	# the final manifest only has the final images
+	manifest = stereoManifest.FrameManifest(output)
+	assert len(manifest.records) == 10
+	for record in manifest.records.values():
+		assert not record['path'].startswith(stereoLayout.PREVIEW_DIR + os.sep)
+
+	context.renders = 0
+	Render(scene, output, 2, previewOnly=True)
+	assert context.renders == 10
+
+def test_preview_with_archive(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(1, 4, 0, output, 0)
+	Render(scene, output, 2, archive=True)
+	# previews are loose files, the final images go into the archive
+	preview = os.path.join(output, stereoLayout.PREVIEW_DIR)
+	assert sorted(stereoLayout.ListFrameFiles(preview, 'Cam0', 'Cam0_SLEFT').keys()) == [1, 2, 3, 4]
+	assert not os.path.exists(stereoArchive.ArchivePath(preview, 'Cam0'))
+	archive = stereoArchive.StereoArchive(stereoArchive.ArchivePath(output, 'Cam0'))
+	assert len(archive.Keys()) == 8
+	archive.Close()
+	manifest = stereoManifest.FrameManifest(output)
+	assert len(manifest.records) == 8
+	for record in manifest.records.values():
+		assert record['path'] == os.path.relpath(archive.path, output)
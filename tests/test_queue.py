@@ -0,0 +1,101 @@
+# stereoQueue: leases of dead nodes are taken over, failed tasks given up,
+# and the status report leaves the queue alone
+import os
+import time
+
+import stereoDispatch
+import stereoManifest
+import stereoQueue
+
+TASKS = [{'id': 't00000', 'frames': [1, 2], 'cameras': None}, {'id': 't00001', 'frames': [3, 4], 'cameras': None}]
+
+def test_expired_lease_is_reclaimed(tmpdir):
+	output = str(tmpdir)
+	a = stereoQueue.TaskQueue(output, 'a', lease=60.)
+	b = stereoQueue.TaskQueue(output, 'b', lease=60.)
+	assert a.Create(TASKS)
+	assert not b.Create([])			# joins the job of a
+	assert b.tasks == a.tasks
+	task = a.Claim()
+	assert task['id'] == 't00000'
+	assert b.Claim()['id'] == 't00001'
+	assert b.Claim() is None
+
+	# a stops renewing: its lease expires and b takes the task over
+	old = time.time() - 3600
+	os.utime(a.LeasePath(task, 0), (old, old))
+	taken = b.Claim()
+	assert taken['id'] == 't00000'
+	assert b.stats['reclaimed'] == 1
+	assert not a.Renew(task)
+	assert a.stats['lost'] == 1
+	assert b.Renew(taken)
+
+	b.Complete(taken, 4, 1.)
+	b.Complete(b.tasks[1], 4, 1.)
+	assert b.Finished()
+	assert b.Leases() == {}
+
+def test_failed_attempts(tmpdir):
+	queue = stereoQueue.TaskQueue(str(tmpdir), 'a', lease=60., attempts=2)
+	queue.Create(TASKS[:1])
+	for attempt in range(2):
+		task = queue.Claim()
+		assert task is not None
+		queue.Release(task, 'exit status 1')
+	assert queue.Claim() is None
+	assert queue.States() == {'t00000': 'failed'}
+	assert queue.Finished()
+
+def test_status_is_read_only(tmpdir):
+	output = str(tmpdir)
+	reader = stereoQueue.TaskQueue(output, 'status', readOnly=True)
+	assert not os.path.exists(reader.root)
+	node = stereoQueue.TaskQueue(output, 'a')
+	node.Create(TASKS)
+	node.Complete(node.Claim(), 4, 1.)
+	reader.Load()
+	lines = reader.Report()
+	assert lines[0] == '2 tasks: 1 done, 0 rendering, 1 pending, 0 failed'
+	assert os.listdir(os.path.join(reader.root, 'clock')) == ['a']
+
+def test_renewed_lock_is_kept(tmpdir):
+	output = str(tmpdir)
+	a = stereoQueue.TaskQueue(output, 'a', lease=60.)
+	b = stereoQueue.TaskQueue(output, 'b', lease=60.)
+	lock = a.Lock('merge')
+	old = time.time() - 3600
+	os.utime(lock, (old, old))
+	assert a.RenewLock(lock)
+	assert os.stat(lock).st_mtime > old
+	mtime = os.stat(lock).st_mtime
+	os.utime(lock, (mtime - 10, mtime - 10))
+	assert a.RenewLock(lock, interval=30.)		# renewed just now, not touched
+	assert os.stat(lock).st_mtime < mtime - 5
+
+	# without renewal the lock goes stale and b takes it over; a leaves b's lock alone
+	os.utime(lock, (old, old))
+	assert b.Lock('merge', poll=0.01) == lock
+	assert not a.RenewLock(lock)
+	a.Unlock(lock)
+	assert b.LockOwner(lock) == 'b'
+	b.Unlock(lock)
+	assert not os.path.exists(lock)
+
+def test_queued_render_renews_the_merge_lock(tmpdir):
+	output = str(tmpdir.join('shot'))
+	runner = stereoDispatch.LocalRunner(['Left', 'Right'])
+	dispatcher = stereoDispatch.QueueDispatcher(runner, output, 2, node='a', lease=60.)
+	dispatcher.AddShards(range(1, 9), ['Left', 'Right'], chunkSize=4)
+	renewed = []
+	def RenewLock(path, interval=0.):
+		renewed.append((path, interval))
+		return stereoQueue.TaskQueue.RenewLock(dispatcher.queue, path, interval)
+	dispatcher.queue.RenewLock = RenewLock
+	assert dispatcher.Run(poll=0.02) == []
+	assert dispatcher.merged == 8 * 2 * 2
+	# once per merged file, at most every quarter lease
+	assert len(renewed) >= dispatcher.merged
+	assert set(renewed) == set([(os.path.join(dispatcher.queue.root, 'merge.lock'), 15.)])
+	assert not os.path.exists(os.path.join(dispatcher.queue.root, 'merge.lock'))
+	assert len(stereoManifest.FrameManifest(output).records) == 32
@@ -0,0 +1,45 @@
+# Render orders of stereoSchedule: the task lists, and the frame evaluations
+# and render path switches StereoAnimator actually makes in each order
+import pytest
+
+import stereoBench
+import stereoSchedule
+
+def test_build_tasks():
+	frames = [5, 6]
+	assert stereoSchedule.BuildTasks(frames, 2, 2, 'frame')[:4] == [(5, 0, 0), (5, 0, 1), (5, 1, 0), (5, 1, 1)]
+	assert stereoSchedule.BuildTasks(frames, 2, 2, 'camera')[:4] == [(5, 0, 0), (5, 0, 1), (6, 0, 0), (6, 0, 1)]
+	assert stereoSchedule.BuildTasks(frames, 2, 2, 'eye')[:4] == [(5, 0, 0), (6, 0, 0), (5, 0, 1), (6, 0, 1)]
+	for order in ['frame', 'camera', 'eye']:
+		assert sorted(stereoSchedule.BuildTasks(frames, 2, 2, order)) == \
+			sorted(stereoSchedule.BuildTasks(frames, 2, 2, 'frame'))
+
+def test_choose_order():
+	# expensive frame changes: frame order; expensive switches: eye order
+	assert stereoSchedule.ChooseOrder(100, 3, 2, 1., 0.01, 0.01) == 'frame'
+	assert stereoSchedule.ChooseOrder(100, 3, 2, 0.001, 0.001, 1.) == 'eye'
+	assert stereoSchedule.ChooseOrder(100, 1, 2, 0., 0., 0.) == 'frame'
+
+def test_refinement_passes():
+	frames = range(1, 8)
+	assert stereoSchedule.RefinementPasses(frames, 0) == [(False, frames)]
+	assert stereoSchedule.RefinementPasses(frames, 3) == [(True, [1, 4, 7]), (True, [2, 3, 5, 6]),
+		(False, [1, 4, 7]), (False, [2, 3, 5, 6])]
+	assert stereoSchedule.RefinementPasses(frames, 3, previewOnly=True) == [(True, [1, 4, 7]), (True, [2, 3, 5, 6])]
+
+@pytest.mark.parametrize('order', ['frame', 'camera', 'eye'])
+def test_render_follows_the_counts(tmpdir, order):
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(3, 4, 0, output, 0)
+	context = scene.getRenderingContext()
+	animator = stereoBench.NewAnimator(scene, output)
+	animator.trace.Close()
+	animator.SetOrder(order)
+	scene.evaluations = 0
+	animator.RenderAllRigsByFrame()
+	evaluations, updates, switches = stereoSchedule.Counts(order, 4, 3, 2)
+	assert context.renders == 24
+	# PrecomputeRigs evaluates every frame once more, and the render path is
+	# restored at the end
+	assert scene.evaluations == evaluations + 4
+	assert context.pathChanges == switches + 1
@@ -0,0 +1,53 @@
+# skipStatic: eyes whose rig and scene did not change since their last image
+# reuse that image instead of rendering
+import os
+
+import stereoBench
+import stereoLayout
+
+def StaticScene(output, frames):
+	scene = stereoBench.BuildScene(1, frames, 1, output, 0)
+	objects = dict([(ob.getName(), ob) for ob in scene.objects])
+	objects['Cam0'].animate = None
+	return scene, objects
+
+def Render(scene, output):
+	animator = stereoBench.NewAnimator(scene, output)
+	animator.trace.Close()
+	animator.skipStatic = True
+	animator.RenderAllRigsByFrame()
+	return animator
+
+def Frames(output, eye):
+	return stereoLayout.ListFrameFiles(output, 'Cam0', 'Cam0' + eye)
+
+def test_static_scene_renders_once(tmpdir):
+	output = str(tmpdir) + '/'
+	scene, objects = StaticScene(output, 4)
+	animator = Render(scene, output)
+	assert scene.getRenderingContext().renders == 2
+	for eye in ['_SLEFT', '_SRIGHT']:
+		files = Frames(output, eye)
+		assert sorted(files.keys()) == [1, 2, 3, 4]
+		assert len(set([os.stat(path).st_ino for path in files.values()])) == 1
+	assert animator.StaticReport(8).startswith('Static frames: 6 of 8 images reused (6 hard links')
+
+def test_changed_frames_are_rendered(tmpdir):
+	output = str(tmpdir) + '/'
+	scene, objects = StaticScene(output, 4)
+	def move(ob, frame):
+		ob.LocX = frame >= 3 and 5. or 0.
+	objects['Prop0'].animate = move
+	Render(scene, output)
+	assert scene.getRenderingContext().renders == 4
+	files = Frames(output, '_SLEFT')
+	assert os.stat(files[1]).st_ino == os.stat(files[2]).st_ino
+	assert os.stat(files[2]).st_ino != os.stat(files[3]).st_ino
+	assert os.stat(files[3]).st_ino == os.stat(files[4]).st_ino
+
+def test_moving_cameras_are_always_rendered(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(1, 3, 1, output, 0)
+	animator = Render(scene, output)
+	assert scene.getRenderingContext().renders == 6
+	assert animator.StaticReport(6).startswith('Static frames: 0 of 6')
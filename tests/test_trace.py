@@ -0,0 +1,65 @@
+# The render trace of stereoTrace: whole JSON lines on disk after every
+# measurement, percentiles and progress from the recorded phases
+import json
+import os
+
+import stereoBench
+import stereoTrace
+
+def ReadLines(path):
+	f = open(path)
+	lines = [json.loads(line) for line in f]
+	f.close()
+	return lines
+
+def test_lines_are_on_disk_after_every_stop(tmpdir):
+	path = os.path.join(str(tmpdir), 'trace.jsonl')
+	trace = stereoTrace.RenderTrace(path)
+	trace.Stop(trace.Start(), 'render', frame=1, eye='_SLEFT', camera='Cam')
+	lines = ReadLines(path)		# still open, as after a killed render
+	assert len(lines) == 1
+	assert lines[0]['phase'] == 'render' and lines[0]['frame'] == 1 and lines[0]['eye'] == '_SLEFT'
+	trace.Stop(trace.Start(), 'save', frame=1)
+	assert [line['phase'] for line in ReadLines(path)] == ['render', 'save']
+	trace.Close()
+
+	# a new trace appends to the old one
+	trace = stereoTrace.RenderTrace(path)
+	trace.Stop(trace.Start(), 'frame', frame=1)
+	trace.Close()
+	assert len(ReadLines(path)) == 3
+
+def test_summary_and_progress():
+	assert stereoTrace.Percentile([], 50) == 0.
+	assert stereoTrace.Percentile([5., 1., 3., 2., 4.], 50) == 3.
+	assert stereoTrace.Percentile(range(1, 101), 95) == 95
+	assert stereoTrace.FormatDuration(42) == '42.0s'
+	assert stereoTrace.FormatDuration(125) == '2m05s'
+	assert stereoTrace.FormatDuration(7500) == '2h05m'
+
+	trace = stereoTrace.RenderTrace()
+	trace.SetFrameCount(4)
+	assert trace.ETA() is None
+	trace.phases['frame'] = [10., 10.]
+	trace.FrameDone()
+	trace.FrameDone(0.5)
+	assert trace.FramesDone() == 1
+	assert trace.ETA() == 25.
+	summary = trace.Summary()
+	assert 'frame' in summary.splitlines()[1]
+	assert summary.splitlines()[-1].startswith('frame 1 of 4')
+
+def test_render_writes_one_line_per_image(tmpdir):
+	output = str(tmpdir) + '/'
+	path = os.path.join(str(tmpdir), 'trace.jsonl')
+	scene = stereoBench.BuildScene(2, 3, 1, output, 0)
+	animator = stereoBench.NewAnimator(scene, output)
+	animator.SetTraceFile(path)
+	animator.RenderAllRigsByFrame()
+	lines = ReadLines(path)
+	animator.trace.Close()
+	renders = [line for line in lines if line['phase'] == 'render']
+	assert len(renders) == 12
+	assert set([(line['frame'], line['eye'], line['camera']) for line in renders]) == \
+		set([(f, e, c) for f in [1, 2, 3] for e in ['_SLEFT', '_SRIGHT'] for c in ['Cam0', 'Cam1']])
+	assert len([line for line in lines if line['phase'] == 'frame']) == 3
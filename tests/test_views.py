@@ -0,0 +1,74 @@
+# N-view rigs (SetViews) and the mosaic/interleave stage of stereoMosaic
+import math
+import os
+
+import pytest
+
+import stereoBench
+import stereoLayout
+
+def Distance(a, b):
+	return math.sqrt(sum([(x - y) ** 2 for x, y in zip(a, b)]))
+
+def test_views_are_evenly_spaced(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(1, 2, 0, output, 0)
+	animator = stereoBench.NewAnimator(scene, output)
+	animator.trace.Close()
+	animator.SetViews(4)
+	animator.GenerateStereoRigs(animator.eyeSep)
+	animator.PrecomputeRigs([1])
+	animator.SetFrame(1)
+	animator.UpdateRigFor(0, 1)
+	views = animator.rigs[0].Eyes()
+	assert [animator.RigName(view) for view in views] == ['Cam0_SV01', 'Cam0_SV02', 'Cam0_SV03', 'Cam0_SV04']
+	locs = [view.getMatrix('worldspace')[3][:3] for view in views]
+	assert abs(Distance(locs[0], locs[3]) - animator.eyeSep) < 1e-6
+	for i in range(3):
+		assert abs(Distance(locs[i], locs[i+1]) - animator.eyeSep / 3.) < 1e-6
+	shifts = [view.getData().shiftX for view in views]
+	assert shifts[0] > shifts[1] > 0 > shifts[2] > shifts[3]
+	assert abs(shifts[0] + shifts[3]) < 1e-9 and abs(shifts[1] - shifts[0] / 3.) < 1e-9
+
+def test_every_view_is_rendered(tmpdir):
+	output = str(tmpdir) + '/'
+	scene = stereoBench.BuildScene(2, 3, 0, output, 0)
+	animator = stereoBench.NewAnimator(scene, output)
+	animator.trace.Close()
+	animator.SetViews(3)
+	animator.RenderAllRigsByFrame()
+	assert scene.getRenderingContext().renders == 18
+	assert stereoLayout.ListViews(output, 'Cam1') == ['_SV01', '_SV02', '_SV03']
+	for suffix in stereoLayout.ViewSuffixes(3):
+		assert sorted(stereoLayout.ListFrameFiles(output, 'Cam1', 'Cam1' + suffix).keys()) == [1, 2, 3]
+	with pytest.raises(ValueError):
+		animator.SetViews(1)
+
+def test_mosaic_and_interleave(tmpdir):
+	numpy = pytest.importorskip('numpy')
+	pytest.importorskip('PIL')
+	import stereoComposite
+	import stereoImageIO
+	import stereoMosaic
+
+	output = str(tmpdir)
+	views = stereoLayout.ViewSuffixes(3)
+	for index, suffix in enumerate(views):
+		path = stereoLayout.FramePrefix(output, 'Cam', 'Cam' + suffix) + '0001.png'
+		os.makedirs(os.path.dirname(path))
+		stereoImageIO.WriteImage(path, numpy.ones((4, 6, 3), numpy.uint8) * (index + 1) * 50)
+
+	assert stereoMosaic.DefaultGrid(3) == (2, 2)
+	assert stereoMosaic.MosaicSequences(output, ['Cam'], 'mosaic', {}, workers=1) == 1
+	mosaic = stereoImageIO.ReadImage(stereoComposite.OutputPath(output, 'Cam', 'mosaic', 1, 'png'))
+	# view 1 at the bottom left, rows filled left to right, bottom to top
+	assert mosaic.shape == (8, 12, 3)
+	assert mosaic[4, 0, 0] == 50 and mosaic[4, 6, 0] == 100 and mosaic[0, 0, 0] == 150
+	assert mosaic[0, 6, 0] == 0
+
+	assert stereoMosaic.MosaicSequences(output, ['Cam'], 'interleave', {'slant': 0., 'offset': 0.}, workers=1) == 1
+	interleaved = stereoImageIO.ReadImage(stereoComposite.OutputPath(output, 'Cam', 'interleave', 1, 'png'))
+	# a pitch of one subpixel per view: subpixel c of every pixel from view c
+	assert interleaved.shape == (4, 6, 3)
+	assert (interleaved[:, :, 0] == 50).all() and (interleaved[:, :, 1] == 100).all()
+	assert (interleaved[:, :, 2] == 150).all()